@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'uniphoto.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,16 +123,98 @@ STATICFILES_DIRS = (
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'uniphoto.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'COERCE_DECIMAL_TO_STRING': False
 }
 
+# File lists are serialized from values_list rows and rendered by FastJSONRenderer (orjson when installed),
+# False switches them back to model serializers
+FAST_FILE_LISTS = True
+
+# Token lookups of CachedTokenAuthentication are kept in in-process LRU cache, deleted token stays valid
+# in other processes for up to TTL seconds. Set BACKEND to alias of CACHES to share lookups between processes
+TOKEN_AUTHENTICATION_CACHE = {
+    'BACKEND': None,
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+}
+
+# Trial license entitlements are cached until the next midnight of TIME_ZONE in in-process LRU cache, changed
+# date_joined is seen by other processes the next day. Set BACKEND to alias of CACHES to share them between processes
+LICENSE_CACHE = {
+    'BACKEND': None,
+    'MAX_SIZE': 100000,
+}
+
+# Maximum number of users in one /trial-license-checks request
+LICENSE_CHECK_MAX_USERS = 10000
+
+# First PAGES pages of /all-files are served from cache BACKEND, cached feed applies changes of global files version
+# of database (every created, deleted and processed file) and is rebuilt after TIMEOUT seconds or when more than
+# MAX_CHANGES changes are missed, older changes are pruned by `manage.py collect_garbage`
+FEED_CACHE = {
+    'BACKEND': 'default',
+    'PAGES': 5,
+    'TIMEOUT': 60,
+    'MAX_CHANGES': 1000,
+}
+
+# ProfilingMiddleware records SQL query count, SQL time, render time and latency of SAMPLE_RATE share of requests
+# per view in per-process histograms, which staff users scrape from /metrics in Prometheus text format.
+# SAMPLE_RATE 0 removes the middleware
+PROFILING = {
+    'SAMPLE_RATE': 0,
+}
+
 # APPEND_SLASH = False
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# Media is served by MediaFile view, set MEDIA_OFFLOAD to 'x-accel-redirect' (nginx internal location
+# MEDIA_OFFLOAD_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile' (apache) to let front proxy send the bytes
+MEDIA_OFFLOAD = None
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+
+# Uploads are stored once per content under MEDIA_ROOT/BLOBS_DIR, upload handlers compute sha256 while streaming
+# and stop uploads which exceed storage quota of user, whose content doesn't match extension or which are too large
+BLOBS_DIR = 'blobs'
+FILE_UPLOAD_HANDLERS = [
+    'uniphoto.quota.QuotaUploadHandler',
+    'uniphoto.validators.SignatureUploadHandler',
+    'uniphoto.storage.HashingMemoryFileUploadHandler',
+    'uniphoto.storage.HashingTemporaryFileUploadHandler',
+]
+# Chunked uploads are assembled under MEDIA_ROOT/UPLOADS_DIR, on the same filesystem as blobs
+UPLOADS_DIR = 'uploads'
+# Unfinished uploads are removed by `manage.py collect_garbage` after this time
+UPLOAD_SESSION_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Maximum bytes of one uploaded file, None disables the limit
+UPLOAD_MAX_FILE_BYTES = 4 * 1024 ** 3
+
+# Maximum bytes of files of one user, None disables quota
+STORAGE_QUOTA_BYTES = 10 * 1024 ** 3
+
+# Maximum number of files in one /post-files and /delete-files request
+BULK_UPLOAD_MAX_FILES = 100
+BULK_DELETE_MAX_FILES = 100
+
+# /sync serves file changes from change log, changes older than this are pruned by `manage.py collect_garbage`
+# and clients with older cursor have to list their files again
+FILE_CHANGES_RETENTION_SECONDS = 90 * 24 * 3600
+SYNC_MAX_CHANGES = 1000
+
+# Thumbnails are built lazily on first request and cached under MEDIA_ROOT/RENDITIONS_DIR
+RENDITIONS_DIR = 'renditions'
+RENDITION_SIZES = [128, 512, 1024]
+RENDITION_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+# Database backed task queue processed by `manage.py process_tasks`
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY_SECONDS = 30
+TASK_LEASE_SECONDS = 600
 
 TEST_RUNNER = 'uniphoto.test.csv_loading_test_runner.CSVLoadingTestRunner'
\ No newline at end of file
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import File
+from .models import Blob, File, Task, UploadSession
 
 
+admin.site.register(Blob)
 admin.site.register(File)
+admin.site.register(Task)
+admin.site.register(UploadSession)
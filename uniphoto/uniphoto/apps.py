@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UniphotoConfig(AppConfig):
   name = 'uniphoto'
+
+  def ready(self):
+    from . import signals  # noqa: F401
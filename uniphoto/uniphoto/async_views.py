@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from rest_framework import authentication, exceptions, status
+from rest_framework.request import Request
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+import functools
+import os
+import tempfile
+from . import deletion, quota, storage, tasks, views
+from .authentication import CachedTokenAuthentication
+from .models import File
+from .renderers import FastJSONRenderer
+from .serializers import UserFilesSerializer
+
+
+# Native coroutine versions of the main endpoints for ASGI deployment (mounted under /async/).
+# Django 3.1 ORM is synchronous, so each view runs its queries as one sync_to_async call on the
+# thread which owns the connection, while file I/O runs on executor threads and never blocks it.
+
+def render(data, status_code):
+  response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status_code)
+  if status_code == status.HTTP_401_UNAUTHORIZED:
+    response['WWW-Authenticate'] = CachedTokenAuthentication().authenticate_header(None)
+  return response
+
+def get_error_data(exc):
+  return exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+
+async def authenticate(request):
+  result = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+  if result is None:
+    raise exceptions.NotAuthenticated()
+  return result[0]
+
+def async_api_view(methods):
+  # errors are rendered the same way as DRF renders them for synchronous views, view returns either
+  # data with status or response of synchronous view
+  def decorator(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+      try:
+        if request.method not in methods:
+          raise exceptions.MethodNotAllowed(request.method)
+        request.user = await authenticate(request)
+        result = await view(request, *args, **kwargs)
+      except exceptions.APIException as exc:
+        return render(get_error_data(exc), exc.status_code)
+      return result if isinstance(result, HttpResponse) else render(*result)
+    # token authenticated api doesn't use csrf, as DRF views don't
+    wrapper.csrf_exempt = True
+    return wrapper
+  return decorator
+
+class AsyncUserAuthentication(authentication.BaseAuthentication):
+  # user is already authenticated by async_api_view
+
+  def authenticate(self, request):
+    return request._request.user, None
+
+def get_view_response(view_class, request):
+  # reads are served by synchronous view classes, so fields, filters, orderings, pagination and conditional
+  # get are the same as of synchronous endpoints, response is rendered on the thread which ran its queries
+  response = view_class.as_view(authentication_classes=[AsyncUserAuthentication])(request)
+  # 304 is a plain response
+  return response.render() if isinstance(response, SimpleTemplateResponse) else response
+
+def write_temporary_file(uploaded_file):
+  directory = os.path.join(settings.MEDIA_ROOT, settings.UPLOADS_DIR)
+  os.makedirs(directory, exist_ok=True)
+  fd, path = tempfile.mkstemp(dir=directory)
+  with os.fdopen(fd, 'wb') as temporary_file:
+    for chunk in uploaded_file.chunks():
+      temporary_file.write(chunk)
+  return path
+
+def remove_temporary_file(path):
+  try:
+    os.remove(path)
+  except FileNotFoundError:
+    pass
+
+def create_user_file(user, partial_upload):
+  with transaction.atomic():
+    blob = storage.store_blob(partial_upload)
+    file = File.objects.create(user=user, file=blob.name, blob=blob, size=partial_upload.size)
+    tasks.enqueue('process_file', file_id=file.id)
+  return file
+
+def delete_user_file(user, file_id):
+  file = File.objects.filter(id=file_id).values('user_id').first()
+  if file is None:
+    raise exceptions.NotFound()
+  if file['user_id'] != user.id:
+    return {'message': 'You cannot delete files of other users.'}, status.HTTP_403_FORBIDDEN
+  deletion.delete_files(File.objects.filter(id=file_id))
+  return {'message': 'File was deleted successfully.'}, status.HTTP_204_NO_CONTENT
+
+@async_api_view(['GET'])
+async def user_details(request):
+  return await sync_to_async(get_view_response)(views.UserDetails, request)
+
+@async_api_view(['GET'])
+async def user_files(request):
+  return await sync_to_async(get_view_response)(views.UserFilesList, request)
+
+@async_api_view(['GET'])
+async def all_files(request):
+  return await sync_to_async(get_view_response)(views.AllFilesList, request)
+
+@async_api_view(['POST'])
+async def post_file(request):
+  # multipart body is parsed by upload handlers (hashed while streaming) before validation
+  await sync_to_async(quota.get_request_remaining)(request)
+  serializer = UserFilesSerializer(data=await sync_to_async(lambda: request.FILES, thread_sensitive=False)())
+  if not serializer.is_valid():
+    return serializer.errors, status.HTTP_400_BAD_REQUEST
+  uploaded_file = serializer.validated_data['file']
+  uploaded_file.sha256 = await sync_to_async(storage.get_digest, thread_sensitive=False)(uploaded_file)
+  if hasattr(uploaded_file, 'temporary_file_path'):
+    file = await sync_to_async(create_user_file)(request.user, uploaded_file)
+  else:
+    # in memory upload is written out of transaction on executor thread, in transaction blob only takes it by link
+    path = await sync_to_async(write_temporary_file, thread_sensitive=False)(uploaded_file)
+    try:
+      partial_upload = storage.PartialUpload(path, uploaded_file.name)
+      partial_upload.sha256 = uploaded_file.sha256
+      with partial_upload:
+        file = await sync_to_async(create_user_file)(request.user, partial_upload)
+    finally:
+      await sync_to_async(remove_temporary_file, thread_sensitive=False)(path)
+  data = await sync_to_async(lambda: UserFilesSerializer(file, context={'request': Request(request)}).data)()
+  return data, status.HTTP_201_CREATED
+
+@async_api_view(['DELETE'])
+async def delete_file(request, pk):
+  return await sync_to_async(delete_user_file)(request.user, pk)
@@ -0,0 +1,84 @@
+from rest_framework.authentication import TokenAuthentication
+from django.conf import settings
+from django.core.cache import caches
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+
+class LRUCache:
+  # bounded in-process cache which entries expire after ttl seconds
+
+  def __init__(self):
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      value, expires = entry
+      if expires <= time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl, max_size):
+    with self.lock:
+      self.entries[key] = (value, time.monotonic() + ttl)
+      self.entries.move_to_end(key)
+      while len(self.entries) > max_size:
+        self.entries.popitem(last=False)
+
+  def delete(self, key):
+    with self.lock:
+      self.entries.pop(key, None)
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+
+local_token_cache = LRUCache()
+
+
+def get_cache_key(key):
+  return 'uniphoto:token:' + key
+
+def get_cached_token(key):
+  options = settings.TOKEN_AUTHENTICATION_CACHE
+  if options['BACKEND'] is not None:
+    return caches[options['BACKEND']].get(get_cache_key(key))
+  return local_token_cache.get(key)
+
+def set_cached_token(key, token):
+  options = settings.TOKEN_AUTHENTICATION_CACHE
+  if options['BACKEND'] is not None:
+    caches[options['BACKEND']].set(get_cache_key(key), token, options['TTL'])
+  else:
+    local_token_cache.set(key, token, options['TTL'], options['MAX_SIZE'])
+
+def invalidate_cached_token(key):
+  options = settings.TOKEN_AUTHENTICATION_CACHE
+  if options['BACKEND'] is not None:
+    caches[options['BACKEND']].delete(get_cache_key(key))
+  local_token_cache.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+  """
+  Token authentication which keeps token with its user in cache, so that warm requests
+  don't query authtoken_token and auth_user.
+  """
+
+  def authenticate_credentials(self, key):
+    token = get_cached_token(key)
+    if token is None:
+      user, token = super().authenticate_credentials(key)
+      set_cached_token(key, token)
+    # every request gets its own copy, so that changes of request.user don't leak into cache
+    token = copy.deepcopy(token)
+    return (token.user, token)
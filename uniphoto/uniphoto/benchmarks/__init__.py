@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+import statistics
+import time
+from uniphoto.models import File
+
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def get_benchmark_user():
+  user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME, defaults={'email': 'benchmark@uniphoto.com'})
+  return user
+
+def seed_files(user, rows):
+  # rows are generated server side so that millions of them are inserted in seconds
+  missing_rows = rows - File.objects.filter(user=user).count()
+  if missing_rows > 0:
+    with connection.cursor() as cursor:
+      cursor.execute("""
+                     INSERT INTO uniphoto_file(file, user_id, post_date, processing_status)
+                     SELECT 'benchmark_' || n || '.jpg', %s, now(), 'done'
+                     FROM generate_series(1, %s) AS n;
+                     """, [user.id, missing_rows])
+      cursor.execute('ANALYZE uniphoto_file;')
+  return max(missing_rows, 0)
+
+def measure(func, repeat):
+  # returns median and max of wall clock time in milliseconds
+  timings = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    func()
+    timings.append((time.perf_counter() - started) * 1000)
+  return statistics.median(timings), max(timings)
+
+def get_view_caller(view, user, url):
+  factory = APIRequestFactory()
+
+  def call():
+    request = factory.get(url)
+    force_authenticate(request, user=user)
+    response = view(request)
+    response.render()
+    assert response.status_code == 200, response.status_code
+    return response
+
+  return call
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+import itertools
+import random
+from uniphoto import deletion, tasks
+from uniphoto.benchmarks import measure, dataset
+from uniphoto.models import File, FileChange, Task
+
+
+# Timed requests against every endpoint of uniphoto/urls.py through the whole middleware stack,
+# made by the heaviest user of synthetic dataset. Files which benchmark creates are deleted afterwards.
+REGISTRATION_USERNAME_PREFIX = 'benchmark_registration_'
+BENCHMARK_PASSWORD = 'benchmark-password'
+BULK_FILES = 10
+UPLOAD_CHUNKS = 4
+
+
+class Uploads:
+  # distinct upload contents, so that every upload stores a new blob as real uploads do
+  def __init__(self, seed):
+    rng = random.Random(seed)
+    self.jpeg = dataset.make_jpeg(rng, 0)
+    self.counter = itertools.count()
+
+  def next(self):
+    # bytes after JPEG end marker are ignored by decoders
+    return self.jpeg + str(next(self.counter)).encode()
+
+  def file(self):
+    return SimpleUploadedFile('benchmark.jpg', self.next(), content_type='image/jpeg')
+
+
+def get_client(token):
+  client = APIClient()
+  client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+  return client
+
+def check(response, expected_status):
+  assert response.status_code == expected_status, (response.status_code, getattr(response, 'data', None))
+  # streamed media is read as client would read it
+  if response.streaming:
+    for _ in response.streaming_content:
+      pass
+  return response
+
+def get_cases(client, user, uploads, options):
+  """
+  Return (endpoint, variant, call) of each measured case, call raises AssertionError on unexpected status.
+  """
+  page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+  files = File.objects.filter(user=user).order_by('-id')
+  file_count = files.count()
+  deep_page = max(1, min(1000, file_count // page_size // 2))
+  photo = files.filter(media_type=File.MediaType.PHOTO).values_list('id', 'file', named=True).first()
+  light_user = dataset.get_dataset_users().order_by('-id').first()
+  user_ids = list(dataset.get_dataset_users().order_by('id').values_list('id', flat=True)[:settings.LICENSE_CHECK_MAX_USERS])
+  version = FileChange.objects.filter(user=user).order_by('-version').values_list('version', flat=True).first() or 0
+  etag = check(client.get('/user-details'), 200)['ETag']
+  registrations = itertools.count()
+
+  def get(path, expected_status=200, **headers):
+    return lambda: check(client.get(path, **headers), expected_status)
+
+  def register():
+    username = '{}{}'.format(REGISTRATION_USERNAME_PREFIX, next(registrations))
+    data = {'username': username, 'email': username + '@uniphoto.com', 'password': BENCHMARK_PASSWORD}
+    check(client.post('/registration', data, format='json'), 201)
+
+  def post_file(path='/post-file'):
+    return lambda: check(client.post(path, {'file': uploads.file()}, format='multipart'), 201)
+
+  def post_files():
+    check(client.post('/post-files', {'files': [uploads.file() for _ in range(BULK_FILES)]}, format='multipart'), 201)
+
+  def chunked_upload():
+    content = uploads.next()
+    upload_id = check(client.post('/upload', {'filename': 'benchmark.jpg', 'size': len(content)}, format='json'), 201).data['id']
+    chunk_size = -(-len(content) // UPLOAD_CHUNKS)
+    for offset in range(0, len(content), chunk_size):
+      check(client.put('/upload/{}'.format(upload_id), data=content[offset:offset + chunk_size],
+                       content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset)), 200)
+    check(client.get('/upload/{}'.format(upload_id)), 200)
+    check(client.post('/upload/{}/finalize'.format(upload_id)), 201)
+
+  def deletes(path, count=1):
+    # files to delete are uploaded before measurement, one batch per repetition
+    batches = iter([[check(client.post('/post-file', {'file': uploads.file()}, format='multipart'), 201).data['id']
+                     for _ in range(count)] for _ in range(options['repeat'])])
+    if count == 1:
+      return lambda: check(client.delete(path.format(next(batches)[0])), 204)
+    return lambda: check(client.post(path, {'ids': next(batches)}, format='json'), 200)
+
+  return [
+    ('/registration', '', register),
+    ('/api-token-auth', '', lambda: check(client.post('/api-token-auth', {'username': user.username, 'password': BENCHMARK_PASSWORD},
+                                                      format='json'), 200)),
+    ('/user-details', '', get('/user-details')),
+    ('/user-details', 'if_none_match', get('/user-details', 304, HTTP_IF_NONE_MATCH=etag)),
+    ('/trial-license-check', '', get('/trial-license-check')),
+    ('/trial-license-checks', '', lambda: check(client.post('/trial-license-checks', {'ids': user_ids}, format='json'), 200)),
+    ('/storage-usage', '', get('/storage-usage')),
+    ('/user-files', 'first_page', get('/user-files')),
+    ('/user-files', 'deep_page', get('/user-files?page={}'.format(deep_page))),
+    ('/user-files', 'cursor', get('/user-files?pagination=cursor')),
+    ('/user-files', 'fields', get('/user-files?fields=id,post_date&page_size=100')),
+    ('/user-files', 'media_type', get('/user-files?media_type=video')),
+    ('/user-files', 'posted_range', get('/user-files?posted_after=2020-01-01&posted_before=2020-02-01')),
+    ('/user-files', 'captured_date', get('/user-files?ordering=-captured_date')),
+    ('/all-files', 'first_page', get('/all-files')),
+    ('/all-files', 'deep_page', get('/all-files?page={}'.format(deep_page))),
+    ('/all-files', 'username', get('/all-files?username={}'.format(light_user.username))),
+    ('/all-files', 'media_type', get('/all-files?media_type=video')),
+    ('/sync', 'full', get('/sync')),
+    ('/sync', 'recent', get('/sync?cursor={}'.format(max(version - 100, 0)))),
+    ('/metrics', '', get('/metrics')),
+    ('/rendition', '', get('/rendition/{}/{}.jpg'.format(photo.id, settings.RENDITION_SIZES[0]))),
+    ('/media', '', get(settings.MEDIA_URL + photo.file)),
+    ('/post-file', '', post_file()),
+    ('/post-files', '', post_files),
+    ('/upload', 'chunked', chunked_upload),
+    ('/delete-file', '', deletes('/delete-file/{}')),
+    ('/delete-files', '', deletes('/delete-files', BULK_FILES)),
+    ('/async/user-details', '', get('/async/user-details')),
+    ('/async/user-files', '', get('/async/user-files')),
+    ('/async/all-files', '', get('/async/all-files')),
+    ('/async/post-file', '', post_file('/async/post-file')),
+    ('/async/delete-file', '', deletes('/async/delete-file/{}')),
+  ]
+
+def run(options):
+  dataset.generate(options['users'], options['rows'], options['media'], options['seed'])
+  user = dataset.get_dataset_users().get(username=dataset.DATASET_USERNAME_PREFIX + '0')
+  user.set_password(BENCHMARK_PASSWORD)
+  user.save(update_fields=['password'])
+  client = get_client(Token.objects.get_or_create(user=user)[0].key)
+  last_file_id = File.objects.order_by('-id').values_list('id', flat=True).first() or 0
+  last_task_id = Task.objects.order_by('-id').values_list('id', flat=True).first() or 0
+  results = []
+  try:
+    for endpoint, variant, call in get_cases(client, user, Uploads(options['seed']), options):
+      median, worst = measure(call, options['repeat'])
+      results.append({'scenario': 'api', 'endpoint': endpoint, 'variant': variant,
+                      'median_ms': round(median, 3), 'max_ms': round(worst, 3)})
+  finally:
+    # created files are deleted, and their processing and media removal tasks are run, so dataset stays the same
+    deletion.delete_files(File.objects.filter(id__gt=last_file_id))
+    User.objects.filter(username__startswith=REGISTRATION_USERNAME_PREFIX).delete()
+    while Task.objects.filter(id__gt=last_task_id).exists() and tasks.run_next_task():
+      pass
+  return results
@@ -0,0 +1,137 @@
+from django.core.asgi import get_asgi_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from rest_framework.authtoken.models import Token
+from PIL import Image
+import asyncio
+import concurrent.futures
+import io
+import statistics
+import threading
+import time
+from uniphoto import deletion
+from uniphoto.benchmarks import get_benchmark_user
+from uniphoto.models import File
+
+
+# Every connection is a slow client which sends small upload in CHUNKS parts over client delay seconds.
+# WSGI worker thread is held by connection while body is read, ASGI app awaits the body without a thread.
+# Sync /post-file is run under both servers and async /async/post-file under ASGI, so wsgi/sync against asgi/sync
+# shows what the server adds and asgi/sync against asgi/async shows what the async views add.
+CHUNKS = 10
+
+
+class ConnectionCounter:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.current = 0
+    self.peak = 0
+
+  def __enter__(self):
+    with self.lock:
+      self.current += 1
+      self.peak = max(self.peak, self.current)
+
+  def __exit__(self, *args):
+    with self.lock:
+      self.current -= 1
+
+def get_upload_body():
+  image = io.BytesIO()
+  Image.new('RGB', (64, 64), 'gray').save(image, 'JPEG')
+  return encode_multipart(BOUNDARY, {'file': SimpleUploadedFile('benchmark.jpg', image.getvalue())})
+
+def run_wsgi(path, token, body, connections, threads, delay):
+  handler = WSGIHandler()
+  counter = ConnectionCounter()
+
+  def connection(started):
+    # latency includes time connection waits in backlog for free worker thread
+    with counter:
+      # sync worker reads request body from slow client
+      time.sleep(delay)
+      environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': MULTIPART_CONTENT, 'CONTENT_LENGTH': str(len(body)), 'HTTP_AUTHORIZATION': 'Token ' + token,
+        'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+      }
+      statuses = []
+      response = handler(environ, lambda status, headers: statuses.append(status))
+      b''.join(response)
+      response.close()
+    assert statuses[0].startswith('201'), statuses[0]
+    return time.perf_counter() - started
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+    started = time.perf_counter()
+    latencies = list(executor.map(connection, [started] * connections))
+  return latencies, counter.peak
+
+def run_asgi(path, token, body, connections, delay):
+  application = get_asgi_application()
+  counter = ConnectionCounter()
+  chunk_size = -(-len(body) // CHUNKS)
+  scope = {
+    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+    'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+    'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    'headers': [(b'host', b'testserver'), (b'authorization', 'Token {}'.format(token).encode()),
+                (b'content-type', MULTIPART_CONTENT.encode()), (b'content-length', str(len(body)).encode())],
+  }
+
+  async def connection():
+    started = time.perf_counter()
+    offsets = iter(range(0, len(body), chunk_size))
+    statuses = []
+
+    async def receive():
+      offset = next(offsets, None)
+      if offset is None:
+        # client keeps connection open until response
+        await asyncio.Future()
+      await asyncio.sleep(delay / CHUNKS)
+      return {'type': 'http.request', 'body': body[offset:offset + chunk_size], 'more_body': offset + chunk_size < len(body)}
+
+    async def send(message):
+      if message['type'] == 'http.response.start':
+        statuses.append(message['status'])
+
+    with counter:
+      await application(dict(scope), receive, send)
+    assert statuses[0] == 201, statuses[0]
+    return time.perf_counter() - started
+
+  async def run_connections():
+    return await asyncio.gather(*[connection() for _ in range(connections)])
+
+  return asyncio.run(run_connections()), counter.peak
+
+def run(options):
+  user = get_benchmark_user()
+  token = Token.objects.get_or_create(user=user)[0].key
+  body = get_upload_body()
+  delay = options['client_delay']
+  last_id = File.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first() or 0
+  results = []
+  for connections in options['connections']:
+    cases = [
+      ('wsgi', 'sync', lambda: run_wsgi('/post-file', token, body, connections, options['threads'], delay)),
+      ('asgi', 'sync', lambda: run_asgi('/post-file', token, body, connections, delay)),
+      ('asgi', 'async', lambda: run_asgi('/async/post-file', token, body, connections, delay)),
+    ]
+    for server, view, call in cases:
+      started = time.perf_counter()
+      latencies, peak = call()
+      wall = time.perf_counter() - started
+      results.append({'scenario': 'concurrency', 'server': server, 'view': view, 'connections': connections,
+                      'threads': options['threads'] if server == 'wsgi' else 1,
+                      'held_connections': peak, 'requests_s': round(connections / wall, 1),
+                      'median_ms': round(statistics.median(latencies) * 1000, 3),
+                      'max_ms': round(max(latencies) * 1000, 3)})
+  # uploaded rows are removed, their shared blob is unlinked by task worker
+  deletion.delete_files(File.objects.filter(user=user, id__gt=last_id))
+  return results
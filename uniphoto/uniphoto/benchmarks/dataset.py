@@ -0,0 +1,182 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from PIL import Image
+import datetime
+import hashlib
+import io
+import itertools
+import os
+import random
+import struct
+from uniphoto import storage
+from uniphoto.models import Blob, File
+
+
+# Synthetic dataset of DATASET_USERNAME_PREFIX users, their files and media. Rows are generated from seed
+# only (no now() or random ids), so the same options give the same dataset on every machine.
+# Rows are streamed to COPY FROM STDIN, tables derived from files are filled by INSERT ... SELECT.
+DATASET_USERNAME_PREFIX = 'dataset_user_'
+DATASET_START_DATE = datetime.datetime(2019, 1, 1)
+DATASET_SPAN = datetime.timedelta(days=2 * 365)
+# share of media which are videos, and of files without capture date
+VIDEO_SHARE = 1 / 7
+UNCAPTURED_SHARE = 0.1
+COPY_BATCH_ROWS = 10000
+
+
+class RowsReader:
+  # file-like object which COPY reads tab separated rows from while they are generated
+  def __init__(self, rows):
+    self.lines = (('\t'.join(str(value) for value in row) + '\n').encode() for row in rows)
+    self.buffer = b''
+
+  def read(self, size=-1):
+    while size < 0 or len(self.buffer) < size:
+      chunk = b''.join(itertools.islice(self.lines, COPY_BATCH_ROWS))
+      if not chunk:
+        break
+      self.buffer += chunk
+    if size < 0:
+      size = len(self.buffer)
+    data, self.buffer = self.buffer[:size], self.buffer[size:]
+    return data
+
+
+def copy_rows(table, columns, rows):
+  with connection.cursor() as cursor:
+    cursor.copy_expert('COPY {}({}) FROM STDIN'.format(table, ', '.join(columns)), RowsReader(rows))
+
+def make_jpeg(rng, index):
+  image = Image.new('RGB', (rng.randrange(320, 1280, 16), rng.randrange(240, 960, 16)),
+                    tuple(rng.randrange(256) for _ in range(3)))
+  # a few blocks so that content (and its digest) differs between media of the same color
+  for _ in range(8):
+    left, top = rng.randrange(image.width - 32), rng.randrange(image.height - 32)
+    image.paste(tuple(rng.randrange(256) for _ in range(3)), (left, top, left + 32, top + 32))
+  exif = Image.Exif()
+  exif[0x0132] = (DATASET_START_DATE + datetime.timedelta(hours=index)).strftime('%Y:%m:%d %H:%M:%S')
+  content = io.BytesIO()
+  image.save(content, 'JPEG', quality=85, exif=exif)
+  return content.getvalue()
+
+def make_box(box_type, content):
+  return struct.pack('>I4s', 8 + len(content), box_type) + content
+
+def make_mp4(rng, index):
+  # ftyp, media data and moov with movie and track headers, the boxes which metadata extraction reads
+  mvhd = struct.pack('>I4I', 0, 3600 * index, 3600 * index, 1000, rng.randrange(1000, 60000)) + bytes(80)
+  tkhd = bytes(76) + struct.pack('>II', 1280 << 16, 720 << 16)
+  moov = make_box(b'moov', make_box(b'mvhd', mvhd) + make_box(b'trak', make_box(b'tkhd', tkhd)))
+  mdat_size = rng.randrange(64, 256) * 1024
+  mdat = make_box(b'mdat', rng.getrandbits(8 * mdat_size).to_bytes(mdat_size, 'little'))
+  return make_box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41') + mdat + moov
+
+def create_media(rng, count):
+  # media are stored as blobs which many file rows share, the same way deduplicated uploads are
+  blobs = []
+  for index in range(count):
+    video = rng.random() < VIDEO_SHARE
+    content = make_mp4(rng, index) if video else make_jpeg(rng, index)
+    digest = hashlib.sha256(content).hexdigest()
+    name = storage.get_blob_name(digest, '.mp4' if video else '.jpg')
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    if not os.path.exists(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      with open(path, 'wb') as file:
+        file.write(content)
+    blob = Blob.objects.get_or_create(digest=digest, defaults={'name': name})[0]
+    blobs.append((blob.id, name, len(content), File.MediaType.VIDEO if video else File.MediaType.PHOTO))
+  return blobs
+
+def get_dataset_users():
+  return User.objects.filter(username__startswith=DATASET_USERNAME_PREFIX)
+
+def generate(users, files, media, seed):
+  """
+  Create dataset of given numbers of users, files and distinct media, unless it exists.
+  Numbers of files per user follow Zipf distribution, as a few users own most of files of real services:
+  the first user is the heaviest one (and staff, so that it can read /metrics).
+  Return whether dataset was created.
+  """
+  existing_users = get_dataset_users().count()
+  if existing_users:
+    existing_files = File.objects.filter(user__username__startswith=DATASET_USERNAME_PREFIX).count()
+    if (existing_users, existing_files) != (users, files):
+      raise ValueError('Dataset of {} users and {} files exists, reset it first.'.format(existing_users, existing_files))
+    return False
+  rng = random.Random(seed)
+  with transaction.atomic():
+    blobs = create_media(rng, media)
+    # users get no usable password, benchmark sets password of the user it signs in as
+    copy_rows('auth_user', ['username', 'password', 'email', 'first_name', 'last_name', 'is_superuser', 'is_staff',
+                            'is_active', 'date_joined'],
+              (['{}{}'.format(DATASET_USERNAME_PREFIX, n), '!', '{}{}@uniphoto.com'.format(DATASET_USERNAME_PREFIX, n), '', '',
+                'f', 't' if n == 0 else 'f', 't', DATASET_START_DATE] for n in range(users)))
+    user_ids = dict(get_dataset_users().values_list('username', 'id'))
+    user_ids = [user_ids['{}{}'.format(DATASET_USERNAME_PREFIX, n)] for n in range(users)]
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(users)))
+    step = DATASET_SPAN / max(files, 1)
+
+    def file_rows():
+      for n in range(files):
+        blob_id, name, size, media_type = blobs[rng.randrange(len(blobs))]
+        user_id = user_ids[rng.choices(range(users), cum_weights=weights)[0]]
+        yield [name, user_id, DATASET_START_DATE + step * n, File.ProcessingStatus.DONE, media_type, size, blob_id]
+
+    copy_rows('uniphoto_file', ['file', 'user_id', 'post_date', 'processing_status', 'media_type', 'size', 'blob_id'], file_rows())
+    fill_derived_tables()
+  with connection.cursor() as cursor:
+    for table in ['auth_user', 'uniphoto_file', 'uniphoto_filemetadata', 'uniphoto_filechange', 'uniphoto_blob']:
+      cursor.execute('ANALYZE {};'.format(table))
+  return True
+
+def fill_derived_tables():
+  params = [DATASET_USERNAME_PREFIX + '%']
+  dataset_files = """
+                  SELECT uniphoto_file.* FROM uniphoto_file JOIN auth_user ON auth_user.id = uniphoto_file.user_id
+                  WHERE auth_user.username LIKE %s
+                  """
+  with connection.cursor() as cursor:
+    cursor.execute("""
+                   INSERT INTO uniphoto_filemetadata(file_id, user_id, captured_date, camera_make, camera_model)
+                   SELECT id, user_id, CASE WHEN id %% 10 < %s THEN NULL ELSE post_date - (id %% 1440) * interval '1 minute' END, '', ''
+                   FROM ({}) AS files
+                   """.format(dataset_files), [int(UNCAPTURED_SHARE * 10)] + params)
+    cursor.execute("""
+                   INSERT INTO uniphoto_filechange(user_id, version, file_id, kind, created_date)
+                   SELECT user_id, row_number() OVER (PARTITION BY user_id ORDER BY id), id, 'created', post_date
+                   FROM ({}) AS files
+                   """.format(dataset_files), params)
+    cursor.execute("""
+                   INSERT INTO uniphoto_changecounter(user_id, version, pruned_version)
+                   SELECT user_id, count(*), 0 FROM ({}) AS files GROUP BY user_id
+                   """.format(dataset_files), params)
+    cursor.execute("""
+                   INSERT INTO uniphoto_storageusage(user_id, used_bytes)
+                   SELECT user_id, sum(size) FROM ({}) AS files GROUP BY user_id
+                   """.format(dataset_files), params)
+    cursor.execute("""
+                   UPDATE uniphoto_blob SET reference_count = reference_count + counts.count
+                   FROM (SELECT blob_id, count(*) AS count FROM ({}) AS files GROUP BY blob_id) AS counts
+                   WHERE uniphoto_blob.id = counts.blob_id
+                   """.format(dataset_files), params)
+
+def reset():
+  """
+  Remove dataset rows, media of blobs are left for `manage.py collect_garbage`.
+  """
+  params = [DATASET_USERNAME_PREFIX + '%']
+  dataset_users = 'SELECT id FROM auth_user WHERE username LIKE %s'
+  with transaction.atomic(), connection.cursor() as cursor:
+    cursor.execute("""
+                   UPDATE uniphoto_blob SET reference_count = reference_count - counts.count
+                   FROM (SELECT blob_id, count(*) AS count FROM uniphoto_file
+                         WHERE blob_id IS NOT NULL AND user_id IN ({}) GROUP BY blob_id) AS counts
+                   WHERE uniphoto_blob.id = counts.blob_id
+                   """.format(dataset_users), params)
+    for table in ['uniphoto_filemetadata', 'uniphoto_filechange', 'uniphoto_changecounter', 'uniphoto_storageusage',
+                  'uniphoto_file', 'authtoken_token']:
+      cursor.execute('DELETE FROM {} WHERE user_id IN ({})'.format(table, dataset_users), params)
+  # the rest of rows which reference users (tasks, upload sessions) go through ORM cascade
+  get_dataset_users().delete()
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.test import override_settings
+from django.views.static import serve as static_serve
+from rest_framework.test import APIRequestFactory, force_authenticate
+import os
+from uniphoto.benchmarks import get_benchmark_user, measure
+from uniphoto.models import File
+from uniphoto.views import MediaFile
+
+
+BENCHMARK_FILE_NAME = 'benchmark_media.mp4'
+
+
+def get_benchmark_file(user, size):
+  path = os.path.join(settings.MEDIA_ROOT, BENCHMARK_FILE_NAME)
+  if not os.path.exists(path) or os.path.getsize(path) != size:
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    with open(path, 'wb') as file:
+      file.write(os.urandom(size))
+  File.objects.get_or_create(user=user, file=BENCHMARK_FILE_NAME, defaults={'processing_status': File.ProcessingStatus.DONE})
+  return path
+
+def consume(response):
+  if response.streaming:
+    return sum(len(chunk) for chunk in response.streaming_content)
+  return len(response.content)
+
+def run(options):
+  user = get_benchmark_user()
+  size = options['file_size'] * 1024 * 1024
+  get_benchmark_file(user, size)
+  factory = APIRequestFactory()
+  media_view = MediaFile.as_view()
+
+  def call_static(**headers):
+    return consume(static_serve(factory.get('/', **headers), BENCHMARK_FILE_NAME, document_root=settings.MEDIA_ROOT))
+
+  def call_view(**headers):
+    request = factory.get('/', **headers)
+    force_authenticate(request, user=user)
+    return consume(media_view(request, name=BENCHMARK_FILE_NAME))
+
+  request = factory.get('/')
+  force_authenticate(request, user=user)
+  etag = media_view(request, name=BENCHMARK_FILE_NAME)['ETag']
+  range_length = min(size, 1024 * 1024)
+  range_header = 'bytes={}-{}'.format(size // 2, size // 2 + range_length - 1)
+  cases = [
+    ('static_serve', 'full', size, lambda: call_static()),
+    ('media_view', 'full', size, lambda: call_view()),
+    ('static_serve', 'range', size, lambda: call_static(HTTP_RANGE=range_header)),
+    ('media_view', 'range', range_length, lambda: call_view(HTTP_RANGE=range_header)),
+    ('media_view', 'if_none_match', 0, lambda: call_view(HTTP_IF_NONE_MATCH=etag)),
+  ]
+  results = []
+  for server, mode, transferred, call in cases:
+    median, worst = measure(call, options['repeat'])
+    results.append({'scenario': 'media', 'server': server, 'mode': mode, 'bytes': transferred,
+                    'median_ms': round(median, 3), 'max_ms': round(worst, 3),
+                    'throughput_mb_s': round(transferred / 1024 / 1024 / (median / 1000), 1) if transferred else None})
+  with override_settings(MEDIA_OFFLOAD='x-accel-redirect'):
+    median, worst = measure(lambda: call_view(), options['repeat'])
+  results.append({'scenario': 'media', 'server': 'media_view', 'mode': 'x_accel_redirect', 'bytes': 0,
+                  'median_ms': round(median, 3), 'max_ms': round(worst, 3), 'throughput_mb_s': None})
+  return results
@@ -0,0 +1,36 @@
+from django.conf import settings
+from rest_framework.pagination import Cursor
+from uniphoto.benchmarks import get_benchmark_user, seed_files, measure, get_view_caller
+from uniphoto.models import File
+from uniphoto.pagination import FileCursorPagination
+from uniphoto.views import AllFilesList, UserFilesList
+
+
+def get_cursor_url(url, position):
+  paginator = FileCursorPagination()
+  paginator.base_url = 'http://testserver' + url
+  return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+
+def run(options):
+  user = get_benchmark_user()
+  seed_files(user, options['rows'])
+  page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+  endpoints = [
+    ('/all-files', AllFilesList.as_view(), File.objects.all()),
+    ('/user-files', UserFilesList.as_view(), File.objects.filter(user=user)),
+  ]
+  results = []
+  for url, view, queryset in endpoints:
+    ids = queryset.order_by('-id').values_list('id', flat=True)
+    for page in options['pages']:
+      # position of the last row of previous page, it is what next link of previous page carries
+      position = ids[(page - 1) * page_size - 1] if page > 1 else None
+      modes = {
+        'page_number': '{}?page={}'.format(url, page),
+        'cursor': get_cursor_url(url, position) if position is not None else url + '?pagination=cursor',
+      }
+      for mode, mode_url in modes.items():
+        median, worst = measure(get_view_caller(view, user, mode_url), options['repeat'])
+        results.append({'scenario': 'pagination', 'endpoint': url, 'mode': mode, 'page': page,
+                        'median_ms': round(median, 3), 'max_ms': round(worst, 3)})
+  return results
@@ -0,0 +1,32 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from uniphoto.benchmarks import get_benchmark_user, seed_files, measure
+from uniphoto.models import File
+from uniphoto.renderers import FastJSONRenderer
+from uniphoto.serializers import FileRowsSerializer, UserFilesSerializer
+
+
+def run(options):
+  user = get_benchmark_user()
+  seed_files(user, max(options['rows'], max(options['page_sizes'])))
+  request = Request(APIRequestFactory().get('/user-files'))
+  queryset = File.objects.filter(user=user).order_by('-id')
+
+  def serialize(page_size):
+    files = list(queryset[:page_size])
+    return JSONRenderer().render(UserFilesSerializer(files, many=True, context={'request': request}).data)
+
+  def serialize_rows(page_size):
+    rows_serializer = FileRowsSerializer(UserFilesSerializer, request)
+    rows = list(queryset.values_list(*rows_serializer.get_row_fields(), named=True)[:page_size])
+    return FastJSONRenderer().render(rows_serializer.serialize(rows))
+
+  results = []
+  for page_size in options['page_sizes']:
+    for mode, func in [('model_serializer', serialize), ('values_list', serialize_rows)]:
+      median, worst = measure(lambda: func(page_size), options['repeat'])
+      results.append({'scenario': 'serialization', 'mode': mode, 'page_size': page_size,
+                      'median_ms': round(median, 3), 'max_ms': round(worst, 3),
+                      'per_row_us': round(median * 1000 / page_size, 2)})
+  return results
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+import datetime
+from . import versions
+from .models import ChangeCounter, FileChange
+
+
+# Change log of user files: every created and deleted file gets next version of its user, so client keeps
+# the last version it has seen as cursor and asks only for changes after it.
+
+def record_changes(user_id, kind, file_ids):
+  """
+  Append changes of files to change log of user in the current transaction.
+  Counter row stays locked until commit, so versions of user become visible in order and sync can't skip
+  a version which is committed later. It's taken as the last lock of transaction to keep it short.
+  """
+  if not file_ids:
+    return
+  with transaction.atomic():
+    counter = ChangeCounter.objects.select_for_update().get_or_create(user_id=user_id)[0]
+    FileChange.objects.bulk_create([FileChange(user_id=user_id, version=counter.version + index, file_id=file_id, kind=kind)
+                                    for index, file_id in enumerate(file_ids, 1)])
+    ChangeCounter.objects.filter(user_id=user_id).update(version=counter.version + len(file_ids), **versions.get_bump_fields())
+    versions.list_changed(created=file_ids if kind == FileChange.Kind.CREATED else (),
+                          deleted=file_ids if kind == FileChange.Kind.DELETED else ())
+
+def get_changes_queryset(user_id, cursor):
+  # range scan of file_change_version_uniq
+  return FileChange.objects.filter(user_id=user_id, version__gt=cursor).order_by('version').values_list('version', 'file_id', 'kind')
+
+def get_version(user_id):
+  return ChangeCounter.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+def get_changes(user_id, cursor, limit):
+  """
+  Return changes after cursor as {'cursor', 'has_more', 'created', 'deleted'} or None when cursor
+  can't be served because its changes were pruned or it's ahead of the log.
+  File which is created and deleted after cursor isn't reported at all.
+  """
+  rows = list(get_changes_queryset(user_id, cursor)[:limit + 1])
+  # counter is read after changes, so pruning which committed before changes were read is always seen
+  counter = ChangeCounter.objects.filter(user_id=user_id).values_list('version', 'pruned_version').first() or (0, 0)
+  if cursor < counter[1] or cursor > counter[0]:
+    return None
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  kinds = {}
+  for _, file_id, kind in rows:
+    first_kind = kinds.get(file_id, (kind, kind))[0]
+    kinds[file_id] = (first_kind, kind)
+  return {
+    'cursor': rows[-1][0] if rows else cursor,
+    'has_more': has_more,
+    # file ids aren't reused, so deleted file can't be created again
+    'created': [file_id for file_id, (_, kind) in kinds.items() if kind == FileChange.Kind.CREATED],
+    'deleted': [file_id for file_id, (first_kind, kind) in kinds.items()
+                if kind == FileChange.Kind.DELETED and first_kind != FileChange.Kind.CREATED],
+  }
+
+def get_expired_versions(created_before):
+  # (user id, last expired version) pairs, expired changes are found by range scan of file_change_created_idx
+  return (FileChange.objects.filter(created_date__lt=created_before).order_by().values('user_id')
+          .annotate(version=Max('version')).values_list('user_id', 'version'))
+
+def remove_changes(user_id):
+  # range scans of file_change_version_uniq and primary key of counter
+  FileChange.objects.filter(user_id=user_id).delete()
+  ChangeCounter.objects.filter(user_id=user_id).delete()
+
+def prune_changes(max_age, dry_run=False):
+  """
+  Remove changes older than max_age seconds, return number of removed changes.
+  Change log of deleted user is removed with the user, so the whole log is never scanned.
+  """
+  removed = 0
+  created_before = timezone.now() - datetime.timedelta(seconds=max_age)
+  for user_id, version in get_expired_versions(created_before):
+    queryset = FileChange.objects.filter(user_id=user_id, version__lte=version)
+    if dry_run:
+      removed += queryset.count()
+      continue
+    with transaction.atomic():
+      ChangeCounter.objects.filter(user_id=user_id, pruned_version__lt=version).update(pruned_version=version)
+      removed += queryset.delete()[0]
+  return removed
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import collections
+import datetime
+import itertools
+import os
+import time
+import uuid
+from . import changes, media, quota, storage, tasks
+from .models import Blob, File, FileChange, FileMetadata, UploadSession
+
+
+def raw_delete(queryset):
+  """
+  Delete rows of queryset by a single DELETE, without collecting related objects and sending signals.
+  """
+  # QuerySet.delete() would load every file and send post_delete, which updates usage and change log per file.
+  # _raw_delete is private API of Django (3.1), test_raw_delete fails when its signature changes
+  return queryset._raw_delete(queryset.db)
+
+def delete_files(queryset):
+  """
+  Delete files of queryset and return their ids.
+  Media is removed by remove_files task enqueued in the same transaction, so the task is a durable
+  journal entry which worker runs only after commit and retries after a crash.
+  """
+  with transaction.atomic():
+    files = list(queryset.select_for_update().values_list('id', 'file', 'blob_id', 'user_id', 'size'))
+    deleted_ids = [file_id for file_id, _, _, _, _ in files]
+    if not deleted_ids:
+      return deleted_ids
+    # post_delete receivers are replaced by explicit updates below
+    raw_delete(FileMetadata.objects.filter(file_id__in=deleted_ids))
+    raw_delete(File.objects.filter(id__in=deleted_ids))
+    blob_counts = collections.Counter(blob_id for _, _, blob_id, _, _ in files if blob_id is not None)
+    released_blobs = storage.release_blobs(blob_counts) if blob_counts else []
+    names = [name for _, name, blob_id, _, _ in files if blob_id is None]
+    if names or released_blobs:
+      tasks.enqueue('remove_files', names=names, blobs=[[blob.digest, blob.name] for blob in released_blobs])
+    # rows of users are locked in id order, so concurrent deletions can't deadlock
+    user_file_ids = collections.defaultdict(list)
+    user_sizes = collections.Counter()
+    for file_id, _, _, user_id, size in files:
+      user_file_ids[user_id].append(file_id)
+      user_sizes[user_id] += size or 0
+    for user_id in sorted(user_file_ids):
+      quota.add_usage(user_id, -user_sizes[user_id])
+    for user_id in sorted(user_file_ids):
+      changes.record_changes(user_id, FileChange.Kind.DELETED, user_file_ids[user_id])
+  return deleted_ids
+
+def walk_media(directory):
+  # yields files one by one, so memory use doesn't depend on number of files in media
+  directories = [directory]
+  while directories:
+    with os.scandir(directories.pop()) as entries:
+      for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+          directories.append(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+          yield entry
+
+def get_batches(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    batch = list(itertools.islice(iterator, size))
+    if not batch:
+      return
+    yield batch
+
+def get_upload_session_id(name):
+  try:
+    return uuid.UUID(os.path.splitext(os.path.basename(name))[0])
+  except ValueError:
+    return None
+
+def get_unreferenced_names(names):
+  # renditions are referenced through their source file, partial uploads through their upload session
+  uploads_prefix = settings.UPLOADS_DIR + '/'
+  upload_names = {name: get_upload_session_id(name) for name in names if name.startswith(uploads_prefix)}
+  sources = {name: media.get_source_name(name) for name in names if name not in upload_names}
+  referenced_sources = set(File.objects.filter(file__in=set(sources.values())).values_list('file', flat=True))
+  session_ids = set(UploadSession.objects.filter(id__in=[session_id for session_id in upload_names.values() if session_id is not None])
+                    .values_list('id', flat=True))
+  return ([name for name, source in sources.items() if source not in referenced_sources] +
+          [name for name, session_id in upload_names.items() if session_id not in session_ids])
+
+def remove_unreferenced_media(min_age, batch_size, dry_run=False):
+  """
+  Remove media files older than min_age seconds which aren't referenced by any file or upload session.
+  Media is scanned and checked in batches, files younger than min_age may belong to uncommitted uploads.
+  """
+  removed = 0
+  max_mtime = time.time() - min_age
+  entries = (entry for entry in walk_media(settings.MEDIA_ROOT) if entry.stat(follow_symlinks=False).st_mtime <= max_mtime)
+  names = (os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/') for entry in entries)
+  for batch in get_batches(names, batch_size):
+    for name in get_unreferenced_names(batch):
+      removed += 1
+      if dry_run:
+        continue
+      digest = media.get_blob_digest(name)
+      if digest is not None:
+        # unlinked under placeholder row, as concurrent upload of the same content may take it
+        storage.unlink_blob(digest, name)
+      else:
+        try:
+          os.remove(os.path.join(settings.MEDIA_ROOT, name))
+        except FileNotFoundError:
+          pass
+  return removed
+
+def remove_stale_upload_sessions(batch_size, dry_run=False):
+  removed = 0
+  created_before = timezone.now() - datetime.timedelta(seconds=settings.UPLOAD_SESSION_MAX_AGE_SECONDS)
+  queryset = UploadSession.objects.filter(created_date__lt=created_before)
+  for batch in get_batches(queryset.values_list('id', flat=True).iterator(chunk_size=batch_size), batch_size):
+    removed += len(batch)
+    if dry_run:
+      continue
+    UploadSession.objects.filter(id__in=batch).delete()
+    for upload_session_id in batch:
+      storage.remove_partial_upload(upload_session_id)
+  return removed
+
+def remove_orphan_blobs(batch_size, dry_run=False):
+  removed = 0
+  queryset = Blob.objects.filter(files__isnull=True)
+  for blob_id in queryset.values_list('id', flat=True).iterator(chunk_size=batch_size):
+    with transaction.atomic():
+      # row lock waits for upload which is storing the same content right now
+      blob = Blob.objects.select_for_update().filter(id=blob_id).first()
+      if blob is None or blob.files.exists():
+        continue
+      removed += 1
+      if not dry_run:
+        blob.delete()
+        storage.remove_media(blob.name)
+  return removed
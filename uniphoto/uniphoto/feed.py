@@ -0,0 +1,189 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F, Q
+import copy
+import hashlib
+import time
+from . import versions
+from .models import File, FileListChange, FileListVersion
+from .renderers import FastJSONRenderer
+from .serializers import AllFilesSerializer, FileRowsSerializer
+
+
+# first FEED_CACHE['PAGES'] pages of global feed are kept in cache as serialized items with relative urls and count
+# of all files. Cached state is labelled with global revision of database (versions.py), state of older revision
+# applies changes logged up to the requested revision (FileListChange), so changes made by other processes
+# (and task worker) are seen even with per-process cache. Feed is read again only when it isn't cached, when
+# logged changes are missing and every FEED_CACHE['TIMEOUT'] seconds by one process at a time.
+STATE_KEY = 'uniphoto:feed:state'
+REBUILD_KEY = 'uniphoto:feed:rebuild'
+PAGE_KEY = 'uniphoto:feed:page:{}'
+
+
+def get_cache():
+  return caches[settings.FEED_CACHE['BACKEND']]
+
+def get_capacity():
+  return settings.FEED_CACHE['PAGES'] * settings.REST_FRAMEWORK['PAGE_SIZE']
+
+def get_feed_queryset(with_username=True):
+  queryset = File.objects.all().order_by(F('id').desc())
+  return queryset.annotate(username=F('user__username')) if with_username else queryset
+
+def serialize(queryset):
+  # without request urls are relative, they are made absolute per request
+  rows_serializer = FileRowsSerializer(AllFilesSerializer)
+  return rows_serializer.serialize(queryset.values_list(*rows_serializer.get_row_fields(), named=True))
+
+def read_snapshot():
+  # one statement reads one snapshot: count includes changes up to revision and the committed changes
+  # which aren't given revision yet, they are skipped when they are applied
+  with connection.cursor() as cursor:
+    cursor.execute('SELECT (SELECT revision FROM {} WHERE id = %s), (SELECT count(*) FROM {}), '
+                   'ARRAY(SELECT id FROM {} WHERE revision IS NULL)'.format(
+                     FileListVersion._meta.db_table, File._meta.db_table, FileListChange._meta.db_table),
+                   [versions.GLOBAL_VERSION_ID])
+    revision, count, pending = cursor.fetchone()
+  return revision or 0, count, pending
+
+def build_state():
+  revision, count, pending = read_snapshot()
+  # rows are read after snapshot, so they are at least as new as revision and changes which are
+  # committed meanwhile are applied again
+  items = serialize(get_feed_queryset()[:get_capacity()])
+  return {'revision': revision, 'count': count, 'applied': pending, 'items': items, 'built_time': time.time()}
+
+def get_changes(revision, requested_revision):
+  """
+  Return changes after revision up to requested revision or None when some of them are missing (pruned or lost).
+  """
+  if requested_revision - revision > settings.FEED_CACHE['MAX_CHANGES']:
+    return None
+  changes = list(FileListChange.objects.filter(revision__gt=revision, revision__lte=requested_revision).order_by('revision')
+                 .values_list('id', 'created', 'deleted', 'updated', 'user_ids'))
+  return changes if len(changes) == requested_revision - revision else None
+
+def apply_changes(state, changes, revision):
+  # rows of created and updated files in window are read again, deleted files leave window which is refilled
+  # from rows after it. Reading rows is idempotent, so rows which are newer than revision don't matter
+  capacity = get_capacity()
+  count, applied = state['count'], set(state['applied'])
+  items = {item['id']: item for item in state['items']}
+  # files below the last item of full window aren't cached
+  floor = min(items) if len(items) >= capacity else 0
+  file_ids, user_ids = set(), set()
+  for change_id, created, deleted, updated, change_user_ids in changes:
+    if change_id in applied:
+      applied.remove(change_id)
+    else:
+      count += len(created) - len(deleted)
+    for file_id in deleted:
+      items.pop(file_id, None)
+    file_ids.update(file_id for file_id in created + updated if file_id in items or file_id > floor)
+    user_ids.update(change_user_ids)
+  if file_ids or user_ids:
+    queryset = get_feed_queryset().filter(Q(id__in=file_ids) | Q(id__in=list(items), user_id__in=user_ids))
+    rows = {item['id']: item for item in serialize(queryset)}
+    # file which isn't there anymore is deleted by change after revision
+    for file_id in file_ids - set(rows):
+      items.pop(file_id, None)
+    items.update(rows)
+  items = sorted(items.values(), key=lambda item: item['id'], reverse=True)[:capacity]
+  if len(items) < min(capacity, count) and floor:
+    lowest = items[-1]['id'] if items else floor
+    items += serialize(get_feed_queryset().filter(id__lt=lowest)[:capacity - len(items)])
+  return dict(state, revision=revision, count=count, applied=list(applied), items=items)
+
+def rebuild_state(cache):
+  # only one process reads the whole feed at a time, others keep applying changes to state they have
+  if not cache.add(REBUILD_KEY, True, settings.FEED_CACHE['TIMEOUT']):
+    return None
+  try:
+    state = build_state()
+    cache.set(STATE_KEY, state, None)
+  finally:
+    cache.delete(REBUILD_KEY)
+  return state
+
+def get_state(revision):
+  """
+  Return cached state which is at least as new as revision or None when state is being rebuilt by other process.
+  """
+  cache = get_cache()
+  state = cache.get(STATE_KEY)
+  if state is None:
+    return rebuild_state(cache)
+  if time.time() - state['built_time'] > settings.FEED_CACHE['TIMEOUT']:
+    state = rebuild_state(cache) or state
+  if state['revision'] >= revision:
+    return state
+  changes = get_changes(state['revision'], revision)
+  if changes is None:
+    return rebuild_state(cache)
+  state = apply_changes(state, changes, revision)
+  cache.set(STATE_KEY, state, None)
+  return state
+
+def make_absolute(item, request):
+  item = copy.deepcopy(item)
+  item['file'] = request.build_absolute_uri(item['file'])
+  if item['renditions'] is not None:
+    for urls in item['renditions'].values():
+      for extension, url in urls.items():
+        urls[extension] = request.build_absolute_uri(url)
+  return item
+
+
+class PrerenderedResponse(Response):
+  # response which JSON is rendered once per feed version, other formats are rendered as usual
+
+  def __init__(self, data, content, **kwargs):
+    super().__init__(data, **kwargs)
+    self.prerendered_content = content
+
+  @property
+  def rendered_content(self):
+    if not isinstance(self.accepted_renderer, JSONRenderer) or ';' in self.accepted_media_type:
+      return super().rendered_content
+    self['Content-Type'] = self.content_type or self.accepted_renderer.media_type
+    return self.prerendered_content
+
+
+def get_page_response(request, page_number, version=None):
+  """
+  Return response for page of global feed or None when page isn't kept in cache.
+  Version is token of global files version, when caller has read it already.
+  """
+  if page_number > settings.FEED_CACHE['PAGES']:
+    return None
+  state = get_state(versions.get_revision(version if version is not None else versions.get_version()[0]))
+  if state is None:
+    return None
+  page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+  items = state['items'][(page_number - 1) * page_size:page_number * page_size]
+  if not items and page_number > 1:
+    return None
+
+  url = request.build_absolute_uri()
+  cache = get_cache()
+  page_key = PAGE_KEY.format(hashlib.md5('{}:{}'.format(state['revision'], url).encode()).hexdigest())
+  page = cache.get(page_key)
+  if page is None:
+    next_link, previous_link = None, None
+    if page_number * page_size < state['count']:
+      next_link = replace_query_param(url, 'page', page_number + 1)
+    if page_number > 1:
+      previous_link = remove_query_param(url, 'page') if page_number == 2 else replace_query_param(url, 'page', page_number - 1)
+    data = {
+      'count': state['count'],
+      'next': next_link,
+      'previous': previous_link,
+      'results': [make_absolute(item, request) for item in items],
+    }
+    page = (data, FastJSONRenderer().render(data))
+    cache.set(page_key, page, settings.FEED_CACHE['TIMEOUT'])
+  return PrerenderedResponse(*page)
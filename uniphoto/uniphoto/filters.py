@@ -0,0 +1,105 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from django.contrib.auth.models import User
+from django.db.models import F, Subquery
+from django.utils.dateparse import parse_date, parse_datetime
+import datetime
+from .models import File
+
+
+ORDERING_QUERY_PARAM = 'ordering'
+CAPTURED_DATE_QUERY_PARAMS = ('captured_after', 'captured_before')
+# ?ordering= values, cursor pagination keeps its position in the first field
+ORDERINGS = {
+  '-id': ('-id',),
+  'captured_date': ('captured_date', 'id'),
+  '-captured_date': ('-captured_date', '-id'),
+}
+
+
+def has_captured_date_range(request):
+  return any(name in request.query_params for name in CAPTURED_DATE_QUERY_PARAMS)
+
+def get_ordering(request):
+  # date range is listed in order of capture date unless ordering is given
+  default = '-captured_date' if has_captured_date_range(request) else '-id'
+  value = request.query_params.get(ORDERING_QUERY_PARAM, default)
+  if value not in ORDERINGS:
+    raise ValidationError({ORDERING_QUERY_PARAM: ['Unknown ordering. Available orderings: {}.'.format(', '.join(ORDERINGS))]})
+  return ORDERINGS[value]
+
+def is_captured_date_query(request):
+  return has_captured_date_range(request) or get_ordering(request)[0].lstrip('-') == 'captured_date'
+
+def parse_date_param(request, name):
+  value = request.query_params.get(name)
+  if value is None:
+    return None
+  try:
+    parsed = parse_datetime(value) or parse_date(value)
+  except ValueError:
+    parsed = None
+  if parsed is None:
+    raise ValidationError({name: ['Date has wrong format. Use ISO 8601 date or date and time.']})
+  if not isinstance(parsed, datetime.datetime):
+    parsed = datetime.datetime.combine(parsed, datetime.time())
+  return parsed
+
+
+class CapturedDateFilter(BaseFilterBackend):
+  """
+  ?captured_after= and ?captured_before= (ISO 8601, after is inclusive) and ?ordering=[-]captured_date
+  list only files which metadata has capture date, in order of metadata indexes.
+  Views of user files match user on metadata table for such queries (see is_captured_date_query).
+  """
+
+  def get_ordering(self, request, queryset, view):
+    # cursor pagination takes ordering from filter backend which has get_ordering
+    return get_ordering(request)
+
+  def filter_queryset(self, request, queryset, view):
+    if not is_captured_date_query(request):
+      return queryset
+    captured_after = parse_date_param(request, 'captured_after')
+    captured_before = parse_date_param(request, 'captured_before')
+    queryset = queryset.annotate(captured_date=F('metadata__captured_date')).filter(captured_date__isnull=False)
+    if captured_after is not None:
+      queryset = queryset.filter(captured_date__gte=captured_after)
+    if captured_before is not None:
+      queryset = queryset.filter(captured_date__lt=captured_before)
+    return queryset.order_by(*get_ordering(request))
+
+
+class FileFilter(BaseFilterBackend):
+  """
+  ?posted_after= and ?posted_before= (ISO 8601, after is inclusive) and ?media_type=photo|video,
+  each served by file indexes with and without leading user column.
+  """
+
+  def filter_queryset(self, request, queryset, view):
+    posted_after = parse_date_param(request, 'posted_after')
+    posted_before = parse_date_param(request, 'posted_before')
+    media_type = request.query_params.get('media_type')
+    if posted_after is not None:
+      queryset = queryset.filter(post_date__gte=posted_after)
+    if posted_before is not None:
+      queryset = queryset.filter(post_date__lt=posted_before)
+    if media_type is not None:
+      if media_type not in File.MediaType.values:
+        raise ValidationError({'media_type': ['Unknown media type. Available media types: {}.'.format(
+          ', '.join(File.MediaType.values))]})
+      queryset = queryset.filter(media_type=media_type)
+    return queryset
+
+
+class UsernameFilter(BaseFilterBackend):
+  """
+  ?username= lists files of one user, served by unique username index and user_files_idx.
+  """
+
+  def filter_queryset(self, request, queryset, view):
+    username = request.query_params.get('username')
+    if username is None:
+      return queryset
+    # user_id = (SELECT ...) is looked up once, so files are read from user index in id order instead of joined
+    return queryset.filter(user=Subquery(User.objects.filter(username=username).values('id')))
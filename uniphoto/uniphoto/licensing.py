@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils import timezone
+import collections
+import datetime
+from .authentication import LRUCache
+
+
+# Trial license lasts TRIAL_LICENSE_DAYS calendar days of TIME_ZONE from the day user joined. Entitlement of user
+# changes only at day boundary, so it's cached until the next midnight of TIME_ZONE.
+TRIAL_LICENSE_DAYS = 30
+
+Entitlement = collections.namedtuple('Entitlement', ['user_id', 'trial_start', 'day'])
+
+local_entitlement_cache = LRUCache()
+
+
+def get_local_now():
+  # naive datetimes are in TIME_ZONE when USE_TZ is False
+  now = timezone.now()
+  return timezone.localtime(now).replace(tzinfo=None) if timezone.is_aware(now) else now
+
+def get_local_date(value):
+  return (timezone.localtime(value) if timezone.is_aware(value) else value).date()
+
+def get_cache_timeout(now):
+  # seconds until the next day boundary
+  next_day = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+  return max(int((next_day - now).total_seconds()), 1)
+
+def get_days_to_license_end(entitlement, license_duration=TRIAL_LICENSE_DAYS):
+  return max(license_duration - (entitlement.day - entitlement.trial_start).days, 0)
+
+def get_cache_key(user_id):
+  return 'uniphoto:entitlement:{}'.format(user_id)
+
+def get_cached_entitlements(user_ids, day):
+  options = settings.LICENSE_CACHE
+  if options['BACKEND'] is not None:
+    entitlements = caches[options['BACKEND']].get_many([get_cache_key(user_id) for user_id in user_ids]).values()
+  else:
+    entitlements = [local_entitlement_cache.get(user_id) for user_id in user_ids]
+  # entry of previous day can outlive its timeout by clock rounding
+  return {entitlement.user_id: entitlement for entitlement in entitlements if entitlement is not None and entitlement.day == day}
+
+def set_cached_entitlements(entitlements, now):
+  options = settings.LICENSE_CACHE
+  timeout = get_cache_timeout(now)
+  if options['BACKEND'] is not None:
+    caches[options['BACKEND']].set_many({get_cache_key(entitlement.user_id): entitlement for entitlement in entitlements}, timeout)
+  else:
+    for entitlement in entitlements:
+      local_entitlement_cache.set(entitlement.user_id, entitlement, timeout, options['MAX_SIZE'])
+
+def invalidate_cached_entitlement(user_id):
+  options = settings.LICENSE_CACHE
+  if options['BACKEND'] is not None:
+    caches[options['BACKEND']].delete(get_cache_key(user_id))
+  local_entitlement_cache.delete(user_id)
+
+def get_entitlement(user):
+  """
+  Return entitlement of user which is loaded already (by authentication), without query.
+  """
+  now = get_local_now()
+  entitlement = get_cached_entitlements([user.id], now.date()).get(user.id)
+  if entitlement is None:
+    entitlement = Entitlement(user.id, get_local_date(user.date_joined), now.date())
+    set_cached_entitlements([entitlement], now)
+  return entitlement
+
+def get_entitlements(user_ids):
+  """
+  Return {user id: entitlement} of existing users of user_ids, users missing in cache are read by one query.
+  """
+  now = get_local_now()
+  entitlements = get_cached_entitlements(user_ids, now.date())
+  missing_ids = [user_id for user_id in user_ids if user_id not in entitlements]
+  if missing_ids:
+    loaded = [Entitlement(user_id, get_local_date(date_joined), now.date())
+              for user_id, date_joined in User.objects.filter(id__in=missing_ids).values_list('id', 'date_joined')]
+    set_cached_entitlements(loaded, now)
+    entitlements.update((entitlement.user_id, entitlement) for entitlement in loaded)
+  return entitlements
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from uniphoto import quota
+
+
+class Command(BaseCommand):
+  help = 'Set sizes of files uploaded before sizes were recorded and add them to storage usage of their users.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of files updated by one transaction.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of threads reading file sizes.')
+
+  def handle(self, *args, **options):
+    updated, missing = quota.backfill_sizes(options['batch_size'], options['workers'])
+    self.stdout.write('files={}'.format(updated))
+    self.stdout.write('missing={}'.format(missing))
@@ -0,0 +1,81 @@
+from django import get_version
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from importlib import import_module
+import datetime
+import json
+import platform
+import subprocess
+
+
+SCENARIOS = ['pagination', 'media', 'concurrency', 'serialization', 'api']
+METRIC_KEYS = ['median_ms', 'max_ms']
+
+
+def get_git_commit():
+  try:
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, check=True, text=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def get_case_key(result):
+  # results of two runs are matched by every value except measurements
+  return tuple(sorted((key, value) for key, value in result.items() if key not in METRIC_KEYS))
+
+def compare(results, baseline):
+  baseline_results = {get_case_key(result): result for result in baseline['results']}
+  for result in results:
+    baseline_result = baseline_results.get(get_case_key(result))
+    if baseline_result is not None and 'median_ms' in result:
+      result['baseline_median_ms'] = baseline_result['median_ms']
+      result['change_pct'] = round((result['median_ms'] / baseline_result['median_ms'] - 1) * 100, 1)
+  return results
+
+
+class Command(BaseCommand):
+  help = 'Run benchmark scenario against configured database. Use a dedicated database as benchmark data is kept between runs.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('scenario', choices=SCENARIOS)
+    parser.add_argument('--rows', type=int, default=2000000, help='Number of synthetic files to seed before run.')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10000], help='Page numbers to measure.')
+    parser.add_argument('--file-size', type=int, default=50, help='Size of served media file in MiB.')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of measurements per case.')
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100, 1000], help='Page sizes to serialize.')
+    parser.add_argument('--connections', type=int, nargs='+', default=[10, 100], help='Numbers of concurrent slow clients.')
+    parser.add_argument('--threads', type=int, default=8, help='Worker threads of WSGI process.')
+    parser.add_argument('--client-delay', type=float, default=0.5, help='Seconds slow client takes to send request body.')
+    parser.add_argument('--users', type=int, default=5000, help='Number of users of synthetic dataset (api scenario).')
+    parser.add_argument('--media', type=int, default=100, help='Number of distinct media of synthetic dataset (api scenario).')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of synthetic dataset (api scenario).')
+    parser.add_argument('--output', help='Write results with run metadata to JSON file.')
+    parser.add_argument('--baseline', help='JSON file of earlier run (--output) to compare median times with.')
+
+  def handle(self, *args, **options):
+    baseline = None
+    if options['baseline']:
+      try:
+        with open(options['baseline']) as file:
+          baseline = json.load(file)
+      except (OSError, ValueError) as exc:
+        raise CommandError('Cannot read baseline: {}'.format(exc))
+    module = import_module('uniphoto.benchmarks.' + options['scenario'])
+    results = module.run(options)
+    if baseline is not None:
+      results = compare(results, baseline)
+    for result in results:
+      self.stdout.write(' '.join('{}={}'.format(key, value) for key, value in result.items()))
+    if options['output']:
+      run_options = {key: options[key] for key in ['rows', 'pages', 'file_size', 'repeat', 'page_sizes', 'connections', 'threads',
+                                                   'client_delay', 'users', 'media', 'seed']}
+      meta = {
+        'scenario': options['scenario'],
+        'options': run_options,
+        'commit': get_git_commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': get_version(),
+        'database': '{} {}'.format(connection.vendor, getattr(connection, 'pg_version', '')),
+      }
+      with open(options['output'], 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2, default=str)
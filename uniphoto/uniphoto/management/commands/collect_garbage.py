@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from uniphoto import changes, deletion, versions
+
+
+class Command(BaseCommand):
+  help = 'Remove stale upload sessions, orphan blobs, media files which aren\'t referenced by any file, expired file changes and changes of all files list which cached feed doesn\'t apply anymore.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--min-age', type=int, default=24 * 3600,
+                        help='Seconds since modification before unreferenced media file is removed.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of media files checked by one query.')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed.')
+
+  def handle(self, *args, **options):
+    batch_size, dry_run = options['batch_size'], options['dry_run']
+    # sessions and blobs go first, so that their media is removed by the same run
+    upload_sessions = deletion.remove_stale_upload_sessions(batch_size, dry_run)
+    blobs = deletion.remove_orphan_blobs(batch_size, dry_run)
+    media_files = deletion.remove_unreferenced_media(options['min_age'], batch_size, dry_run)
+    file_changes = changes.prune_changes(settings.FILE_CHANGES_RETENTION_SECONDS, dry_run)
+    file_list_changes = versions.prune_list_changes(settings.FEED_CACHE['MAX_CHANGES'], settings.FEED_CACHE['TIMEOUT'], dry_run)
+    self.stdout.write('upload_sessions={}'.format(upload_sessions))
+    self.stdout.write('blobs={}'.format(blobs))
+    self.stdout.write('media_files={}'.format(media_files))
+    self.stdout.write('file_changes={}'.format(file_changes))
+    self.stdout.write('file_list_changes={}'.format(file_list_changes))
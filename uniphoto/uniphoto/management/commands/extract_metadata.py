@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+import functools
+import operator
+from uniphoto import deletion, metadata, tasks
+from uniphoto.models import File
+
+
+class Command(BaseCommand):
+  help = 'Enqueue metadata extraction of files which have no metadata, tasks are run by `manage.py process_tasks`.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of tasks enqueued by one query.')
+
+  def handle(self, *args, **options):
+    extensions = functools.reduce(operator.or_, [Q(file__iendswith=extension)
+                                                 for extension in metadata.JPEG_EXTENSIONS + metadata.MP4_EXTENSIONS])
+    queryset = File.objects.filter(extensions, metadata__isnull=True).order_by('id').values_list('id', flat=True)
+    enqueued = 0
+    for batch in deletion.get_batches(queryset.iterator(chunk_size=options['batch_size']), options['batch_size']):
+      tasks.enqueue_many('extract_metadata', [{'file_id': file_id} for file_id in batch])
+      enqueued += len(batch)
+    self.stdout.write('tasks={}'.format(enqueued))
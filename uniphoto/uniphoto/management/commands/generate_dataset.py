@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from uniphoto.benchmarks import dataset
+
+
+class Command(BaseCommand):
+  help = ('Generate reproducible synthetic dataset of users, files and media for benchmarks. '
+          'Use a dedicated database and media root, dataset is kept until --reset.')
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=5000, help='Number of users.')
+    parser.add_argument('--files', type=int, default=2000000, help='Number of files, shared by users by Zipf distribution.')
+    parser.add_argument('--media', type=int, default=100, help='Number of distinct synthetic media which files reference.')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of random generator, the same seed gives the same dataset.')
+    parser.add_argument('--reset', action='store_true', help='Remove existing dataset first.')
+
+  def handle(self, *args, **options):
+    if options['reset']:
+      dataset.reset()
+    try:
+      created = dataset.generate(options['users'], options['files'], options['media'], options['seed'])
+    except ValueError as exc:
+      raise CommandError(str(exc))
+    self.stdout.write('users={} files={} media={} created={}'.format(options['users'], options['files'], options['media'], created))
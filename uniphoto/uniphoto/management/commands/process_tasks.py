@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+import time
+from uniphoto.tasks import run_next_task
+
+
+class Command(BaseCommand):
+  help = 'Run background task worker.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--once', action='store_true', help='Exit when there are no due tasks.')
+    parser.add_argument('--sleep', type=float, default=1, help='Seconds to wait for new tasks when queue is empty.')
+
+  def handle(self, *args, **options):
+    while True:
+      if not run_next_task():
+        if options['once']:
+          break
+        time.sleep(options['sleep'])
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+import mimetypes
+import os
+import re
+from .models import File
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def get_media_path(name):
+  # raises SuspiciousFileOperation for names outside of MEDIA_ROOT
+  return safe_join(settings.MEDIA_ROOT, name)
+
+def get_blob_digest(name):
+  parts = name.split('/')
+  if len(parts) != 4 or parts[0] != settings.BLOBS_DIR:
+    return None
+  digest = os.path.splitext(parts[3])[0]
+  return digest if len(digest) == 64 and parts[1:3] == [digest[:2], digest[2:4]] else None
+
+def get_source_name(name):
+  # renditions/<size>/<file name>.<extension> is served with access rights of its source file
+  parts = name.split('/', 2)
+  if len(parts) == 3 and parts[0] == settings.RENDITIONS_DIR:
+    return os.path.splitext(parts[2])[0]
+  return name
+
+def is_published(name):
+  # every file and its urls are listed by /all-files to any authenticated user, so media of any user's file
+  # is served to any authenticated user (owner only check would break links of the feed). Only media which
+  # isn't a file of some user (partial uploads, orphans, other paths) is refused
+  if name.startswith(settings.UPLOADS_DIR + '/'):
+    return False
+  return File.objects.filter(file=get_source_name(name)).exists()
+
+def get_etag(name, stat):
+  # blob content never changes, so its digest is a strong validator
+  digest = get_blob_digest(name)
+  return quote_etag(digest if digest is not None else '{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+def parse_range(header, size):
+  """
+  Return (start, end) of single byte range header, None when range should be ignored
+  and raises ValueError when range is not satisfiable.
+  """
+  match = RANGE_RE.match(header.replace(' ', ''))
+  if match is None or match.groups() == ('', ''):
+    return None
+  start, end = match.groups()
+  if start == '':
+    # suffix range: last n bytes
+    length = int(end)
+    if length == 0:
+      raise ValueError('Unsatisfiable range')
+    return max(size - length, 0), size - 1
+  start = int(start)
+  end = min(int(end), size - 1) if end != '' else size - 1
+  if start >= size or start > end:
+    raise ValueError('Unsatisfiable range')
+  return start, end
+
+def is_range_fresh(request, etag, last_modified):
+  # If-Range makes range conditional on representation being unchanged
+  if_range = request.META.get('HTTP_IF_RANGE')
+  if not if_range:
+    return True
+  if if_range.startswith('"'):
+    return if_range == etag
+  if_range_date = parse_http_date_safe(if_range)
+  return if_range_date is not None and int(last_modified) <= if_range_date
+
+def read_range(path, start, length):
+  with open(path, 'rb') as file:
+    file.seek(start)
+    while length > 0:
+      data = file.read(min(STREAM_CHUNK_SIZE, length))
+      if not data:
+        break
+      length -= len(data)
+      yield data
+
+def set_validators(response, name, etag, last_modified):
+  response['ETag'] = etag
+  response['Last-Modified'] = http_date(last_modified)
+  response['Accept-Ranges'] = 'bytes'
+  if get_blob_digest(name) is not None:
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+  return response
+
+def get_offload_response(name, path, content_type):
+  # front proxy sends the bytes and handles ranges itself
+  response = HttpResponse(content_type=content_type)
+  if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+    response['X-Accel-Redirect'] = settings.MEDIA_OFFLOAD_PREFIX + name
+  else:
+    response['X-Sendfile'] = path
+  return response
+
+def serve(request, name):
+  """
+  Serve media file with conditional GET and single range support.
+  Raises FileNotFoundError or SuspiciousFileOperation for names which can't be served.
+  """
+  path = get_media_path(name)
+  stat = os.stat(path)
+  if not os.path.isfile(path):
+    raise FileNotFoundError(name)
+  etag = get_etag(name, stat)
+  last_modified = stat.st_mtime
+  content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+  response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+  if response is not None:
+    return set_validators(response, name, etag, last_modified)
+
+  if settings.MEDIA_OFFLOAD:
+    return set_validators(get_offload_response(name, path, content_type), name, etag, last_modified)
+
+  byte_range = None
+  range_header = request.META.get('HTTP_RANGE')
+  if range_header and is_range_fresh(request, etag, last_modified):
+    try:
+      byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+      response = HttpResponse(status=416)
+      response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+      return set_validators(response, name, etag, last_modified)
+
+  if byte_range is None:
+    # FileResponse lets wsgi server use sendfile for whole file
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+  else:
+    start, end = byte_range
+    response = StreamingHttpResponse(read_range(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, stat.st_size)
+  return set_validators(response, name, etag, last_modified)
@@ -0,0 +1,177 @@
+from django.utils import timezone
+from PIL import Image
+import datetime
+import os
+import struct
+from .models import FileMetadata
+
+
+# Metadata is read from headers only: JPEG markers before image data (Pillow doesn't decode pixels
+# until load) and MP4 boxes of moov, while other boxes such as mdat are skipped by seek.
+JPEG_EXTENSIONS = ['.jpg', '.jpeg']
+MP4_EXTENSIONS = ['.mp4']
+
+# EXIF tags and IFDs
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+ORIENTATION = 0x0112
+MAKE = 0x010F
+MODEL = 0x0110
+DATETIME = 0x0132
+DATETIME_ORIGINAL = 0x9003
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+# orientations which rotate image by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# moov of long videos takes a few megabytes, larger one is treated as broken file
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+MP4_EPOCH = datetime.datetime(1904, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def is_metadata_supported(file_name):
+  return os.path.splitext(file_name)[1].lower() in JPEG_EXTENSIONS + MP4_EXTENSIONS
+
+def get_text(value):
+  if isinstance(value, bytes):
+    value = value.decode('utf-8', 'replace')
+  return value.strip('\x00 ')[:100] if isinstance(value, str) else ''
+
+def parse_exif_datetime(value):
+  # EXIF time is camera local time without zone, it's kept as is as all dates are naive (USE_TZ = False)
+  try:
+    return datetime.datetime.strptime(get_text(value), '%Y:%m:%d %H:%M:%S')
+  except ValueError:
+    return None
+
+def get_gps_coordinate(value, ref):
+  try:
+    degrees, minutes, seconds = (float(part) for part in value)
+  except (TypeError, ValueError, ZeroDivisionError):
+    return None
+  coordinate = degrees + minutes / 60 + seconds / 3600
+  return -coordinate if get_text(ref) in ('S', 'W') else coordinate
+
+def read_jpeg_metadata(path):
+  with Image.open(path) as image:
+    width, height = image.size
+    exif = image.getexif()
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    gps_ifd = exif.get_ifd(GPS_IFD)
+  orientation = exif.get(ORIENTATION)
+  orientation = orientation if isinstance(orientation, int) and 1 <= orientation <= 8 else None
+  if orientation in TRANSPOSED_ORIENTATIONS:
+    # dimensions are stored as image is displayed
+    width, height = height, width
+  return {
+    'captured_date': parse_exif_datetime(exif_ifd.get(DATETIME_ORIGINAL) or exif.get(DATETIME)),
+    'width': width,
+    'height': height,
+    'orientation': orientation,
+    'camera_make': get_text(exif.get(MAKE)),
+    'camera_model': get_text(exif.get(MODEL)),
+    'latitude': get_gps_coordinate(gps_ifd.get(GPS_LATITUDE), gps_ifd.get(GPS_LATITUDE_REF)),
+    'longitude': get_gps_coordinate(gps_ifd.get(GPS_LONGITUDE), gps_ifd.get(GPS_LONGITUDE_REF)),
+  }
+
+def parse_box_header(header, available):
+  """
+  Return size and header size of box which header starts with given bytes, or None when the header is truncated
+  or the size is smaller than the header, so walking boxes always advances. Size 0 extends box to available bytes.
+  """
+  if len(header) < 8:
+    return None
+  size, = struct.unpack_from('>I', header)
+  header_size = 8
+  if size == 1:
+    if len(header) < 16:
+      return None
+    size, = struct.unpack_from('>Q', header, 8)
+    header_size = 16
+  elif size == 0:
+    size = available
+  if size < header_size:
+    return None
+  return size, header_size
+
+def iter_boxes(data):
+  # boxes of already read container content, walk stops at the first malformed or incomplete box
+  offset = 0
+  while offset < len(data):
+    header = parse_box_header(data[offset:offset + 16], len(data) - offset)
+    if header is None or header[0] > len(data) - offset:
+      return
+    size, header_size = header
+    yield data[offset + 4:offset + 8], data[offset + header_size:offset + size]
+    offset += size
+
+def read_moov(file):
+  # top level boxes are walked by their headers, only moov content is read (of truncated file as much as there is)
+  file_size = os.fstat(file.fileno()).st_size
+  offset = 0
+  while offset < file_size:
+    file.seek(offset)
+    header = file.read(16)
+    box = parse_box_header(header, file_size - offset)
+    if box is None:
+      return None
+    size, header_size = box
+    if header[4:8] == b'moov':
+      if size > MAX_MOOV_SIZE:
+        return None
+      file.seek(offset + header_size)
+      return file.read(size - header_size)
+    offset += size
+  return None
+
+def read_mp4_metadata(path):
+  with open(path, 'rb') as file:
+    moov = read_moov(file)
+  metadata = {}
+  if moov is None:
+    return metadata
+  for box_type, content in iter_boxes(moov):
+    if box_type == b'mvhd' and len(content) >= 20:
+      if content[0] == 1 and len(content) >= 32:
+        created, _, timescale, duration = struct.unpack_from('>QQIQ', content, 4)
+      else:
+        created, _, timescale, duration = struct.unpack_from('>IIII', content, 4)
+      if created:
+        # creation time is UTC, it's stored in local time as other dates
+        metadata['captured_date'] = timezone.make_naive(MP4_EPOCH + datetime.timedelta(seconds=created))
+      if timescale:
+        metadata['duration'] = duration / timescale
+    elif box_type == b'trak' and 'width' not in metadata:
+      for trak_box_type, trak_content in iter_boxes(content):
+        # width and height are the last 16.16 fixed point fields of tkhd, audio tracks have zeros there
+        if trak_box_type == b'tkhd' and len(trak_content) >= 84:
+          width, height = struct.unpack_from('>II', trak_content, len(trak_content) - 8)
+          if width and height:
+            metadata['width'], metadata['height'] = width >> 16, height >> 16
+  return metadata
+
+def read_metadata(path):
+  """
+  Return metadata fields read from headers of media file, fields which file doesn't have are left out.
+  File which headers can't be parsed gets no fields.
+  """
+  extension = os.path.splitext(path)[1].lower()
+  try:
+    if extension in JPEG_EXTENSIONS:
+      return read_jpeg_metadata(path)
+    if extension in MP4_EXTENSIONS:
+      return read_mp4_metadata(path)
+  except (OSError, SyntaxError, ValueError, struct.error, OverflowError):
+    pass
+  return {}
+
+def update_metadata(file):
+  if not is_metadata_supported(file.file.name):
+    return None
+  fields = read_metadata(file.file.path)
+  defaults = {field.name: field.get_default() for field in FileMetadata._meta.concrete_fields
+              if field.name not in ('file', 'user')}
+  defaults.update(fields, user_id=file.user_id)
+  return FileMetadata.objects.update_or_create(file=file, defaults=defaults)[0]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['file'], name='file_name_idx'),
+        ),
+    ]
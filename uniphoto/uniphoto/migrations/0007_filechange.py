@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('uniphoto', '0006_file_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='auth.user')),
+                ('version', models.BigIntegerField(default=0)),
+                ('pruned_version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FileChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('file_id', models.IntegerField()),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('deleted', 'Deleted')], max_length=16)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filechange',
+            constraint=models.UniqueConstraint(fields=('user', 'version'), name='file_change_version_uniq'),
+        ),
+        # existing files are the first changes of their users, so cursor 0 syncs whole library
+        migrations.RunSQL(
+            sql=[
+                """
+                INSERT INTO uniphoto_filechange (user_id, version, file_id, kind, created_date)
+                SELECT user_id, row_number() OVER (PARTITION BY user_id ORDER BY id), id, 'created', now()
+                FROM uniphoto_file
+                """,
+                """
+                INSERT INTO uniphoto_changecounter (user_id, version, pruned_version)
+                SELECT user_id, count(*), 0 FROM uniphoto_file GROUP BY user_id
+                """,
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0009_filemetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='media_type',
+            field=models.CharField(choices=[('photo', 'Photo'), ('video', 'Video')], default='photo', max_length=8),
+        ),
+        # database default for rows inserted by raw SQL (test fixtures, benchmark seeding)
+        migrations.RunSQL(
+            sql="ALTER TABLE uniphoto_file ALTER COLUMN media_type SET DEFAULT 'photo'",
+            reverse_sql="ALTER TABLE uniphoto_file ALTER COLUMN media_type DROP DEFAULT",
+        ),
+        migrations.RunSQL(
+            sql="UPDATE uniphoto_file SET media_type = 'video' WHERE lower(file) LIKE '%.mp4'",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'media_type', '-id'], name='user_media_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['media_type', '-id'], name='media_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', '-post_date'], name='user_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['-post_date'], name='post_date_idx'),
+        ),
+    ]
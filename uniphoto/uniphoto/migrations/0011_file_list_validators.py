@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0010_file_media_type_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileListVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.BigIntegerField(default=0)),
+                ('modified_date', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changecounter',
+            name='modified_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='changecounter',
+            name='revision',
+            field=models.BigIntegerField(default=0),
+        ),
+        # rows which are copied in bulk (benchmark dataset) don't list revision
+        migrations.RunSQL(
+            sql="ALTER TABLE uniphoto_changecounter ALTER COLUMN revision SET DEFAULT 0",
+            reverse_sql="ALTER TABLE uniphoto_changecounter ALTER COLUMN revision DROP DEFAULT",
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO uniphoto_filelistversion(id, revision) VALUES (1, 0)",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
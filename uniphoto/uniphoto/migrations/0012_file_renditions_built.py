@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0011_file_list_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='renditions_built',
+            field=models.BooleanField(default=False),
+        ),
+        # database default for rows inserted by raw SQL (test fixtures, benchmark seeding)
+        migrations.RunSQL(
+            sql="ALTER TABLE uniphoto_file ALTER COLUMN renditions_built SET DEFAULT false",
+            reverse_sql="ALTER TABLE uniphoto_file ALTER COLUMN renditions_built DROP DEFAULT",
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0012_file_renditions_built'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filechange',
+            index=models.Index(fields=['created_date'], name='file_change_created_idx'),
+        ),
+    ]
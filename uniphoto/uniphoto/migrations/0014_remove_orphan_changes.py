@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0013_filechange_created_idx'),
+    ]
+
+    operations = [
+        # change logs of users deleted before they were removed with the user, collect_garbage doesn't look for them anymore
+        migrations.RunSQL(
+            sql="""
+            DELETE FROM uniphoto_filechange WHERE user_id NOT IN (SELECT id FROM auth_user);
+            DELETE FROM uniphoto_changecounter WHERE user_id NOT IN (SELECT id FROM auth_user);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniphoto', '0014_remove_orphan_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileListChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.BigIntegerField(null=True, unique=True)),
+                ('created', models.JSONField(default=list)),
+                ('deleted', models.JSONField(default=list)),
+                ('updated', models.JSONField(default=list)),
+                ('user_ids', models.JSONField(default=list)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='filelistchange',
+            index=models.Index(condition=models.Q(revision__isnull=True), fields=['created_date'], name='file_list_change_pending_idx'),
+        ),
+    ]
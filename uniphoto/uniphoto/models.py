@@ -1,11 +1,211 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+import os
+import uuid
 
 
+class Blob(models.Model):
+  # content addressed file shared by all files with the same sha256 digest
+  digest = models.CharField(max_length=64, unique=True)
+  name = models.CharField(max_length=100)
+  reference_count = models.PositiveIntegerField(default=0)
+
+  def __str__(self):
+    return self.name
+
 class File(models.Model):
-  user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+  class ProcessingStatus(models.TextChoices):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+
+  class MediaType(models.TextChoices):
+    PHOTO = 'photo'
+    VIDEO = 'video'
+
+  VIDEO_EXTENSIONS = ['.mp4']
+
+  # user column is covered by the leading column of user_files_idx
+  user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
   file = models.FileField(upload_to='.', default='./none/no-file')
   post_date = models.DateTimeField(auto_now=True)
+  processing_status = models.CharField(max_length=16, choices=ProcessingStatus.choices, default=ProcessingStatus.PENDING)
+  # files uploaded before content addressed storage have no blob
+  blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name='files')
+  # bytes of uploaded content, files uploaded before size was recorded get it from `manage.py backfill_file_sizes`
+  size = models.BigIntegerField(null=True, blank=True)
+  # derived from extension of file on save, bulk_create callers set it with get_media_type
+  media_type = models.CharField(max_length=8, choices=MediaType.choices, default=MediaType.PHOTO)
+  # set by process_file once all renditions are in media, lists then refer to them without checking disk
+  renditions_built = models.BooleanField(default=False)
+
+  class Meta:
+    indexes = [
+      # UserFilesList: WHERE user_id = %s ORDER BY id DESC
+      # (also AllFilesList ?username=)
+      models.Index(fields=['user', '-id'], name='user_files_idx'),
+      # MediaFile access check: WHERE file = %s
+      models.Index(fields=['file'], name='file_name_idx'),
+      # ?media_type=: WHERE [user_id = %s AND] media_type = %s ORDER BY id DESC
+      models.Index(fields=['user', 'media_type', '-id'], name='user_media_type_idx'),
+      models.Index(fields=['media_type', '-id'], name='media_type_idx'),
+      # ?posted_after= and ?posted_before=: WHERE [user_id = %s AND] post_date >= %s AND post_date < %s
+      models.Index(fields=['user', '-post_date'], name='user_post_date_idx'),
+      models.Index(fields=['-post_date'], name='post_date_idx'),
+    ]
 
   def __str__(self):
     return self.file.name.split("/")[-1] 
+
+  @classmethod
+  def get_media_type(cls, name):
+    extension = os.path.splitext(name)[1].lower()
+    return cls.MediaType.VIDEO if extension in cls.VIDEO_EXTENSIONS else cls.MediaType.PHOTO
+
+  def save(self, *args, **kwargs):
+    self.media_type = self.get_media_type(self.file.name)
+    super().save(*args, **kwargs)
+
+class Task(models.Model):
+
+  class Status(models.TextChoices):
+    QUEUED = 'queued'
+    FAILED = 'failed'
+
+  name = models.CharField(max_length=100)
+  kwargs = models.JSONField(default=dict)
+  status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+  # queued task is due at run_after, running task holds lease until run_after
+  run_after = models.DateTimeField(default=timezone.now)
+  attempts = models.PositiveIntegerField(default=0)
+  last_error = models.TextField(blank=True)
+  created_date = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['status', 'run_after'], name='task_queue_idx'),
+    ]
+
+  def __str__(self):
+    return '{}({})'.format(self.name, self.kwargs)
+
+class UploadSession(models.Model):
+  # resumable upload which chunks are appended to MEDIA_ROOT/UPLOADS_DIR/<id>.part
+  id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+  user = models.ForeignKey(User, on_delete=models.CASCADE)
+  filename = models.CharField(max_length=255)
+  size = models.BigIntegerField()
+  offset = models.BigIntegerField(default=0)
+  created_date = models.DateTimeField(auto_now_add=True)
+
+  def __str__(self):
+    return '{} ({}/{})'.format(self.filename, self.offset, self.size)
+
+class ChangeCounter(models.Model):
+  # last version of change log of user, its row lock orders appends of user changes by commit
+  # (no foreign key constraint, see FileChange.user)
+  user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, db_constraint=False)
+  version = models.BigIntegerField(default=0)
+  # changes up to this version were pruned, older cursors can't be served
+  pruned_version = models.BigIntegerField(default=0)
+  # validators of files list of user (see versions.py), changed also by processed files which aren't logged
+  revision = models.BigIntegerField(default=0)
+  modified_date = models.DateTimeField(null=True)
+
+  def __str__(self):
+    return '{}: {}'.format(self.user_id, self.version)
+
+class FileListVersion(models.Model):
+  # single row of validators of all files list (see versions.py)
+  revision = models.BigIntegerField(default=0)
+  modified_date = models.DateTimeField(null=True)
+
+  def __str__(self):
+    return str(self.revision)
+
+class FileListChange(models.Model):
+  # change of all files list, written by the changing transaction and given the global revision it bumps after commit,
+  # so cached feed (feed.py) applies changes of every process in revision order
+  revision = models.BigIntegerField(null=True, unique=True)
+  created = models.JSONField(default=list)
+  deleted = models.JSONField(default=list)
+  # files changed in place and users which username is shown with their files
+  updated = models.JSONField(default=list)
+  user_ids = models.JSONField(default=list)
+  created_date = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    indexes = [
+      # feed rebuild: WHERE revision IS NULL, only changes which are committed and not bumped yet
+      models.Index(fields=['created_date'], name='file_list_change_pending_idx', condition=models.Q(revision__isnull=True)),
+    ]
+
+  def __str__(self):
+    return str(self.revision)
+
+class FileChange(models.Model):
+
+  class Kind(models.TextChoices):
+    CREATED = 'created'
+    DELETED = 'deleted'
+
+  # user column is covered by the leading column of file_change_version_uniq; tombstones of files deleted
+  # by cascade delete of user are written after its changes are collected, so there is no foreign key
+  # constraint and the log is removed again by post_delete receiver of user
+  user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, db_constraint=False)
+  version = models.BigIntegerField()
+  # plain id as deleted file row doesn't exist anymore
+  file_id = models.IntegerField()
+  kind = models.CharField(max_length=16, choices=Kind.choices)
+  created_date = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    constraints = [
+      # sync: WHERE user_id = %s AND version > %s ORDER BY version
+      models.UniqueConstraint(fields=['user', 'version'], name='file_change_version_uniq'),
+    ]
+    indexes = [
+      # collect_garbage: WHERE created_date < %s, only expired head of the log is read
+      models.Index(fields=['created_date'], name='file_change_created_idx'),
+    ]
+
+  def __str__(self):
+    return '{} {} ({})'.format(self.kind, self.file_id, self.version)
+
+class StorageUsage(models.Model):
+  # sum of sizes of user files, changed by F() updates when files are created and deleted
+  user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+  used_bytes = models.BigIntegerField(default=0)
+
+  def __str__(self):
+    return '{}: {}'.format(self.user_id, self.used_bytes)
+
+class FileMetadata(models.Model):
+  # read from headers of jpeg (EXIF) and mp4 (moov) files by process_file task
+  file = models.OneToOneField(File, on_delete=models.CASCADE, primary_key=True, related_name='metadata')
+  # copy of file user, so that user lists ordered by capture date are served by metadata_user_captured_idx
+  user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+  captured_date = models.DateTimeField(null=True, blank=True)
+  width = models.IntegerField(null=True, blank=True)
+  height = models.IntegerField(null=True, blank=True)
+  orientation = models.SmallIntegerField(null=True, blank=True)
+  camera_make = models.CharField(max_length=100, blank=True)
+  camera_model = models.CharField(max_length=100, blank=True)
+  latitude = models.FloatField(null=True, blank=True)
+  longitude = models.FloatField(null=True, blank=True)
+  # seconds of video
+  duration = models.FloatField(null=True, blank=True)
+
+  class Meta:
+    indexes = [
+      # UserFilesList ?ordering=-captured_date: WHERE user_id = %s AND captured_date IS NOT NULL ORDER BY captured_date DESC, file_id DESC
+      models.Index(fields=['user', '-captured_date', '-file'], name='metadata_user_captured_idx'),
+      # AllFilesList ?ordering=-captured_date
+      models.Index(fields=['-captured_date', '-file'], name='metadata_captured_idx'),
+    ]
+
+  def __str__(self):
+    return '{}: {}'.format(self.file_id, self.captured_date)
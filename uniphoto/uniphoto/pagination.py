@@ -0,0 +1,37 @@
+from rest_framework import pagination
+
+
+class FileCursorPagination(pagination.CursorPagination):
+  # keyset pagination over primary key: no OFFSET scan and no COUNT(*)
+  ordering = '-id'
+  page_size_query_param = 'page_size'
+  max_page_size = 1000
+
+# page number pagination for old clients, ?pagination=cursor switches to cursor mode
+# (opaque next/previous ?cursor= tokens and no total count)
+class FilePagination(pagination.PageNumberPagination):
+  pagination_query_param = 'pagination'
+  cursor_pagination_class = FileCursorPagination
+  page_size_query_param = 'page_size'
+  max_page_size = 1000
+
+  def is_cursor_request(self, request):
+    return (request.query_params.get(self.pagination_query_param) == 'cursor' or
+            self.cursor_pagination_class.cursor_query_param in request.query_params)
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.cursor_paginator = None
+    if self.is_cursor_request(request):
+      self.cursor_paginator = self.cursor_pagination_class()
+      return self.cursor_paginator.paginate_queryset(queryset, request, view)
+    return super().paginate_queryset(queryset, request, view)
+
+  def get_paginated_response(self, data):
+    if self.cursor_paginator is not None:
+      return self.cursor_paginator.get_paginated_response(data)
+    return super().get_paginated_response(data)
+
+  def get_html_context(self):
+    if self.cursor_paginator is not None:
+      return self.cursor_paginator.get_html_context()
+    return super().get_html_context()
@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+import bisect
+import contextlib
+import random
+import threading
+import time
+
+
+# Histograms are kept per process (one set per worker), so Prometheus has to scrape every worker
+# or sum them by instance. Buckets are upper bounds as of Prometheus client defaults.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS = [
+  # name, help, buckets, attribute of Profile
+  ('uniphoto_request_duration_seconds', 'Latency of sampled requests.', SECONDS_BUCKETS, 'latency'),
+  ('uniphoto_request_db_queries', 'SQL queries of sampled requests.', QUERIES_BUCKETS, 'queries'),
+  ('uniphoto_request_db_duration_seconds', 'Time of sampled requests spent in SQL queries.', SECONDS_BUCKETS, 'db_time'),
+  ('uniphoto_request_serialization_duration_seconds', 'Time of sampled requests spent serializing files to response data.',
+   SECONDS_BUCKETS, 'serialization_time'),
+  ('uniphoto_request_render_duration_seconds', 'Time of sampled requests spent rendering response content.',
+   SECONDS_BUCKETS, 'render_time'),
+]
+UNRESOLVED_VIEW = 'unresolved'
+
+lock = threading.Lock()
+# (view, method) -> {metric name: Histogram}
+histograms = {}
+
+
+class Histogram:
+  __slots__ = ('buckets', 'counts', 'sum')
+
+  def __init__(self, buckets):
+    self.buckets = buckets
+    # the last count is of +Inf bucket
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0
+
+  def observe(self, value):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum += value
+
+class Profile:
+
+  def __init__(self):
+    self.queries = 0
+    self.db_time = 0
+    self.serialization_time = 0
+    self.render_time = 0
+    self.latency = 0
+    self.render_start = None
+
+  def execute(self, execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+      return execute(sql, params, many, context)
+    finally:
+      self.db_time += time.perf_counter() - start
+      self.queries += 1
+
+  def rendered(self, response):
+    self.render_time += time.perf_counter() - self.render_start
+
+
+@contextlib.contextmanager
+def measure_serialization(request):
+  # serializers are timed by views which call them, page rows are fetched before the block
+  profile = getattr(request, 'profile', None)
+  if profile is None:
+    yield
+    return
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    profile.serialization_time += time.perf_counter() - start
+
+
+def get_view_name(request):
+  resolver_match = getattr(request, 'resolver_match', None)
+  if resolver_match is None:
+    return UNRESOLVED_VIEW
+  return getattr(resolver_match.func, 'view_class', resolver_match.func).__name__
+
+def record(view, method, profile):
+  with lock:
+    view_histograms = histograms.get((view, method))
+    if view_histograms is None:
+      view_histograms = histograms[(view, method)] = {name: Histogram(buckets) for name, _, buckets, _ in METRICS}
+    for name, _, _, attribute in METRICS:
+      view_histograms[name].observe(getattr(profile, attribute))
+
+def reset():
+  with lock:
+    histograms.clear()
+
+def format_value(value):
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_metrics():
+  """
+  Return histograms in Prometheus text exposition format.
+  """
+  with lock:
+    snapshot = {key: {name: (list(histogram.counts), histogram.sum) for name, histogram in view_histograms.items()}
+                for key, view_histograms in histograms.items()}
+  lines = []
+  for name, help_text, buckets, _ in METRICS:
+    lines.append('# HELP {} {}'.format(name, help_text))
+    lines.append('# TYPE {} histogram'.format(name))
+    for (view, method), view_histograms in sorted(snapshot.items()):
+      counts, total = view_histograms[name]
+      labels = 'view="{}",method="{}"'.format(view, method)
+      cumulative = 0
+      for bound, count in zip(list(buckets) + ['+Inf'], counts):
+        cumulative += count
+        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, format_value(bound), cumulative))
+      lines.append('{}_sum{{{}}} {}'.format(name, labels, format_value(total)))
+      lines.append('{}_count{{{}}} {}'.format(name, labels, cumulative))
+  return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+  """
+  Records SQL queries, their time, time of serializing files (timed by views with measure_serialization),
+  time of rendering response content and latency of PROFILING['SAMPLE_RATE'] share of requests
+  per resolved view, requests which aren't sampled cost one random number. Middleware is removed when sample rate is 0.
+  Streamed responses (media files) are measured until their first byte.
+  """
+
+  def __init__(self, get_response):
+    if not settings.PROFILING['SAMPLE_RATE']:
+      raise MiddlewareNotUsed()
+    self.get_response = get_response
+
+  def __call__(self, request):
+    if random.random() >= settings.PROFILING['SAMPLE_RATE']:
+      return self.get_response(request)
+    profile = Profile()
+    request.profile = profile
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+      for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile.execute))
+      response = self.get_response(request)
+    profile.latency = time.perf_counter() - start
+    record(get_view_name(request), request.method, profile)
+    return response
+
+  def process_template_response(self, request, response):
+    # DRF responses are rendered right after this hook, render time ends in post render callback
+    profile = getattr(request, 'profile', None)
+    if profile is not None:
+      profile.render_start = time.perf_counter()
+      response.add_post_render_callback(profile.rendered)
+    return response
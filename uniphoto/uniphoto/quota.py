@@ -0,0 +1,150 @@
+from rest_framework import exceptions, status
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import transaction
+from django.db.models import F
+import collections
+import concurrent.futures
+import os
+from .models import File, StorageUsage
+
+
+class QuotaExceeded(exceptions.APIException):
+  status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+  default_detail = 'Storage quota exceeded.'
+  default_code = 'quota_exceeded'
+
+
+def get_usage(user_id):
+  return StorageUsage.objects.filter(user_id=user_id).values_list('used_bytes', flat=True).first() or 0
+
+def get_remaining(user_id):
+  if settings.STORAGE_QUOTA_BYTES is None:
+    return None
+  return settings.STORAGE_QUOTA_BYTES - get_usage(user_id)
+
+def get_request_remaining(request):
+  # remaining quota is read once per request, async views read it before body is parsed on executor thread
+  # which must not open database connections
+  if not hasattr(request, 'remaining_quota'):
+    user = getattr(request, 'user', None)
+    request.remaining_quota = get_remaining(user.id) if user is not None and user.is_authenticated else None
+  return request.remaining_quota
+
+def check_quota(user_id, size):
+  remaining = get_remaining(user_id)
+  if remaining is not None and size > remaining:
+    raise QuotaExceeded()
+
+def add_usage(user_id, size, enforce=True):
+  """
+  Add size (negative for deleted files) to usage of user.
+  With enforce usage grows only while it stays within quota, the check is a part of the same UPDATE,
+  so concurrent uploads can't exceed quota together. Raises QuotaExceeded otherwise.
+  """
+  if not size:
+    return
+  queryset = StorageUsage.objects.filter(user_id=user_id)
+  if enforce and size > 0 and settings.STORAGE_QUOTA_BYTES is not None:
+    queryset = queryset.filter(used_bytes__lte=settings.STORAGE_QUOTA_BYTES - size)
+  if queryset.update(used_bytes=F('used_bytes') + size):
+    return
+  # there is nothing to subtract from when user has no usage row (or it's removed with user)
+  if size < 0:
+    return
+  StorageUsage.objects.get_or_create(user_id=user_id)
+  if not queryset.update(used_bytes=F('used_bytes') + size):
+    raise QuotaExceeded()
+
+def get_fitting(user_id, sizes):
+  # indexes of sizes which fit into remaining quota of user when they are added in the given order
+  remaining = get_remaining(user_id)
+  fitting = []
+  for index, size in enumerate(sizes):
+    if remaining is None or size <= remaining:
+      fitting.append(index)
+      remaining = None if remaining is None else remaining - size
+  return fitting
+
+def add_usages(user_id, sizes):
+  """
+  Add sizes to usage of user in the given order while they stay within quota and return indexes of added ones.
+  Sizes are added by one update when all of them fit.
+  """
+  try:
+    add_usage(user_id, sum(sizes))
+    return list(range(len(sizes)))
+  except QuotaExceeded:
+    pass
+  added = []
+  for index, size in enumerate(sizes):
+    try:
+      add_usage(user_id, size)
+    except QuotaExceeded:
+      continue
+    added.append(index)
+  return added
+
+def get_file_size(name):
+  try:
+    return os.path.getsize(os.path.join(settings.MEDIA_ROOT, name))
+  except OSError:
+    return None
+
+def backfill_sizes(batch_size, workers):
+  """
+  Set sizes of files which have none from their media and add them to usage of users.
+  Sizes of a batch are read by pool of threads, as the work is mostly waiting for filesystem.
+  Return numbers of updated files and of files which media is missing.
+  """
+  updated, missing = 0, 0
+  last_id = 0
+  with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+    while True:
+      batch = list(File.objects.filter(size__isnull=True, id__gt=last_id).order_by('id')
+                   .values_list('id', 'file', 'user_id')[:batch_size])
+      if not batch:
+        break
+      last_id = batch[-1][0]
+      sizes = list(executor.map(get_file_size, [name for _, name, _ in batch]))
+      user_sizes = collections.Counter()
+      with transaction.atomic():
+        for (file_id, _, user_id), size in zip(batch, sizes):
+          if size is None:
+            missing += 1
+            continue
+          # file which got its size or was deleted meanwhile isn't counted twice
+          if File.objects.filter(id=file_id, size__isnull=True).update(size=size):
+            updated += 1
+            user_sizes[user_id] += size
+        for user_id in sorted(user_sizes):
+          add_usage(user_id, user_sizes[user_id], enforce=False)
+  return updated, missing
+
+
+class QuotaUploadHandler(FileUploadHandler):
+  """
+  Stops multipart upload as soon as one of its files exceeds remaining quota of user, so the rest of body
+  isn't read. Files of bulk upload which fit one by one but not together are refused by view per file.
+  Must be the first upload handler, quota is enforced again when files are saved.
+  """
+
+  def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+    # user is authenticated before body is parsed
+    self.remaining = get_request_remaining(self.request)
+    self.received = 0
+    if self.remaining is not None and self.remaining <= 0:
+      raise QuotaExceeded()
+
+  def new_file(self, *args, **kwargs):
+    super().new_file(*args, **kwargs)
+    self.received = 0
+
+  def receive_data_chunk(self, raw_data, start):
+    self.received += len(raw_data)
+    if self.remaining is not None and self.received > self.remaining:
+      raise QuotaExceeded()
+    return raw_data
+
+  def file_complete(self, file_size):
+    return None
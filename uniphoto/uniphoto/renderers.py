@@ -0,0 +1,27 @@
+from rest_framework.renderers import JSONRenderer
+import json
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+  """
+  JSON renderer for data which is already made of primitives (output of serializers).
+  Uses orjson when it is installed and C encoder of json module otherwise, output is the same as of JSONRenderer.
+  """
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if data is None:
+      return b''
+    # indented output for browsable api and ?indent clients goes through regular encoder
+    if self.get_indent(accepted_media_type or '', renderer_context or {}):
+      return super().render(data, accepted_media_type, renderer_context)
+    if orjson is not None:
+      content = orjson.dumps(data)
+    else:
+      content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    # the same escaping as JSONRenderer does for javascript compatibility
+    return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
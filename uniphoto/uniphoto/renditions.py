@@ -0,0 +1,50 @@
+from django.conf import settings
+from PIL import Image, ImageOps
+import os
+import tempfile
+
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg']
+RENDITION_QUALITY = {'JPEG': 85, 'WEBP': 80}
+
+
+def is_rendition_supported(file_name):
+  return os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS
+
+def get_rendition_name(file_name, size, extension):
+  return '/'.join([settings.RENDITIONS_DIR, str(size), '{}.{}'.format(file_name, extension)])
+
+def get_rendition_path(file_name, size, extension):
+  return os.path.join(settings.MEDIA_ROOT, get_rendition_name(file_name, size, extension))
+
+def build_rendition(source_path, rendition_path, size, extension):
+  image_format = settings.RENDITION_FORMATS[extension]
+  with Image.open(source_path) as image:
+    # let JPEG decoder downscale by DCT scaling instead of decoding full resolution
+    image.draft('RGB', (size, size))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail((size, size))
+    os.makedirs(os.path.dirname(rendition_path), exist_ok=True)
+    # write to temporary file first so that concurrent requests never see partial rendition
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(rendition_path))
+    try:
+      with os.fdopen(fd, 'wb') as temporary_file:
+        image.save(temporary_file, image_format, quality=RENDITION_QUALITY[image_format])
+      os.replace(temporary_path, rendition_path)
+    except BaseException:
+      os.remove(temporary_path)
+      raise
+
+def get_or_build_rendition(file_field, size, extension):
+  rendition_path = get_rendition_path(file_field.name, size, extension)
+  if not os.path.exists(rendition_path):
+    build_rendition(file_field.path, rendition_path, size, extension)
+  return rendition_path
+
+def delete_renditions(file_name):
+  for size in settings.RENDITION_SIZES:
+    for extension in settings.RENDITION_FORMATS:
+      try:
+        os.remove(get_rendition_path(file_name, size, extension))
+      except FileNotFoundError:
+        pass
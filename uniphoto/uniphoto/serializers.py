@@ -1,8 +1,13 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.models import User
-from .models import File
-from .validators import validate_file_extension
+from django.conf import settings
+from django.urls import reverse
+from django.utils.encoding import iri_to_uri
+from . import licensing
+from .models import File, FileMetadata, UploadSession
+from .renditions import is_rendition_supported, get_rendition_name
+from .validators import validate_file_extension, validate_file_signature, validate_filename_extension
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -24,19 +29,147 @@ class UserSerializer(serializers.ModelSerializer):
     return user
 
 class TrialLicenseCheckSerializer(serializers.Serializer):
-  license_duration = serializers.IntegerField(default=30)
+  license_duration = serializers.IntegerField(default=licensing.TRIAL_LICENSE_DAYS)
+
+class TrialLicenseChecksSerializer(serializers.Serializer):
+  ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                              max_length=settings.LICENSE_CHECK_MAX_USERS)
+  license_duration = serializers.IntegerField(default=licensing.TRIAL_LICENSE_DAYS)
+
+class RenditionsField(serializers.Field):
+  # urls of renditions built by process_file point to media, others are built or served from cache by FileRendition
+
+  def __init__(self, **kwargs):
+    kwargs['source'] = '*'
+    kwargs['read_only'] = True
+    super().__init__(**kwargs)
+
+  def get_url(self, file, size, extension):
+    if file.renditions_built:
+      url = settings.MEDIA_URL + get_rendition_name(file.file.name, size, extension)
+    else:
+      url = reverse('rendition', kwargs={'pk': file.id, 'size': size, 'extension': extension})
+    request = self.context.get('request', None)
+    return request.build_absolute_uri(url) if request is not None else url
+
+  def to_representation(self, file):
+    if not is_rendition_supported(file.file.name):
+      return None
+    return {str(size): {extension: self.get_url(file, size, extension) for extension in settings.RENDITION_FORMATS}
+            for size in settings.RENDITION_SIZES}
+
+class FileMetadataSerializer(serializers.ModelSerializer):
+
+  class Meta:
+    model = FileMetadata
+    fields = ('captured_date', 'width', 'height', 'orientation', 'camera_make', 'camera_model', 'latitude', 'longitude', 'duration')
 
 class UserFilesSerializer(serializers.ModelSerializer):
-  file = serializers.FileField(max_length=None, use_url=True, validators=[validate_file_extension])
+  file = serializers.FileField(max_length=None, use_url=True, validators=[validate_file_extension, validate_file_signature])
+  renditions = RenditionsField()
+  # null until metadata is read by process_file task
+  metadata = FileMetadataSerializer(read_only=True)
   
   class Meta:
     model = File
-    fields = ('id', 'file', 'post_date')
+    fields = ('id', 'file', 'post_date', 'processing_status', 'renditions', 'metadata')
+    read_only_fields = ('processing_status',)
 
 class AllFilesSerializer(serializers.ModelSerializer):
-  file = serializers.FileField(max_length=None, use_url=True, validators=[validate_file_extension])
+  file = serializers.FileField(max_length=None, use_url=True, validators=[validate_file_extension, validate_file_signature])
   username = serializers.CharField(max_length=150)
+  renditions = RenditionsField()
+  metadata = FileMetadataSerializer(read_only=True)
 
   class Meta:
     model = File
-    fields = ('id', 'username', 'file', 'post_date')
\ No newline at end of file
+    fields = ('id', 'username', 'file', 'post_date', 'processing_status', 'renditions', 'metadata')
+    read_only_fields = ('processing_status',)
+
+class FileRowsSerializer:
+  # read-only fast path of file lists: rows of values_list(named=True) are turned into the same representation
+  # as serializer_class gives, urls are built from prefixes computed once per request instead of once per row
+
+  def __init__(self, serializer_class, request=None, fields=None):
+    self.fields = fields or serializer_class.Meta.fields
+    self.host = request.build_absolute_uri('/')[:-1] if request is not None else None
+    self.storage = File._meta.get_field('file').storage
+    self.post_date_field = serializers.DateTimeField()
+    # rendition view url of every size and extension with {} in place of file id
+    self.rendition_view_urls = {
+      (size, extension): '{}/{{}}/{}'.format(*reverse('rendition', kwargs={'pk': 0, 'size': size, 'extension': extension}).rsplit('/0/', 1))
+      for size in settings.RENDITION_SIZES for extension in settings.RENDITION_FORMATS
+    }
+
+  def get_row_fields(self):
+    # id is always selected as cursor pagination reads position from it
+    row_fields = [field for field in self.fields if field not in ('renditions', 'metadata')]
+    required_fields = ('id', 'file', 'renditions_built') if 'renditions' in self.fields else ('id',)
+    row_fields += [field for field in required_fields if field not in row_fields]
+    if 'metadata' in self.fields:
+      # metadata__file is null when file has no metadata row
+      row_fields += ['metadata__file'] + ['metadata__' + field for field in FileMetadataSerializer.Meta.fields]
+    return row_fields
+
+  def get_absolute_url(self, url):
+    return self.host + iri_to_uri(url) if self.host is not None else url
+
+  def get_file_url(self, name):
+    return self.get_absolute_url(self.storage.url(name)) if name else None
+
+  def get_renditions(self, file_id, name, renditions_built):
+    if not is_rendition_supported(name):
+      return None
+    renditions = {}
+    for size in settings.RENDITION_SIZES:
+      urls = renditions[str(size)] = {}
+      for extension in settings.RENDITION_FORMATS:
+        if renditions_built:
+          url = settings.MEDIA_URL + get_rendition_name(name, size, extension)
+        else:
+          url = self.rendition_view_urls[(size, extension)].format(file_id)
+        urls[extension] = self.get_absolute_url(url)
+    return renditions
+
+  def get_metadata(self, row):
+    if row.metadata__file is None:
+      return None
+    metadata = {field: getattr(row, 'metadata__' + field) for field in FileMetadataSerializer.Meta.fields}
+    if metadata['captured_date'] is not None:
+      metadata['captured_date'] = self.post_date_field.to_representation(metadata['captured_date'])
+    return metadata
+
+  def to_representation(self, row):
+    data = {}
+    for field in self.fields:
+      if field == 'metadata':
+        data[field] = self.get_metadata(row)
+      elif field == 'file':
+        data[field] = self.get_file_url(row.file)
+      elif field == 'post_date':
+        data[field] = self.post_date_field.to_representation(row.post_date)
+      elif field == 'renditions':
+        data[field] = self.get_renditions(row.id, row.file, row.renditions_built)
+      else:
+        data[field] = getattr(row, field)
+    return data
+
+  def serialize(self, rows):
+    return [self.to_representation(row) for row in rows]
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+  filename = serializers.CharField(max_length=255, validators=[validate_filename_extension])
+  size = serializers.IntegerField(min_value=1)
+
+  class Meta:
+    model = UploadSession
+    fields = ('id', 'filename', 'size', 'offset')
+    read_only_fields = ('id', 'offset')
+
+class DeleteFilesSerializer(serializers.Serializer):
+  ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                              max_length=settings.BULK_DELETE_MAX_FILES)
+
+class SyncSerializer(serializers.Serializer):
+  cursor = serializers.IntegerField(min_value=0, default=0)
+  limit = serializers.IntegerField(min_value=1, max_value=settings.SYNC_MAX_CHANGES, default=settings.SYNC_MAX_CHANGES)
\ No newline at end of file
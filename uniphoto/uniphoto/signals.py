@@ -0,0 +1,67 @@
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import changes, licensing, quota, versions
+from .authentication import invalidate_cached_token
+from .models import File, FileChange
+
+
+def invalidate_cached_tokens(keys):
+  # invalidate again after commit, so that request racing with transaction can't cache old state
+  for key in keys:
+    invalidate_cached_token(key)
+  transaction.on_commit(lambda: [invalidate_cached_token(key) for key in keys])
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+  invalidate_cached_tokens([instance.key])
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+  # last_login is updated on every sign in and isn't used by token authentication
+  if created or update_fields == frozenset(['last_login']):
+    return
+  invalidate_cached_tokens(list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)))
+
+@receiver(post_save, sender=User)
+def change_files_version_of_user(sender, instance, created, update_fields=None, **kwargs):
+  # username is shown in all files list
+  if created or update_fields == frozenset(['last_login']):
+    return
+  versions.files_changed([instance.pk])
+
+@receiver(post_save, sender=User)
+def invalidate_user_entitlement(sender, instance, created, update_fields=None, **kwargs):
+  # trial license starts at date_joined
+  if created or update_fields == frozenset(['last_login']):
+    return
+  user_id = instance.pk
+  licensing.invalidate_cached_entitlement(user_id)
+  transaction.on_commit(lambda: licensing.invalidate_cached_entitlement(user_id))
+
+@receiver(post_delete, sender=User)
+def remove_change_log_of_user(sender, instance, **kwargs):
+  # log of user is collected before its files, so tombstones of cascade deleted files are removed here
+  changes.remove_changes(instance.pk)
+
+@receiver(post_save, sender=File)
+def add_created_file_to_usage(sender, instance, created, **kwargs):
+  # raises QuotaExceeded, so file over quota isn't created
+  if created:
+    quota.add_usage(instance.user_id, instance.size)
+
+@receiver(post_save, sender=File)
+def record_created_file(sender, instance, created, **kwargs):
+  if created:
+    changes.record_changes(instance.user_id, FileChange.Kind.CREATED, [instance.pk])
+
+@receiver(post_delete, sender=File)
+def remove_deleted_file_from_usage(sender, instance, **kwargs):
+  if instance.size:
+    quota.add_usage(instance.user_id, -instance.size)
+
+@receiver(post_delete, sender=File)
+def record_deleted_file(sender, instance, **kwargs):
+  changes.record_changes(instance.user_id, FileChange.Kind.DELETED, [instance.pk])
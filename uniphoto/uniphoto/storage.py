@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.core.files.base import File as DjangoFile
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from . import renditions
+from .models import Blob
+
+
+class HashingUploadHandlerMixin:
+  # computes sha256 of uploaded file while its chunks are streamed to handler
+
+  def new_file(self, *args, **kwargs):
+    self.sha256 = hashlib.sha256()
+    super().new_file(*args, **kwargs)
+
+  def receive_data_chunk(self, raw_data, start):
+    # memory handler isn't activated for large uploads and passes chunks on to temporary file handler
+    if getattr(self, 'activated', True):
+      self.sha256.update(raw_data)
+    return super().receive_data_chunk(raw_data, start)
+
+  def file_complete(self, file_size):
+    file = super().file_complete(file_size)
+    if file is not None:
+      file.sha256 = self.sha256.hexdigest()
+    return file
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+  pass
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+  pass
+
+class PartialUpload(DjangoFile):
+  # file assembled by chunked upload api, it is linked to blob and its owner removes it after commit,
+  # so that content of rolled back transaction is still there when finalize is retried
+
+  def __init__(self, path, name):
+    super().__init__(open(path, 'rb'), name=name)
+    self.path = path
+
+
+def get_partial_upload_path(upload_session_id):
+  return os.path.join(settings.MEDIA_ROOT, settings.UPLOADS_DIR, '{}.part'.format(upload_session_id))
+
+@contextlib.contextmanager
+def lock_partial_upload(upload_session_id):
+  """
+  Open partial file of upload session for writing under exclusive lock, None is given while other request holds it.
+  """
+  with open(get_partial_upload_path(upload_session_id), 'r+b') as partial_upload:
+    try:
+      fcntl.flock(partial_upload, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      yield None
+    else:
+      # lock is released when file is closed
+      yield partial_upload
+
+def remove_partial_upload(upload_session_id):
+  try:
+    os.remove(get_partial_upload_path(upload_session_id))
+  except FileNotFoundError:
+    pass
+
+def get_digest(uploaded_file):
+  if getattr(uploaded_file, 'sha256', None) is None:
+    sha256 = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+      sha256.update(chunk)
+    uploaded_file.sha256 = sha256.hexdigest()
+  return uploaded_file.sha256
+
+def get_blob_name(digest, extension):
+  # sharded as blobs/ab/cd/abcd...ext so that no directory grows too large
+  return '/'.join([settings.BLOBS_DIR, digest[:2], digest[2:4], digest + extension.lower()])
+
+def write_blob(uploaded_file, name):
+  path = os.path.join(settings.MEDIA_ROOT, name)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  if isinstance(uploaded_file, PartialUpload):
+    link_file(uploaded_file.path, path)
+    return
+  if hasattr(uploaded_file, 'temporary_file_path'):
+    # upload spooled to disk is moved (renamed when on the same filesystem) instead of copied
+    file_move_safe(uploaded_file.temporary_file_path(), path, allow_overwrite=True)
+    return
+  fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+  try:
+    with os.fdopen(fd, 'wb') as temporary_file:
+      for chunk in uploaded_file.chunks():
+        temporary_file.write(chunk)
+    os.replace(temporary_path, path)
+  except BaseException:
+    os.remove(temporary_path)
+    raise
+
+def link_file(source_path, path):
+  # hard link takes the content without copying it, copy is the fallback when media is on other filesystem
+  temporary_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+  try:
+    try:
+      os.link(source_path, temporary_path)
+    except OSError:
+      shutil.copyfile(source_path, temporary_path)
+    os.replace(temporary_path, path)
+  except BaseException:
+    try:
+      os.remove(temporary_path)
+    except FileNotFoundError:
+      pass
+    raise
+
+def store_blob(uploaded_file):
+  """
+  Store uploaded file content once per digest and return its blob with reference taken.
+  Must be called inside transaction that saves the referencing file.
+  """
+  digest = get_digest(uploaded_file)
+  name = get_blob_name(digest, os.path.splitext(uploaded_file.name)[1])
+  # get_or_create falls back to get when concurrent upload of the same content created blob first
+  blob, created = Blob.objects.select_for_update().get_or_create(digest=digest, defaults={'name': name})
+  if created or not os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.name)):
+    write_blob(uploaded_file, blob.name)
+  Blob.objects.filter(id=blob.id).update(reference_count=F('reference_count') + 1)
+  return blob
+
+def release_blobs(blob_counts):
+  """
+  Drop given number of references of each blob id and return blobs which lost their last reference.
+  Must be called inside transaction that deletes the referencing files, content is left on disk for unlink_blob.
+  """
+  # rows are locked in id order, so concurrent releases can't deadlock
+  blobs = list(Blob.objects.select_for_update().filter(id__in=blob_counts).order_by('id'))
+  released = [blob for blob in blobs if blob.reference_count <= blob_counts[blob.id]]
+  Blob.objects.filter(id__in=[blob.id for blob in released]).delete()
+  decrements = {}
+  for blob in blobs:
+    if blob not in released:
+      decrements.setdefault(blob_counts[blob.id], []).append(blob.id)
+  for count, blob_ids in decrements.items():
+    Blob.objects.filter(id__in=blob_ids).update(reference_count=F('reference_count') - count)
+  return released
+
+def unlink_blob(digest, name):
+  """
+  Unlink content of released blob unless the same content was stored again meanwhile.
+  """
+  try:
+    with transaction.atomic():
+      # placeholder row waits for concurrent upload of the same content and conflicts with it,
+      # while it exists a new upload can't take the content which is being unlinked
+      placeholder = Blob.objects.create(digest=digest, name=name)
+      remove_media(name)
+      placeholder.delete()
+  except IntegrityError:
+    pass
+
+def remove_media(name):
+  try:
+    os.remove(os.path.join(settings.MEDIA_ROOT, name))
+  except FileNotFoundError:
+    pass
+  renditions.delete_renditions(name)
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import datetime
+import logging
+import traceback
+from . import metadata, renditions, storage, versions
+from .models import File, Task
+
+
+logger = logging.getLogger(__name__)
+
+# task name -> (function, function called with task kwargs when all attempts failed)
+registry = {}
+
+
+def task(on_failure=None):
+  def register(function):
+    registry[function.__name__] = (function, on_failure)
+    return function
+  return register
+
+def enqueue(name, **kwargs):
+  if name not in registry:
+    raise KeyError('Unknown task: {}'.format(name))
+  return Task.objects.create(name=name, kwargs=kwargs)
+
+def enqueue_many(name, kwargs_list):
+  if name not in registry:
+    raise KeyError('Unknown task: {}'.format(name))
+  return Task.objects.bulk_create([Task(name=name, kwargs=kwargs) for kwargs in kwargs_list])
+
+def claim_next_task():
+  # claimed task stays queued but holds a lease, so a task of crashed worker is retried when lease expires
+  now = timezone.now()
+  with transaction.atomic():
+    task = (Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.Status.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id').first())
+    if task is not None:
+      task.attempts += 1
+      task.run_after = now + datetime.timedelta(seconds=settings.TASK_LEASE_SECONDS)
+      task.save(update_fields=['attempts', 'run_after'])
+  return task
+
+def run_next_task():
+  """
+  Run one due task. Returns False if there was no due task.
+  """
+  task = claim_next_task()
+  if task is None:
+    return False
+  function, on_failure = registry[task.name]
+  try:
+    function(**task.kwargs)
+  except Exception:
+    logger.exception('Task %s failed on attempt %s', task, task.attempts)
+    task.last_error = traceback.format_exc()
+    if task.attempts < settings.TASK_MAX_ATTEMPTS:
+      retry_delay = settings.TASK_RETRY_DELAY_SECONDS * 2 ** (task.attempts - 1)
+      task.run_after = timezone.now() + datetime.timedelta(seconds=retry_delay)
+    else:
+      task.status = Task.Status.FAILED
+      if on_failure is not None:
+        on_failure(**task.kwargs)
+    task.save(update_fields=['status', 'run_after', 'last_error'])
+  else:
+    task.delete()
+  return True
+
+def file_changed(file_id):
+  versions.files_changed(File.objects.filter(id=file_id).values_list('user_id', flat=True), [file_id])
+
+def mark_file_failed(file_id):
+  File.objects.filter(id=file_id).update(processing_status=File.ProcessingStatus.FAILED)
+  file_changed(file_id)
+
+@task(on_failure=mark_file_failed)
+def process_file(file_id):
+  # update() is used instead of save() as save() would touch auto_now post_date
+  file = File.objects.filter(id=file_id).first()
+  if file is None:
+    return
+  File.objects.filter(id=file_id).update(processing_status=File.ProcessingStatus.PROCESSING)
+  metadata.update_metadata(file)
+  renditions_built = renditions.is_rendition_supported(file.file.name)
+  if renditions_built:
+    for size in settings.RENDITION_SIZES:
+      for extension in settings.RENDITION_FORMATS:
+        renditions.get_or_build_rendition(file.file, size, extension)
+  File.objects.filter(id=file_id).update(processing_status=File.ProcessingStatus.DONE, renditions_built=renditions_built)
+  file_changed(file_id)
+
+@task()
+def remove_files(names=(), blobs=()):
+  # media of deleted files is removed by worker after deleting transaction is committed
+  for name in names:
+    storage.remove_media(name)
+  for digest, name in blobs:
+    storage.unlink_blob(digest, name)
+
+@task()
+def extract_metadata(file_id):
+  # metadata of files uploaded before it was extracted, enqueued by `manage.py extract_metadata`
+  file = File.objects.filter(id=file_id).first()
+  if file is None:
+    return
+  metadata.update_metadata(file)
+  file_changed(file_id)
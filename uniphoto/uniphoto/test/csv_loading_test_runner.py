@@ -1,44 +1,107 @@
-from django.test.runner import DiscoverRunner
+from django.test.runner import DiscoverRunner, ParallelTestSuite
+from django.test.utils import setup_databases
 from django.conf import settings
 from django.db import connection
+import hashlib
 import os
 import shutil
 
 
-settings.MEDIA_ROOT += '\\test'
+TEST_DATA_PATH = os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data')
+TEST_MEDIA_PATH = os.path.join(TEST_DATA_PATH, 'test_media')
+FIXTURE_PATHS = [os.path.join(TEST_DATA_PATH, 'user.csv'), os.path.join(TEST_DATA_PATH, 'file.csv')]
+settings.MEDIA_ROOT += '_test'
+TEST_MEDIA_ROOT = settings.MEDIA_ROOT
+
+
+def get_worker_media_root(worker_id):
+  return TEST_MEDIA_ROOT if not worker_id else '{}_{}'.format(TEST_MEDIA_ROOT, worker_id)
+
+def link_or_copy(source, destination):
+  # media of tests are written to new files and renamed, so fixture media can be shared by hard links
+  try:
+    os.link(source, destination)
+  except OSError:
+    shutil.copy2(source, destination)
+
+def create_media_root(path):
+  shutil.rmtree(path, ignore_errors=True)
+  shutil.copytree(TEST_MEDIA_PATH, path, copy_function=link_or_copy)
+
+def get_fixtures_digest():
+  # seeded database is kept by --keepdb until fixtures or seeding change
+  digest = hashlib.sha256()
+  for path in FIXTURE_PATHS + [__file__]:
+    with open(path, 'rb') as file:
+      digest.update(file.read())
+  return digest.hexdigest()
+
+def init_worker(counter):
+  # worker of parallel run gets its clone of seeded database and its own media root. Django's initializer
+  # takes the next worker id from counter, its lock is reentrant and is held until the id is read here
+  with counter.get_lock():
+    ParallelTestSuite.init_worker(counter)
+    worker_id = counter.value
+  settings.MEDIA_ROOT = get_worker_media_root(worker_id)
+
+
+class CSVParallelTestSuite(ParallelTestSuite):
+  init_worker = init_worker
 
 
 class CSVLoadingTestRunner(DiscoverRunner):
+  """
+  Seeds test database once and clones it for every worker of --parallel run (CREATE DATABASE ... TEMPLATE),
+  with --keepdb seeded database is reused by later runs. Every worker gets its own media root of hard links
+  to fixture media.
+  """
+  parallel_test_suite = CSVParallelTestSuite
+
+  def setup_databases(self, **kwargs):
+    # clones are made after seeding, so they are copies of seeded database
+    old_names = setup_databases(self.verbosity, self.interactive, self.keepdb, self.debug_sql, parallel=0, **kwargs)
+    self.load_fixtures()
+    if self.parallel > 1:
+      for index in range(self.parallel):
+        # clone of older snapshot is replaced
+        connection.creation.clone_test_db(suffix=str(index + 1), verbosity=self.verbosity, keepdb=False)
+    for worker_id in range(self.parallel + 1 if self.parallel > 1 else 1):
+      create_media_root(get_worker_media_root(worker_id))
+    return old_names
 
-  def setup_databases(self, *args, **kwargs):
-    old_names = super(CSVLoadingTestRunner, self).setup_databases(*args, **kwargs)
+  def load_fixtures(self):
+    digest = get_fixtures_digest()
     with connection.cursor() as cursor:
-      test_data_path = os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data')
-      user_csv_path = os.path.join(test_data_path, 'user.csv')
-      file_csv_path = os.path.join(test_data_path, 'file.csv')
-      test_media_path = os.path.join(test_data_path, 'test_media')
-      shutil.copytree(test_media_path, settings.MEDIA_ROOT)
+      # rows are checked too, as TransactionTestCase flushes tables
+      cursor.execute("""
+                     SELECT shobj_description(oid, 'pg_database'), EXISTS(SELECT 1 FROM auth_user)
+                     FROM pg_database WHERE datname = current_database();
+                     """)
+      if cursor.fetchone() == (digest, True):
+        return
+      # ids of fixtures are referenced by tests, so sequences start over. Change log tables reference users
+      # without constraints, so CASCADE doesn't reach them
+      cursor.execute('TRUNCATE auth_user, uniphoto_changecounter, uniphoto_filechange RESTART IDENTITY CASCADE;')
       cursor.execute("""
                      COPY auth_user(username, email, password, is_superuser, is_staff, is_active, first_name, last_name, date_joined)
                      FROM %s
                      DELIMITER ','
                      CSV HEADER;
-                     """, [user_csv_path])
+                     """, [FIXTURE_PATHS[0]])
       cursor.execute("""
-                     COPY uniphoto_file(file, user_id, post_date)
+                     COPY uniphoto_file(file, user_id, post_date, processing_status)
                      FROM %s
                      DELIMITER ','
                      CSV HEADER;
-                     """, [file_csv_path])
-    return old_names
-
-  def teardown_databases(self, *args, **kwargs):
-    shutil.rmtree(settings.MEDIA_ROOT)
-    with connection.cursor() as cursor:
-      cursor.execute("""
-                     DELETE FROM uniphoto_file;
-                     """)
+                     """, [FIXTURE_PATHS[1]])
+      # media type is derived from file name on save, which COPY doesn't call
       cursor.execute("""
-                     DELETE FROM auth_user;
+                     UPDATE uniphoto_file SET media_type = 'video' WHERE lower(file) LIKE '%.mp4';
                      """)
+      cursor.execute('COMMENT ON DATABASE {} IS %s;'.format(connection.ops.quote_name(connection.settings_dict['NAME'])), [digest])
+
+  def teardown_databases(self, *args, **kwargs):
+    # seeded rows go away with test database, or are kept for the next run with --keepdb
+    for worker_id in range(self.parallel + 1 if self.parallel > 1 else 1):
+      shutil.rmtree(get_worker_media_root(worker_id), ignore_errors=True)
     super(CSVLoadingTestRunner, self).teardown_databases(*args, **kwargs)
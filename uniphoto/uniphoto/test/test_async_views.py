@@ -0,0 +1,131 @@
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, AsyncRequestFactory, TestCase
+import hashlib
+import io
+import json
+import os
+from uniphoto import async_views
+from uniphoto.models import File, Task
+from uniphoto.test.utils import FeedCacheMixin
+
+
+class AsyncViewsTests(FeedCacheMixin, TestCase):
+
+  def setUp(self):
+    super().setUp()
+    # test user and its token
+    self.user = User.objects.get(username='azalia')
+    self.token = Token.objects.create(user=self.user)
+    self.client = AsyncClient()
+
+  def get_headers(self, key=None):
+    return {'authorization': 'Token {}'.format(key or self.token.key)}
+
+  async def post_file(self, test_file):
+    # FakePayload of Django 3.1 AsyncClient can't be read by multipart parser, so view is called with request
+    # which body is a plain stream
+    request = AsyncRequestFactory().post('/async/post-file', {'file': test_file}, **self.get_headers())
+    request._stream = io.BytesIO(request._stream.read())
+    return await async_views.post_file(request)
+
+  async def test_get_user_details(self):
+    """
+    Test attempt to get user details from async view.
+    """
+    response = await self.client.get('/async/user-details', **self.get_headers())
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.json(), {'email': self.user.email, 'username': self.user.username})
+
+  async def test_get_user_details_with_invalid_token(self):
+    """
+    Test attempt to get user details from async view with invalid token.
+    """
+    response = await self.client.get('/async/user-details', **self.get_headers('invalid_token'))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+    self.assertEqual(response['WWW-Authenticate'], 'Token')
+    response = await self.client.get('/async/user-details')
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.json(), {'detail': 'Authentication credentials were not provided.'})
+
+  async def test_lists_equal_sync_lists(self):
+    """
+    Test attempt to get files lists from async views that are the same as lists from sync views.
+    """
+    urls = ['/user-files', '/user-files?page=2', '/user-files?fields=id,post_date', '/user-files?pagination=cursor',
+            '/user-files?media_type=video', '/user-files?ordering=-captured_date', '/user-files?captured_after=2021-01-01',
+            '/all-files', '/all-files?page=6', '/all-files?pagination=cursor', '/all-files?username=paulina&page_size=5',
+            '/all-files?fields=id,username&posted_after=2021-03-29', '/user-files?fields=password', '/all-files?ordering=name']
+    # test assertions
+    for url in urls:
+      with self.subTest(url=url):
+        response = await self.client.get('/async' + url, **self.get_headers())
+        sync_response = await sync_to_async(self.client_class().get)(url, HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(response.status_code, sync_response.status_code)
+        data = json.loads(response.content.decode().replace('http://testserver/async/', 'http://testserver/'))
+        self.assertEqual(data, sync_response.json())
+
+  async def test_get_not_modified_responses(self):
+    """
+    Test attempt to get user details and files lists from async views with validators of previous response.
+    """
+    # test assertions
+    for url in ['/async/user-details', '/async/user-files', '/async/all-files', '/async/all-files?fields=id']:
+      with self.subTest(url=url):
+        response = await self.client.get(url, **self.get_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        response = await self.client.get(url, **{'if-none-match': response['ETag']}, **self.get_headers())
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+  async def test_post_and_delete_file(self):
+    """
+    Test attempt to create and delete file with async views.
+    """
+    content = open(os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data', 'file_to_test_post_request.jpg'), 'rb').read()
+    test_file = SimpleUploadedFile('async.jpg', content, content_type='image/jpeg')
+    response = await self.post_file(test_file)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = await sync_to_async(File.objects.get)(id=json.loads(response.content)['id'])
+    digest = hashlib.sha256(content).hexdigest()
+    self.assertEqual(file.file.name, 'blobs/{}/{}/{}.jpg'.format(digest[:2], digest[2:4], digest))
+    self.assertEqual(open(file.file.path, 'rb').read(), content)
+    self.assertTrue(await sync_to_async(Task.objects.filter(name='process_file', kwargs={'file_id': file.id}).exists)())
+    # assert that no temporary file is left in uploads
+    uploads = os.listdir(os.path.join(settings.MEDIA_ROOT, settings.UPLOADS_DIR))
+    self.assertEqual([name for name in uploads if name.startswith('tmp')], [])
+
+    response = await self.client.delete('/async/delete-file/{}'.format(file.id), **self.get_headers())
+    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+    self.assertFalse(await sync_to_async(File.objects.filter(id=file.id).exists)())
+    self.addCleanup(os.remove, file.file.path)
+
+  async def test_post_file_with_unsupported_extension(self):
+    """
+    Test attempt to create file with unsupported extension with async view.
+    """
+    test_file = SimpleUploadedFile('music.mp3', b'music', content_type='audio/mpeg')
+    response = await self.post_file(test_file)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(json.loads(response.content), {'file': ['Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4']})
+
+  async def test_delete_file_of_another_user(self):
+    """
+    Test attempt to delete file of another user with async view.
+    """
+    response = await self.client.delete('/async/delete-file/1', **self.get_headers())
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    response = await self.client.delete('/async/delete-file/999999', **self.get_headers())
+    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    response = await self.client.get('/async/delete-file/1', **self.get_headers())
+    self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
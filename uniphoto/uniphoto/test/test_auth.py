@@ -1,7 +1,10 @@
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework.exceptions import ErrorDetail
+from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
+from django.test import override_settings
+from uniphoto.authentication import local_token_cache
 from uniphoto.models import File
 
 
@@ -229,4 +232,107 @@ class SignInTests(APITestCase):
     self.assertEqual(response.data, {
                                         'username': [ErrorDetail('This field is required.', code='required')], 
                                         'password': [ErrorDetail('This field is required.', code='required')]
-                                    })
\ No newline at end of file
+                                    })
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+  def setUp(self):
+    local_token_cache.clear()
+    # test user
+    self.user = User.objects.get(username='azalia')
+    self.token = Token.objects.create(user=self.user)
+    # add valid credentials to all requests from client
+    self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+  def test_warm_requests_do_not_query_database(self):
+    """
+    Test attempt to authenticate with token which lookup is cached.
+    """
+    # url for request
+    url = '/user-details'
+    # first request looks token up
+    with self.assertNumQueries(1):
+      response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    # test assertions
+    with self.assertNumQueries(0):
+      response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.data, {'email': 'azalia@uniphoto.com', 'username': 'azalia'})
+
+  def test_deleted_token_is_invalidated(self):
+    """
+    Test attempt to authenticate with cached token which was deleted.
+    """
+    # url for request
+    url = '/user-details'
+    self.client.get(url)
+    self.token.delete()
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.data, {'detail': ErrorDetail(string='Invalid token.', code='authentication_failed')})
+
+  def test_deactivated_user_is_invalidated(self):
+    """
+    Test attempt to authenticate with cached token of user who was deactivated.
+    """
+    # url for request
+    url = '/user-details'
+    self.client.get(url)
+    self.user.is_active = False
+    self.user.save()
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.data, {'detail': ErrorDetail(string='User inactive or deleted.', code='authentication_failed')})
+
+  @override_settings(TOKEN_AUTHENTICATION_CACHE={'BACKEND': None, 'MAX_SIZE': 1, 'TTL': 300})
+  def test_cache_size_is_bounded(self):
+    """
+    Test attempt to authenticate with more tokens than cache can hold.
+    """
+    other_token = Token.objects.create(user=User.objects.get(username='paulina'))
+    # url for request
+    url = '/user-details'
+    self.client.get(url)
+    self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(other_token.key))
+    self.client.get(url)
+    # test assertions
+    self.assertEqual(len(local_token_cache.entries), 1)
+    self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+    with self.assertNumQueries(1):
+      self.client.get(url)
+
+  @override_settings(TOKEN_AUTHENTICATION_CACHE={'BACKEND': None, 'MAX_SIZE': 10, 'TTL': 0})
+  def test_cached_token_expires(self):
+    """
+    Test attempt to authenticate with token which cache entry expired.
+    """
+    # url for request
+    url = '/user-details'
+    self.client.get(url)
+    # test assertions
+    with self.assertNumQueries(1):
+      self.client.get(url)
+
+  @override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TOKEN_AUTHENTICATION_CACHE={'BACKEND': 'default', 'MAX_SIZE': 10, 'TTL': 300},
+  )
+  def test_shared_cache_backend(self):
+    """
+    Test attempt to authenticate with token which lookup is cached in shared cache.
+    """
+    # url for request
+    url = '/user-details'
+    self.client.get(url)
+    # test assertions
+    with self.assertNumQueries(0):
+      response = self.client.get(url)
+    self.assertEqual(response.data['username'], 'azalia')
+    self.assertEqual(len(local_token_cache.entries), 0)
+    self.token.delete()
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,87 @@
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+import io
+import json
+import os
+import tempfile
+from uniphoto import feed
+from uniphoto.benchmarks import api, dataset
+from uniphoto.management.commands import benchmark
+from uniphoto.models import Blob, File, FileChange, StorageUsage
+
+
+class BenchmarkTests(TestCase):
+
+  def setUp(self):
+    feed.get_cache().clear()
+    # synthetic media is written to its own media root
+    media_root = tempfile.TemporaryDirectory()
+    self.addCleanup(media_root.cleanup)
+    self.settings_override = override_settings(MEDIA_ROOT=media_root.name)
+    self.settings_override.enable()
+    self.addCleanup(self.settings_override.disable)
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+
+  def get_dataset(self):
+    files = File.objects.filter(user__username__startswith=dataset.DATASET_USERNAME_PREFIX)
+    return list(files.order_by('id').values_list('user__username', 'post_date', 'size', 'media_type', 'blob__digest'))
+
+  def test_generate_dataset(self):
+    """
+    Test attempt to generate the same dataset twice from the same seed.
+    """
+    stdout = io.StringIO()
+    call_command('generate_dataset', '--users', '20', '--files', '300', '--media', '5', stdout=stdout)
+    first = self.get_dataset()
+    call_command('generate_dataset', '--users', '20', '--files', '300', '--media', '5', '--reset', stdout=stdout)
+    # test assertions
+    self.assertEqual(len(first), 300)
+    self.assertEqual(self.get_dataset(), first)
+    self.assertEqual(dataset.get_dataset_users().count(), 20)
+    heaviest = dataset.get_dataset_users().get(username=dataset.DATASET_USERNAME_PREFIX + '0')
+    self.assertTrue(heaviest.is_staff)
+    self.assertEqual(FileChange.objects.filter(user=heaviest).count(), File.objects.filter(user=heaviest).count())
+    self.assertEqual(StorageUsage.objects.get(user=heaviest).used_bytes,
+                     sum(size for size in File.objects.filter(user=heaviest).values_list('size', flat=True)))
+    blob = Blob.objects.get(digest=first[0][4])
+    self.assertEqual(blob.reference_count, File.objects.filter(blob=blob).count())
+    self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.name)))
+    with self.assertRaises(CommandError):
+      call_command('generate_dataset', '--users', '10', '--files', '300', '--media', '5', stdout=stdout)
+
+  def test_api_scenario(self):
+    """
+    Test attempt to run API benchmark and compare its results with baseline.
+    """
+    options = {'users': 10, 'rows': 200, 'media': 3, 'seed': 1, 'repeat': 2}
+    dataset.generate(options['users'], options['rows'], options['media'], options['seed'])
+    files = self.get_dataset()
+    results = api.run(options)
+    baseline = {'results': [dict(result, median_ms=result['median_ms'] * 2) for result in results]}
+    compared = benchmark.compare([dict(result) for result in results], baseline)
+    # test assertions
+    endpoints = {result['endpoint'] for result in results}
+    self.assertIn('/async/delete-file', endpoints)
+    self.assertIn('/upload', endpoints)
+    self.assertTrue(all(result['median_ms'] > 0 for result in results))
+    self.assertTrue(all(result['change_pct'] == -50 for result in compared if result['baseline_median_ms']))
+    # files which benchmark uploaded are deleted
+    self.assertEqual(self.get_dataset(), files)
+
+  def test_output(self):
+    """
+    Test attempt to write results of benchmark run with its metadata.
+    """
+    path = os.path.join(self.directory.name, 'results.json')
+    call_command('benchmark', 'api', '--users', '5', '--rows', '50', '--media', '2', '--repeat', '1', '--output', path,
+                 stdout=io.StringIO())
+    with open(path) as file:
+      output = json.load(file)
+    # test assertions
+    self.assertEqual(output['meta']['scenario'], 'api')
+    self.assertEqual(output['meta']['options']['rows'], 50)
+    self.assertIn('commit', output['meta'])
+    self.assertEqual({result['scenario'] for result in output['results']}, {'api'})
@@ -0,0 +1,270 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework.exceptions import ErrorDetail
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+import hashlib
+import os
+from uniphoto.models import File, Task, UploadSession
+from uniphoto import storage
+from uniphoto.storage import get_partial_upload_path
+from uniphoto.test.utils import OnCommitMixin
+
+
+class ChunkedUploadTests(OnCommitMixin, APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+    # content starts with ftyp box as mp4 does
+    self.content = b'\x00\x00\x00\x18ftypisom' + os.urandom(300 * 1024)
+
+  def start_upload(self, filename='video.mp4', size=None):
+    data = {'filename': filename, 'size': len(self.content) if size is None else size}
+    return self.client.post('/upload', data, format='json')
+
+  def put_chunk(self, upload_id, offset, chunk):
+    return self.client.put('/upload/{}'.format(upload_id), data=chunk, content_type='application/octet-stream',
+                           HTTP_UPLOAD_OFFSET=str(offset))
+
+  def upload(self):
+    upload_id = self.start_upload().data['id']
+    self.put_chunk(upload_id, 0, self.content)
+    return upload_id
+
+  def test_chunked_upload(self):
+    """
+    Test attempt to upload file in chunks.
+    """
+    file_counts = File.objects.all().count()
+    response = self.start_upload()
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(response.data['offset'], 0)
+    upload_id = response.data['id']
+
+    # upload file in chunks
+    chunk_size = 100 * 1024
+    for offset in range(0, len(self.content), chunk_size):
+      response = self.put_chunk(upload_id, offset, self.content[offset:offset + chunk_size])
+      self.assertEqual(response.status_code, status.HTTP_200_OK)
+      self.assertEqual(response.data['offset'], min(offset + chunk_size, len(self.content)))
+
+    # assert that upload status tells offset to resume from
+    response = self.client.get('/upload/{}'.format(upload_id))
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.data['offset'], len(self.content))
+
+    # finalize upload
+    response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.assertEqual(File.objects.all().count(), file_counts + 1)
+    self.assertEqual(file.user, self.user)
+    self.assertEqual(file.blob.digest, hashlib.sha256(self.content).hexdigest())
+    self.assertTrue(file.file.name.endswith('.mp4'))
+    self.assertEqual(open(file.file.path, 'rb').read(), self.content)
+    self.assertTrue(Task.objects.filter(name='process_file', kwargs={'file_id': file.id}).exists())
+    # assert that upload session is finished
+    self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+    self.run_on_commit_callbacks()
+    self.assertFalse(os.path.exists(get_partial_upload_path(upload_id)))
+
+  def test_resume_upload_after_dropped_connection(self):
+    """
+    Test attempt to resume upload which chunk was partially received.
+    """
+    upload_id = self.start_upload().data['id']
+    self.put_chunk(upload_id, 0, self.content[:1000])
+    # bytes of dropped chunk are written but not acknowledged
+    with open(get_partial_upload_path(upload_id), 'ab') as partial_upload:
+      partial_upload.write(b'garbage')
+
+    response = self.put_chunk(upload_id, 1000, self.content[1000:])
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.assertEqual(open(file.file.path, 'rb').read(), self.content)
+
+  def test_put_chunk_with_wrong_offset(self):
+    """
+    Test attempt to upload chunk at offset which isn't the end of received data.
+    """
+    upload_id = self.start_upload().data['id']
+    self.put_chunk(upload_id, 0, self.content[:1000])
+    response = self.put_chunk(upload_id, 500, self.content[500:1500])
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    self.assertEqual(response.data['offset'], 1000)
+    response = self.put_chunk(upload_id, 1000, self.content[1000:2000])
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+  def test_put_chunk_while_other_chunk_is_written(self):
+    """
+    Test attempt to upload chunk while other request writes chunk of the same upload.
+    """
+    upload_id = self.start_upload().data['id']
+    with storage.lock_partial_upload(upload_id) as partial_upload:
+      self.assertIsNotNone(partial_upload)
+      response = self.put_chunk(upload_id, 0, self.content[:1000])
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    self.assertEqual(response.data, {'message': 'Upload is in progress.', 'offset': 0})
+    self.assertEqual(self.put_chunk(upload_id, 0, self.content[:1000]).status_code, status.HTTP_200_OK)
+
+  def test_put_chunk_without_row_lock(self):
+    """
+    Test attempt to upload chunk which offset is committed by conditional update instead of locked session row.
+    """
+    upload_id = self.start_upload().data['id']
+    with CaptureQueriesContext(connection) as queries:
+      response = self.put_chunk(upload_id, 0, self.content[:1000])
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertFalse([query for query in queries.captured_queries if 'FOR UPDATE' in query['sql']])
+    update = next(query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE'))
+    self.assertIn('"offset" = 0', update)
+
+  def test_finalize_hashes_content_before_locking_session(self):
+    """
+    Test attempt to finalize upload which content is hashed outside of transaction.
+    """
+    upload_id = self.upload()
+    atomic_depths = []
+    sha256 = hashlib.sha256
+
+    class RecordingSha256:
+
+      def __init__(self):
+        self.sha256 = sha256()
+
+      def update(self, data):
+        atomic_depths.append(len(connection.savepoint_ids))
+        self.sha256.update(data)
+
+      def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    test_depth = len(connection.savepoint_ids)
+    with mock.patch('uniphoto.storage.hashlib.sha256', RecordingSha256):
+      response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.assertTrue(atomic_depths)
+    self.assertEqual(set(atomic_depths), {test_depth})
+    self.assertEqual(file.blob.digest, hashlib.sha256(self.content).hexdigest())
+
+  def test_put_chunk_beyond_upload_size(self):
+    """
+    Test attempt to upload more data than declared upload size.
+    """
+    upload_id = self.start_upload(size=1000).data['id']
+    response = self.put_chunk(upload_id, 0, self.content[:1001])
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 0)
+
+  def test_put_chunk_without_offset(self):
+    """
+    Test attempt to upload chunk without Upload-Offset header.
+    """
+    upload_id = self.start_upload().data['id']
+    response = self.client.put('/upload/{}'.format(upload_id), data=self.content[:1000], content_type='application/octet-stream')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data['message'], 'Upload-Offset header is required.')
+
+  def test_finalize_incomplete_upload(self):
+    """
+    Test attempt to finalize upload before all chunks are received.
+    """
+    file_counts = File.objects.all().count()
+    upload_id = self.start_upload().data['id']
+    self.put_chunk(upload_id, 0, self.content[:1000])
+    response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'message': 'Upload is not complete.', 'offset': 1000})
+    self.assertEqual(File.objects.all().count(), file_counts)
+
+  def test_start_upload_with_unsupported_extension(self):
+    """
+    Test attempt to start upload of file with unsupported extension.
+    """
+    response = self.start_upload(filename='music.mp3')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'filename': [ErrorDetail('Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4', code='invalid')]})
+    self.assertFalse(UploadSession.objects.exists())
+
+  def test_upload_of_another_user(self):
+    """
+    Test attempt to upload chunk to upload of another user.
+    """
+    upload_id = self.start_upload().data['id']
+    self.client.force_authenticate(user=User.objects.get(username='paulina'))
+    # test assertions
+    self.assertEqual(self.put_chunk(upload_id, 0, self.content[:1000]).status_code, status.HTTP_404_NOT_FOUND)
+    self.assertEqual(self.client.post('/upload/{}/finalize'.format(upload_id)).status_code, status.HTTP_404_NOT_FOUND)
+    self.assertEqual(self.client.delete('/upload/{}'.format(upload_id)).status_code, status.HTTP_404_NOT_FOUND)
+
+  def test_abort_upload(self):
+    """
+    Test attempt to abort upload.
+    """
+    upload_id = self.start_upload().data['id']
+    self.put_chunk(upload_id, 0, self.content[:1000])
+    response = self.client.delete('/upload/{}'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+    self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+    self.assertFalse(os.path.exists(get_partial_upload_path(upload_id)))
+
+  def test_retry_finalize_over_quota(self):
+    """
+    Test attempt to finalize upload again after it was refused for exceeding quota.
+    """
+    upload_id = self.upload()
+    file_counts = File.objects.all().count()
+    with override_settings(STORAGE_QUOTA_BYTES=len(self.content) - 1):
+      response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    self.assertEqual(File.objects.all().count(), file_counts)
+    self.assertTrue(os.path.exists(get_partial_upload_path(upload_id)))
+    response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.run_on_commit_callbacks()
+    self.assertFalse(os.path.exists(get_partial_upload_path(upload_id)))
+
+  def test_retry_rolled_back_finalize(self):
+    """
+    Test attempt to finalize upload again after quota was used up by concurrent upload while content was stored.
+    """
+    upload_id = self.upload()
+    with override_settings(STORAGE_QUOTA_BYTES=len(self.content) - 1), mock.patch('uniphoto.quota.check_quota'):
+      response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    self.assertEqual(UploadSession.objects.get(id=upload_id).offset, len(self.content))
+    with open(get_partial_upload_path(upload_id), 'rb') as partial_upload:
+      self.assertEqual(partial_upload.read(), self.content)
+    response = self.client.post('/upload/{}/finalize'.format(upload_id))
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    with open(file.file.path, 'rb') as blob:
+      self.assertEqual(blob.read(), self.content)
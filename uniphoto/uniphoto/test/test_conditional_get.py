@@ -0,0 +1,120 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from uniphoto import deletion, tasks
+from uniphoto.models import File
+from uniphoto.test.utils import FeedCacheMixin, OnCommitMixin
+
+
+class ConditionalGetTests(FeedCacheMixin, OnCommitMixin, APITestCase):
+
+  def setUp(self):
+    super().setUp()
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def get_etag(self, url):
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    return response['ETag']
+
+  def assertNotModified(self, url, etag, not_modified=True):
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED if not_modified else status.HTTP_200_OK)
+
+  def test_get_not_modified_lists_with_one_query(self):
+    """
+    Test attempt to get 304 for file lists which weren't changed, with one query of their version.
+    """
+    # test assertions
+    for url in ['/user-files', '/user-files?page=2', '/all-files', '/all-files?page=6', '/all-files?fields=id']:
+      with self.subTest(url=url):
+        etag = self.get_etag(url)
+        with self.assertNumQueries(1):
+          response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+    self.assertNotEqual(self.get_etag('/user-files'), self.get_etag('/user-files?page=2'))
+
+  def test_get_lists_after_file_changes(self):
+    """
+    Test attempt to get changed file lists after files were created, processed and deleted.
+    """
+    user_files_etag, all_files_etag = self.get_etag('/user-files'), self.get_etag('/all-files')
+    file = File.objects.create(user=self.user, file='conditional.jpg')
+    self.run_on_commit_callbacks()
+    # test assertions
+    self.assertNotModified('/user-files', user_files_etag, False)
+    self.assertNotModified('/all-files', all_files_etag, False)
+    user_files_etag, all_files_etag = self.get_etag('/user-files'), self.get_etag('/all-files')
+    # processing status is shown in lists
+    tasks.mark_file_failed(file.id)
+    self.run_on_commit_callbacks()
+    self.assertNotModified('/user-files', user_files_etag, False)
+    self.assertNotModified('/all-files', all_files_etag, False)
+    user_files_etag = self.get_etag('/user-files')
+    deletion.delete_files(File.objects.filter(id=file.id))
+    self.run_on_commit_callbacks()
+    self.assertNotModified('/user-files', user_files_etag, False)
+
+  def test_get_lists_after_file_is_processed_by_worker(self):
+    """
+    Test attempt to get changed file lists after task worker, another process, processed a file.
+    """
+    file = File.objects.filter(user=self.user, file__iendswith='.jpg').first()
+    user_files_etag, all_files_etag = self.get_etag('/user-files'), self.get_etag('/all-files')
+    tasks.enqueue('process_file', file_id=file.id)
+    # caches of web process aren't shared with worker, so nothing cached by worker may be relied on
+    caches['default'].clear()
+    self.assertTrue(tasks.run_next_task())
+    self.run_on_commit_callbacks()
+    caches['default'].clear()
+    # test assertions
+    self.assertNotModified('/user-files', user_files_etag, False)
+    self.assertNotModified('/all-files', all_files_etag, False)
+
+  def test_get_user_files_after_change_of_another_user(self):
+    """
+    Test attempt to get user files list when only files of another user were changed.
+    """
+    user_files_etag, all_files_etag = self.get_etag('/user-files'), self.get_etag('/all-files')
+    deletion.delete_files(File.objects.filter(id=1))
+    self.run_on_commit_callbacks()
+    # test assertions
+    self.assertNotModified('/user-files', user_files_etag)
+    self.assertNotModified('/all-files', all_files_etag, False)
+
+  def test_get_list_with_if_modified_since(self):
+    """
+    Test attempt to get 304 for file list with Last-Modified of previous response.
+    """
+    # user which files were never changed has no modification time
+    self.assertFalse(self.client.get('/user-files').has_header('Last-Modified'))
+    File.objects.create(user=self.user, file='conditional.jpg')
+    last_modified = self.client.get('/user-files')['Last-Modified']
+    response = self.client.get('/user-files', HTTP_IF_MODIFIED_SINCE=last_modified)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    self.assertEqual(response['Cache-Control'], 'private, no-cache')
+    File.objects.create(user=self.user, file='conditional_second.jpg')
+    self.run_on_commit_callbacks()
+    response = self.client.get('/user-files', HTTP_IF_MODIFIED_SINCE=last_modified)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertGreater(response['Last-Modified'], last_modified)
+
+  def test_get_user_details_and_license_check(self):
+    """
+    Test attempt to get 304 for user details and trial license check.
+    """
+    # test assertions
+    for url in ['/user-details', '/trial-license-check']:
+      with self.subTest(url=url):
+        self.assertNotModified(url, self.get_etag(url))
+    etag = self.get_etag('/user-details')
+    self.user.email = 'azalia.new@example.com'
+    self.user.save()
+    self.assertNotModified('/user-details', etag, False)
@@ -0,0 +1,109 @@
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from uniphoto.models import File
+from uniphoto.pagination import FilePagination
+from uniphoto.renderers import FastJSONRenderer
+
+
+@override_settings(FEED_CACHE=dict(settings.FEED_CACHE, PAGES=0))
+class FastFileListsTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='paulina')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def assertSameOutput(self, url):
+    with override_settings(FAST_FILE_LISTS=False):
+      expected = self.client.get(url)
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, expected.status_code)
+    self.assertEqual(response.content, expected.content)
+
+  def test_fast_lists_equal_serializer_lists(self):
+    """
+    Test attempt to get files lists which fast path output is the same as serializers output.
+    """
+    # files which names need quoting in urls and file without name
+    File.objects.create(user=self.user, file='фото 1.jpg', processing_status=File.ProcessingStatus.DONE)
+    File.objects.create(user=self.user, file='video #2.mp4', processing_status=File.ProcessingStatus.DONE)
+    File.objects.create(user=self.user, file='', processing_status=File.ProcessingStatus.DONE)
+    # file with built renditions
+    File.objects.filter(id=1).update(renditions_built=True)
+    # test assertions
+    for url in ['/user-files', '/user-files?page=4', '/user-files?pagination=cursor', '/all-files', '/all-files?page=5',
+                '/all-files?pagination=cursor', '/user-files?format=json']:
+      with self.subTest(url=url):
+        self.assertSameOutput(url)
+
+  def test_render_like_json_renderer(self):
+    """
+    Test attempt to render data which is the same as JSONRenderer output.
+    """
+    data = {'text': 'line\u2028separator "quoted" фото', 'number': 1.5, 'items': [None, True, {'id': 1}]}
+    # test assertions
+    self.assertEqual(FastJSONRenderer().render(data), super(FastJSONRenderer, FastJSONRenderer()).render(data))
+    self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=4'),
+                     super(FastJSONRenderer, FastJSONRenderer()).render(data, 'application/json; indent=4'))
+
+
+@override_settings(FEED_CACHE=dict(settings.FEED_CACHE, PAGES=0))
+class FileListFieldsTests(APITestCase):
+
+  def setUp(self):
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=User.objects.get(username='paulina'))
+
+  def test_get_files_list_with_fields(self):
+    """
+    Test attempt to get files list with only requested fields which are the only selected columns.
+    """
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get('/all-files?fields=post_date,id')
+    # test assertions
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(list(response.data['results'][0]), ['id', 'post_date'])
+    select = queries.captured_queries[-1]['sql']
+    self.assertTrue('"post_date"' in select)
+    self.assertFalse('"file"' in select)
+    self.assertFalse('auth_user' in select)
+
+  def test_fields_of_fast_and_serializer_lists_are_the_same(self):
+    """
+    Test attempt to get files list with fields from fast path and from serializers.
+    """
+    # test assertions
+    for url in ['/all-files?fields=username,renditions', '/user-files?fields=file&pagination=cursor']:
+      with self.subTest(url=url):
+        with override_settings(FAST_FILE_LISTS=False):
+          expected = self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+
+  def test_get_files_list_with_unknown_fields(self):
+    """
+    Test attempt to get files list with fields which files don't have.
+    """
+    response = self.client.get('/user-files?fields=id,password')
+    # test assertions
+    self.assertEqual(response.status_code, 400)
+    self.assertEqual(response.data['fields'][0], 'Unknown fields: password. Available fields: id, file, post_date, processing_status, renditions, metadata.')
+
+  def test_get_files_list_with_page_size(self):
+    """
+    Test attempt to get files list with page size chosen by client.
+    """
+    response = self.client.get('/all-files?page_size=3&fields=id')
+    # test assertions
+    self.assertEqual(len(response.data['results']), 3)
+    self.assertTrue('page_size=3' in response.data['next'])
+    response = self.client.get('/all-files?page_size=2&pagination=cursor')
+    self.assertEqual(len(response.data['results']), 2)
+    response = self.client.get('/all-files?page_size={}'.format(FilePagination.max_page_size + 1))
+    self.assertEqual(len(response.data['results']), min(File.objects.count(), FilePagination.max_page_size))
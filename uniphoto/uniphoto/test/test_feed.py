@@ -0,0 +1,170 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+import os
+from uniphoto import feed, versions
+from uniphoto.models import File, FileListChange
+from uniphoto.test.utils import FeedCacheMixin, OnCommitMixin
+
+
+class CachedFeedTests(FeedCacheMixin, OnCommitMixin, APITestCase):
+
+  def setUp(self):
+    super().setUp()
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=User.objects.get(username='paulina'))
+
+  def get_uncached(self, url):
+    with override_settings(FEED_CACHE=dict(settings.FEED_CACHE, PAGES=0)):
+      return self.client.get(url).json()
+
+  def post_file(self):
+    test_filename = 'file_to_test_post_request.jpg'
+    test_file_path = os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data', test_filename)
+    test_file = SimpleUploadedFile(test_filename, open(test_file_path, 'rb').read(), content_type='multipart/form-data')
+    response = self.client.post('/post-file', {'file': test_file}, format='multipart')
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    return file
+
+  def test_get_first_page_with_version_query_only(self):
+    """
+    Test attempt to get first page of all files list which is served from cache, only its version is queried.
+    """
+    self.client.get('/all-files')
+    # test assertions
+    with self.assertNumQueries(1):
+      response = self.client.get('/all-files')
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response['Content-Type'], 'application/json')
+    self.assertEqual(response.data['count'], File.objects.all().count())
+
+  def test_cached_pages_equal_uncached_pages(self):
+    """
+    Test attempt to get cached pages of all files list that are the same as pages from database.
+    """
+    # test assertions
+    for url in ['/all-files', '/all-files?page=2', '/all-files?page=5']:
+      with self.subTest(url=url):
+        self.assertEqual(self.client.get(url).json(), self.get_uncached(url))
+
+  def test_get_page_which_is_not_cached(self):
+    """
+    Test attempt to get page of all files list beyond cached pages.
+    """
+    url = '/all-files?page={}'.format(settings.FEED_CACHE['PAGES'] + 1)
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.json(), self.get_uncached(url))
+    response = self.client.get('/all-files?page=100')
+    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+  def test_post_file_updates_cached_feed(self):
+    """
+    Test attempt to post file that appears on the first page of cached feed.
+    """
+    self.client.get('/all-files')
+    file = self.post_file()
+    self.run_on_commit_callbacks()
+    # test assertions
+    response = self.client.get('/all-files')
+    self.assertEqual(response.data['results'][0]['id'], file.id)
+    self.assertEqual(response.data['results'][0]['username'], 'paulina')
+    self.assertEqual(response.json(), self.get_uncached('/all-files'))
+    # updated feed is cached again
+    with self.assertNumQueries(1):
+      self.client.get('/all-files')
+
+  def test_post_file_updates_cached_feed_without_count(self):
+    """
+    Test attempt to get the first page after file was posted, cached feed applies logged change instead of reading the feed again.
+    """
+    self.client.get('/all-files')
+    self.post_file()
+    self.run_on_commit_callbacks()
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get('/all-files')
+    # test assertions
+    self.assertEqual(response.data['count'], File.objects.all().count())
+    self.assertFalse([query for query in queries.captured_queries if 'COUNT(' in query['sql'].upper()])
+    # version, logged change and the posted file
+    self.assertEqual(len(queries.captured_queries), 3)
+
+  def test_delete_file_updates_cached_feed(self):
+    """
+    Test attempt to delete files that disappear from cached feed which is refilled from the following files.
+    """
+    for page in range(1, settings.FEED_CACHE['PAGES'] + 1):
+      self.client.get('/all-files?page={}'.format(page))
+    # files aren't deleted through view as fixture files are shared with other tests
+    file_ids = list(File.objects.order_by('-id').values_list('id', flat=True)[:3])
+    for file in File.objects.filter(id__in=file_ids):
+      file.delete()
+    self.run_on_commit_callbacks()
+    # test assertions
+    for url in ['/all-files', '/all-files?page=5']:
+      with self.subTest(url=url):
+        self.assertEqual(self.client.get(url).json(), self.get_uncached(url))
+    response = self.client.get('/all-files')
+    self.assertNotIn(response.data['results'][0]['id'], file_ids)
+    self.assertEqual(response.data['count'], File.objects.all().count())
+
+  def test_change_committed_while_feed_is_built(self):
+    """
+    Test attempt to get cached feed which was built after change was committed and before global version was changed.
+    """
+    file = self.post_file()
+    # change is committed, its callbacks which change version haven't run yet
+    self.client.get('/all-files')
+    self.run_on_commit_callbacks()
+    response = self.client.get('/all-files')
+    # test assertions
+    self.assertEqual(response.data['results'][0]['id'], file.id)
+    self.assertEqual(response.data['count'], File.objects.all().count())
+    self.assertEqual(response.json(), self.get_uncached('/all-files'))
+
+  def test_missing_changes_rebuild_cached_feed(self):
+    """
+    Test attempt to get cached feed which changes were pruned.
+    """
+    self.client.get('/all-files')
+    file = self.post_file()
+    self.run_on_commit_callbacks()
+    FileListChange.objects.all().delete()
+    # test assertions
+    response = self.client.get('/all-files')
+    self.assertEqual(response.data['results'][0]['id'], file.id)
+    self.assertEqual(response.json(), self.get_uncached('/all-files'))
+
+  def test_feed_rebuilt_by_another_process(self):
+    """
+    Test attempt to get the first page while another process builds the feed, the page is read from database.
+    """
+    feed.get_cache().add(feed.REBUILD_KEY, True)
+    response = self.client.get('/all-files')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.json(), self.get_uncached('/all-files'))
+    self.assertIsNone(feed.get_cache().get(feed.STATE_KEY))
+
+  def test_change_by_another_process_updates_cached_feed(self):
+    """
+    Test attempt to get cached feed after task worker, another process, changed file on the first page.
+    """
+    self.client.get('/all-files')
+    file_id = File.objects.order_by('-id').first().id
+    # worker changes database and version only, it can't touch cache of web process
+    File.objects.filter(id=file_id).update(processing_status=File.ProcessingStatus.FAILED)
+    versions.files_changed([File.objects.get(id=file_id).user_id])
+    self.run_on_commit_callbacks()
+    response = self.client.get('/all-files')
+    # test assertions
+    self.assertEqual(response.data['results'][0]['processing_status'], File.ProcessingStatus.FAILED)
+    self.assertEqual(response.data['count'], File.objects.all().count())
+    self.assertEqual(response.json(), self.get_uncached('/all-files'))
@@ -0,0 +1,103 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+import datetime
+import itertools
+import os
+from uniphoto import feed
+from uniphoto.models import File
+
+
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+MP4_HEADER = b'\x00\x00\x00\x18ftypisom'
+
+
+class FileFiltersTests(APITestCase):
+
+  def setUp(self):
+    feed.get_cache().clear()
+    # test user
+    self.user = User.objects.get(username='paulina')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+    self.posted_after = File.objects.order_by('id').values_list('post_date', flat=True)[20]
+
+  def get_ids(self, url):
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    return [item['id'] for item in response.json()['results']]
+
+  def get_expected_ids(self, queryset):
+    return list(queryset.order_by('-id').values_list('id', flat=True)[:10])
+
+  def test_filter_by_media_type(self):
+    """
+    Test attempt to get files of given media type.
+    """
+    # test assertions
+    self.assertEqual(self.get_ids('/user-files?media_type=video'),
+                     self.get_expected_ids(File.objects.filter(user=self.user, file__endswith='.mp4')))
+    self.assertEqual(self.get_ids('/all-files?media_type=video'), self.get_expected_ids(File.objects.filter(file__endswith='.mp4')))
+    self.assertEqual(self.get_ids('/user-files?media_type=photo'),
+                     self.get_expected_ids(File.objects.filter(user=self.user, file__endswith='.jpg')))
+
+  def test_filter_by_post_date(self):
+    """
+    Test attempt to get files posted in date range.
+    """
+    posted_before = self.posted_after + datetime.timedelta(minutes=3)
+    url = '/all-files?posted_after={}&posted_before={}'.format(self.posted_after.isoformat(), posted_before.isoformat())
+    # test assertions
+    self.assertEqual(self.get_ids(url),
+                     self.get_expected_ids(File.objects.filter(post_date__gte=self.posted_after, post_date__lt=posted_before)))
+    self.assertEqual(self.get_ids('/user-files?posted_after=2021-03-30'), [])
+
+  def test_filter_by_username(self):
+    """
+    Test attempt to get files of other user from all files list.
+    """
+    # test assertions
+    self.assertEqual(self.get_ids('/all-files?username=azalia'),
+                     self.get_expected_ids(File.objects.filter(user__username='azalia')))
+    self.assertEqual(self.get_ids('/all-files?username=nobody'), [])
+
+  def test_filters_query_count(self):
+    """
+    Test attempt to get files with every combination of filters in the same number of queries.
+    """
+    filters = ['posted_after={}'.format(self.posted_after.isoformat()), 'media_type=video', 'username=azalia']
+    # test assertions
+    for count in range(len(filters) + 1):
+      for combination in itertools.combinations(filters, count):
+        for url in ['/all-files?' + '&'.join(combination), '/user-files?' + '&'.join(combination)]:
+          # version, count and page
+          with self.subTest(url=url), self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+  def test_invalid_filters(self):
+    """
+    Test attempt to get files with unknown media type and invalid date.
+    """
+    # test assertions
+    for url in ['/user-files?media_type=audio', '/all-files?posted_after=yesterday', '/all-files?posted_before=2021-13-01']:
+      with self.subTest(url=url):
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_media_type_of_created_files(self):
+    """
+    Test attempt to create photo and video which get media type from extension.
+    """
+    response = self.client.post('/post-files', {'files': [SimpleUploadedFile('photo.jpg', JPEG_HEADER + b'photo'),
+                                                           SimpleUploadedFile('video.MP4', MP4_HEADER + b'video')]},
+                                format='multipart')
+    created = {result['name']: File.objects.get(id=result['file']['id']) for result in response.data['results']}
+    for file in created.values():
+      self.addCleanup(os.remove, file.file.path)
+    # test assertions
+    self.assertEqual(created['photo.jpg'].media_type, File.MediaType.PHOTO)
+    self.assertEqual(created['video.MP4'].media_type, File.MediaType.VIDEO)
+    response = self.client.post('/post-file', {'file': SimpleUploadedFile('single.mp4', MP4_HEADER + b'single video')}, format='multipart')
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.assertEqual(file.media_type, File.MediaType.VIDEO)
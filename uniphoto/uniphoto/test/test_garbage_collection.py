@@ -0,0 +1,116 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+import datetime
+import hashlib
+import io
+import os
+import tempfile
+import time
+from uniphoto import versions
+from uniphoto.models import Blob, File, FileListChange, UploadSession
+from uniphoto.storage import get_blob_name
+
+
+class CollectGarbageTests(TestCase):
+
+  def setUp(self):
+    # every test gets its own media, so that garbage collection doesn't touch files of other tests
+    media_root = tempfile.TemporaryDirectory()
+    self.addCleanup(media_root.cleanup)
+    self.settings_override = override_settings(MEDIA_ROOT=media_root.name)
+    self.settings_override.enable()
+    self.addCleanup(self.settings_override.disable)
+    self.media_root = media_root.name
+
+  def create_media(self, name, age=48 * 3600):
+    path = os.path.join(self.media_root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+      file.write(b'content')
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    return name
+
+  def collect_garbage(self, *args):
+    stdout = io.StringIO()
+    call_command('collect_garbage', '--batch-size', '2', *args, stdout=stdout)
+    return dict(line.split('=') for line in stdout.getvalue().split())
+
+  def assertMediaExists(self, names, exists=True):
+    for name in names:
+      with self.subTest(name=name):
+        self.assertEqual(os.path.exists(os.path.join(self.media_root, name)), exists)
+
+  def test_collect_unreferenced_media(self):
+    """
+    Test attempt to remove media files which aren't referenced by any file.
+    """
+    file = File.objects.get(id=1)
+    upload_session = UploadSession.objects.create(user=file.user, filename='video.mp4', size=100)
+    referenced = [
+      self.create_media(file.file.name),
+      self.create_media('renditions/128/{}.webp'.format(file.file.name)),
+      self.create_media('uploads/{}.part'.format(upload_session.id)),
+      # recent file may belong to upload which isn't committed yet
+      self.create_media('recent.jpg', age=0),
+    ]
+    unreferenced = [
+      self.create_media('orphan.jpg'),
+      self.create_media('renditions/128/orphan.jpg.webp'),
+      self.create_media('uploads/00000000-0000-0000-0000-000000000000.part'),
+      self.create_media('uploads/not-an-upload.part'),
+      self.create_media(get_blob_name(hashlib.sha256(b'orphan').hexdigest(), '.jpg')),
+    ]
+    # test assertions
+    self.assertEqual(self.collect_garbage('--dry-run')['media_files'], str(len(unreferenced)))
+    self.assertMediaExists(unreferenced)
+    self.assertEqual(self.collect_garbage()['media_files'], str(len(unreferenced)))
+    self.assertMediaExists(referenced)
+    self.assertMediaExists(unreferenced, exists=False)
+
+  def test_collect_stale_upload_sessions(self):
+    """
+    Test attempt to remove upload sessions which weren't finished in time.
+    """
+    user = User.objects.get(username='azalia')
+    stale_session = UploadSession.objects.create(user=user, filename='video.mp4', size=100)
+    UploadSession.objects.filter(id=stale_session.id).update(created_date=timezone.now() - datetime.timedelta(days=30))
+    session = UploadSession.objects.create(user=user, filename='video.mp4', size=100)
+    stale_partial_upload = self.create_media('uploads/{}.part'.format(stale_session.id))
+    # test assertions
+    self.assertEqual(self.collect_garbage()['upload_sessions'], '1')
+    self.assertFalse(UploadSession.objects.filter(id=stale_session.id).exists())
+    self.assertTrue(UploadSession.objects.filter(id=session.id).exists())
+    self.assertMediaExists([stale_partial_upload], exists=False)
+
+  def test_collect_orphan_blobs(self):
+    """
+    Test attempt to remove blobs which aren't referenced by any file.
+    """
+    digest = hashlib.sha256(b'orphan').hexdigest()
+    blob = Blob.objects.create(digest=digest, name=self.create_media(get_blob_name(digest, '.jpg'), age=0), reference_count=1)
+    # test assertions
+    self.assertEqual(self.collect_garbage()['blobs'], '1')
+    self.assertFalse(Blob.objects.filter(id=blob.id).exists())
+    self.assertMediaExists([blob.name], exists=False)
+
+  def test_collect_file_list_changes(self):
+    """
+    Test attempt to remove changes of all files list which cached feed doesn't apply anymore.
+    """
+    for _ in range(3):
+      versions.list_changed(updated=[1])
+    changes = list(FileListChange.objects.order_by('id'))
+    for change in changes:
+      versions.global_files_changed(change.id)
+    # change which bump was lost
+    lost = FileListChange.objects.create(updated=[1])
+    FileListChange.objects.filter(id=lost.id).update(created_date=timezone.now() - datetime.timedelta(hours=1))
+    # test assertions
+    with override_settings(FEED_CACHE=dict(settings.FEED_CACHE, MAX_CHANGES=2)):
+      self.assertEqual(self.collect_garbage('--dry-run')['file_list_changes'], '2')
+      self.assertEqual(self.collect_garbage()['file_list_changes'], '2')
+    self.assertEqual(list(FileListChange.objects.order_by('id')), changes[1:])
@@ -0,0 +1,94 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from unittest import mock
+import datetime
+from uniphoto import licensing
+
+
+class TrialLicenseTests(APITestCase):
+
+  def setUp(self):
+    # entitlements are cached in process and outlive test data which is rolled back after each test
+    licensing.local_entitlement_cache.clear()
+    self.addCleanup(licensing.local_entitlement_cache.clear)
+    # test users, paulina is staff
+    self.admin = User.objects.get(username='paulina')
+    self.user = User.objects.get(username='azalia')
+
+  def test_license_ends_at_day_boundary(self):
+    """
+    Test attempt to count days of trial license by calendar days.
+    """
+    self.user.date_joined = datetime.datetime(2021, 3, 1, 23, 30)
+    now = datetime.datetime(2021, 3, 2, 0, 30)
+    with mock.patch('django.utils.timezone.now', return_value=now):
+      entitlement = licensing.get_entitlement(self.user)
+    # test assertions
+    self.assertEqual(licensing.get_days_to_license_end(entitlement), 29)
+    self.assertEqual(licensing.get_days_to_license_end(entitlement, 1), 0)
+    self.assertEqual(licensing.get_cache_timeout(now), 23 * 3600 + 1800)
+
+  def test_entitlement_is_cached_until_next_day(self):
+    """
+    Test attempt to get cached entitlement on the same day and a new one on the next day.
+    """
+    self.client.force_authenticate(user=self.user)
+    self.user.date_joined = datetime.datetime.now()
+    self.user.save()
+    # test assertions
+    with self.assertNumQueries(0):
+      self.assertEqual(self.client.get('/trial-license-check').data['days_to_license_end'], 30)
+    # cached entitlement is used even though date_joined of loaded user changes
+    self.user.date_joined -= datetime.timedelta(days=3)
+    self.assertEqual(self.client.get('/trial-license-check').data['days_to_license_end'], 30)
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+      self.assertEqual(self.client.get('/trial-license-check').data['days_to_license_end'], 26)
+
+  def test_changed_date_joined_invalidates_entitlement(self):
+    """
+    Test attempt to check trial license after date_joined of user is changed.
+    """
+    self.client.force_authenticate(user=self.user)
+    self.user.date_joined = datetime.datetime.now()
+    self.user.save()
+    self.client.get('/trial-license-check')
+    self.user.date_joined -= datetime.timedelta(days=10)
+    self.user.save()
+    # test assertions
+    self.assertEqual(self.client.get('/trial-license-check').data['days_to_license_end'], 20)
+
+  def test_check_trial_licenses_of_many_users(self):
+    """
+    Test attempt to check trial licenses of many users in one request.
+    """
+    self.client.force_authenticate(user=self.admin)
+    User.objects.filter(id=self.user.id).update(date_joined=datetime.datetime.now())
+    ids = [self.user.id, self.admin.id, 999999]
+    # test assertions
+    with self.assertNumQueries(1):
+      response = self.client.post('/trial-license-checks', {'ids': ids, 'license_duration': 15}, format='json')
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.data['results'], [
+      {'id': self.user.id, 'status': 'found', 'days_to_license_end': 15},
+      {'id': self.admin.id, 'status': 'found', 'days_to_license_end': 0},
+      {'id': 999999, 'status': 'not_found', 'days_to_license_end': None},
+    ])
+    # entitlements of found users are cached, missing ones are looked up again
+    with self.assertNumQueries(1):
+      self.client.post('/trial-license-checks', {'ids': ids}, format='json')
+    with self.assertNumQueries(0):
+      self.client.post('/trial-license-checks', {'ids': ids[:2]}, format='json')
+
+  def test_check_trial_licenses_by_regular_user(self):
+    """
+    Test attempt to check trial licenses of many users by regular user and without ids.
+    """
+    self.client.force_authenticate(user=self.user)
+    # test assertions
+    self.assertEqual(self.client.post('/trial-license-checks', {'ids': [1]}, format='json').status_code,
+                     status.HTTP_403_FORBIDDEN)
+    self.client.force_authenticate(user=self.admin)
+    self.assertEqual(self.client.post('/trial-license-checks', {'ids': []}, format='json').status_code,
+                     status.HTTP_400_BAD_REQUEST)
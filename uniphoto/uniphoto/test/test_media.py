@@ -0,0 +1,160 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework.exceptions import ErrorDetail
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils.http import http_date
+import hashlib
+import os
+from uniphoto.models import File
+
+
+class MediaFileViewTests(APITestCase):
+
+  def setUp(self):
+    # test file
+    self.file = File.objects.get(id=1)
+    self.url = settings.MEDIA_URL + self.file.file.name
+    self.content = open(self.file.file.path, 'rb').read()
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=User.objects.get(username='azalia'))
+
+  def test_get_media_file(self):
+    """
+    Test attempt to get whole media file.
+    """
+    response = self.client.get(self.url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(b''.join(response.streaming_content), self.content)
+    self.assertEqual(response['Content-Type'], 'image/jpeg')
+    self.assertEqual(response['Accept-Ranges'], 'bytes')
+    self.assertTrue(response['ETag'].startswith('"'))
+    self.assertEqual(response['Last-Modified'], http_date(os.stat(self.file.file.path).st_mtime))
+
+  def test_get_media_file_of_another_user(self):
+    """
+    Test attempt to get media file of another user which is listed in all files list.
+    """
+    # test file belongs to paulina
+    self.assertNotEqual(self.file.user.username, 'azalia')
+    all_files = self.client.get('/all-files?pagination=cursor&page_size=1000').data['results']
+    file_url = next(file['file'] for file in all_files if file['id'] == self.file.id)
+    response = self.client.get(file_url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(b''.join(response.streaming_content), self.content)
+
+  def test_get_media_file_without_token_header(self):
+    """
+    Test attempt to get media file without token header.
+    """
+    self.client.force_authenticate(user=None)
+    response = self.client.get(self.url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.data, {'detail': ErrorDetail(string='Authentication credentials were not provided.', code='not_authenticated')})
+
+  def test_get_media_file_with_conditional_headers(self):
+    """
+    Test attempt to get media file which client already has.
+    """
+    response = self.client.get(self.url)
+    etag = response['ETag']
+    last_modified = response['Last-Modified']
+    # test assertions
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    self.assertEqual(response['ETag'], etag)
+    response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"outdated"')
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+  def test_get_media_file_range(self):
+    """
+    Test attempt to get byte ranges of media file.
+    """
+    size = len(self.content)
+    ranges = {
+      'bytes=10-19': (10, 19),
+      'bytes=100-': (100, size - 1),
+      'bytes=-50': (size - 50, size - 1),
+      'bytes=0-{}'.format(size * 2): (0, size - 1),
+    }
+    for range_header, (start, end) in ranges.items():
+      with self.subTest(range=range_header):
+        response = self.client.get(self.url, HTTP_RANGE=range_header)
+        # test assertions
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+        self.assertEqual(response['Content-Range'], 'bytes {}-{}/{}'.format(start, end, size))
+        self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+  def test_get_media_file_with_unsatisfiable_range(self):
+    """
+    Test attempt to get byte range beyond end of media file.
+    """
+    size = len(self.content)
+    response = self.client.get(self.url, HTTP_RANGE='bytes={}-'.format(size))
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+    self.assertEqual(response['Content-Range'], 'bytes */{}'.format(size))
+
+  def test_get_media_file_range_with_outdated_if_range(self):
+    """
+    Test attempt to get byte range of media file which was changed since client got its beginning.
+    """
+    response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"outdated"')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(b''.join(response.streaming_content), self.content)
+
+  def test_get_media_file_which_is_not_referenced(self):
+    """
+    Test attempt to get files from media which aren't files of users.
+    """
+    # test assertions
+    for name in ['orphan.jpg', 'uploads/00000000-0000-0000-0000-000000000000.part', '../manage.py']:
+      with self.subTest(name=name):
+        response = self.client.get(settings.MEDIA_URL + name)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+  @override_settings(MEDIA_OFFLOAD='x-accel-redirect')
+  def test_get_media_file_with_x_accel_redirect(self):
+    """
+    Test attempt to get media file which bytes are sent by front proxy.
+    """
+    response = self.client.get(self.url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response['X-Accel-Redirect'], settings.MEDIA_OFFLOAD_PREFIX + self.file.file.name)
+    self.assertEqual(response.content, b'')
+    self.assertTrue('ETag' in response)
+
+  @override_settings(MEDIA_OFFLOAD='x-sendfile')
+  def test_get_media_file_with_x_sendfile(self):
+    """
+    Test attempt to get media file which bytes are sent by front proxy.
+    """
+    response = self.client.get(self.url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response['X-Sendfile'], self.file.file.path)
+
+  def test_get_blob(self):
+    """
+    Test attempt to get content addressed file which digest is its ETag.
+    """
+    # test file
+    test_file = SimpleUploadedFile('blob.jpg', self.content, content_type='multipart/form-data')
+    response = self.client.post('/post-file', {'file': test_file}, format='multipart')
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    response = self.client.get(settings.MEDIA_URL + file.file.name, HTTP_ACCEPT='image/jpeg')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response['ETag'], '"{}"'.format(hashlib.sha256(self.content).hexdigest()))
+    self.assertTrue('immutable' in response['Cache-Control'])
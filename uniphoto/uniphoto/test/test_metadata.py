@@ -0,0 +1,223 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+import datetime
+import io
+import os
+import struct
+import tempfile
+from uniphoto import deletion, feed, metadata, tasks
+from uniphoto.models import File, FileMetadata
+
+
+def make_jpeg():
+  exif = Image.Exif()
+  exif[metadata.ORIENTATION] = 6
+  exif[metadata.MAKE] = 'Canon'
+  exif[metadata.MODEL] = 'EOS 5D'
+  exif.get_ifd(metadata.EXIF_IFD)[metadata.DATETIME_ORIGINAL] = '2021:03:29 10:11:12'
+  gps_ifd = exif.get_ifd(metadata.GPS_IFD)
+  gps_ifd[metadata.GPS_LATITUDE_REF] = 'N'
+  gps_ifd[metadata.GPS_LATITUDE] = (55.0, 45.0, 36.0)
+  gps_ifd[metadata.GPS_LONGITUDE_REF] = 'W'
+  gps_ifd[metadata.GPS_LONGITUDE] = (37.0, 30.0, 0.0)
+  image = io.BytesIO()
+  Image.new('RGB', (40, 20), 'red').save(image, 'JPEG', exif=exif)
+  return image.getvalue()
+
+def make_box(box_type, content):
+  return struct.pack('>I4s', 8 + len(content), box_type) + content
+
+def make_mp4(mdat_size=1024):
+  # 2021-03-29 10:11:12 UTC in seconds since 1904, 90 seconds in timescale of 1000
+  created = int((datetime.datetime(2021, 3, 29, 10, 11, 12) - datetime.datetime(1904, 1, 1)).total_seconds())
+  mvhd = struct.pack('>I4I', 0, created, created, 1000, 90000) + bytes(80)
+  audio_tkhd = bytes(76) + struct.pack('>II', 0, 0)
+  video_tkhd = bytes(76) + struct.pack('>II', 1920 << 16, 1080 << 16)
+  moov = make_box(b'moov', make_box(b'mvhd', mvhd) + make_box(b'trak', make_box(b'tkhd', audio_tkhd)) +
+                  make_box(b'trak', make_box(b'tkhd', video_tkhd)))
+  # moov after mdat, as cameras write it
+  return make_box(b'ftyp', b'isom\x00\x00\x02\x00') + make_box(b'mdat', bytes(mdat_size)) + moov
+
+
+class CountingFile(io.FileIO):
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.bytes_read = 0
+
+  def read(self, size=-1):
+    data = super().read(size)
+    self.bytes_read += len(data)
+    return data
+
+
+class MetadataExtractionTests(APITestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+
+  def write(self, name, content):
+    path = os.path.join(self.directory.name, name)
+    with open(path, 'wb') as file:
+      file.write(content)
+    return path
+
+  def test_read_jpeg_metadata(self):
+    """
+    Test attempt to read EXIF metadata of jpeg file.
+    """
+    # test assertions
+    self.assertEqual(metadata.read_metadata(self.write('photo.JPG', make_jpeg())), {
+      'captured_date': datetime.datetime(2021, 3, 29, 10, 11, 12),
+      'width': 20,
+      'height': 40,
+      'orientation': 6,
+      'camera_make': 'Canon',
+      'camera_model': 'EOS 5D',
+      'latitude': 55.76,
+      'longitude': -37.5,
+    })
+
+  def test_read_mp4_metadata(self):
+    """
+    Test attempt to read metadata of mp4 file from its moov box without reading media data.
+    """
+    path = self.write('video.mp4', make_mp4(mdat_size=4 * 1024 * 1024))
+    # test assertions
+    with override_settings(TIME_ZONE='UTC'):
+      data = metadata.read_metadata(path)
+    self.assertEqual(data, {'captured_date': datetime.datetime(2021, 3, 29, 10, 11, 12), 'duration': 90.0,
+                            'width': 1920, 'height': 1080})
+    with CountingFile(path) as file:
+      metadata.read_moov(file)
+    self.assertLess(file.bytes_read, 1024)
+
+  def test_read_broken_files(self):
+    """
+    Test attempt to read metadata of files which headers can't be parsed.
+    """
+    # test assertions
+    self.assertEqual(metadata.read_metadata(self.write('broken.jpg', b'not a jpeg')), {})
+    self.assertEqual(metadata.read_metadata(self.write('broken.mp4', make_box(b'moov', b'\x00\x00\x00\x01'))), {})
+    # boxes which were read completely are kept
+    self.assertNotIn('width', metadata.read_metadata(self.write('truncated.mp4', make_mp4()[:-30])))
+
+  def test_read_malformed_boxes(self):
+    """
+    Test attempt to walk boxes which sizes don't match their content.
+    """
+    free = make_box(b'free', b'')
+    # test assertions
+    # 64-bit size which header is truncated, size smaller than header, size beyond content and 64-bit size smaller than header
+    for data in [b'\x00\x00\x00\x01trak', b'\x00\x00\x00\x04trak', struct.pack('>I4s', 100, b'trak') + b'content',
+                 b'\x00\x00\x00\x01trak' + struct.pack('>Q', 8)]:
+      with self.subTest(data=data):
+        self.assertEqual(list(metadata.iter_boxes(free + data)), [(b'free', b'')])
+    # size 0 extends box to the end of content
+    self.assertEqual(list(metadata.iter_boxes(free + b'\x00\x00\x00\x00mdatcontent')), [(b'free', b''), (b'mdat', b'content')])
+    path = self.write('malformed.mp4', make_mp4() + b'\x00\x00\x00\x01mdat')
+    with open(path, 'rb') as file:
+      self.assertIsNotNone(metadata.read_moov(file))
+    path = self.write('malformed.mp4', make_box(b'ftyp', b'isom') + b'\x00\x00\x00\x01mdat')
+    with open(path, 'rb') as file:
+      self.assertIsNone(metadata.read_moov(file))
+    self.assertEqual(metadata.read_metadata(self.write('malformed.mp4', make_box(b'moov', b'\x00\x00\x00\x02trak'))), {})
+
+  def test_process_file_extracts_metadata(self):
+    """
+    Test attempt to create file which metadata is extracted by worker and exposed in files list.
+    """
+    feed.get_cache().clear()
+    user = User.objects.get(username='azalia')
+    self.client.force_authenticate(user=user)
+    response = self.client.post('/post-file', {'file': SimpleUploadedFile('exif.jpg', make_jpeg())}, format='multipart')
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    # test assertions
+    self.assertIsNone(response.data['metadata'])
+    while tasks.run_next_task():
+      pass
+    self.assertEqual(FileMetadata.objects.get(file=file).user, user)
+    item = self.client.get('/user-files').json()['results'][0]
+    self.assertEqual(item['id'], file.id)
+    self.assertEqual(item['metadata']['captured_date'], '2021-03-29T10:11:12')
+    self.assertEqual(item['metadata']['camera_model'], 'EOS 5D')
+    with override_settings(FAST_FILE_LISTS=False):
+      self.assertEqual(self.client.get('/user-files').json()['results'][0], item)
+    deletion.delete_files(File.objects.filter(id=file.id))
+    self.assertFalse(FileMetadata.objects.filter(file_id=file.id).exists())
+
+
+class CapturedDateListTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+    # files of azalia captured on different days out of id order, and one earlier file of paulina
+    self.captured_ids = []
+    for file in File.objects.filter(user=self.user).order_by('id')[:5]:
+      FileMetadata.objects.create(file=file, user=self.user, captured_date=datetime.datetime(2021, 3, 10 - file.id % 5, 12))
+      self.captured_ids.append(file.id)
+    self.captured_ids.sort(key=lambda file_id: datetime.datetime(2021, 3, 10 - file_id % 5, 12))
+    paulina_file = File.objects.filter(user__username='paulina').first()
+    FileMetadata.objects.create(file=paulina_file, user=paulina_file.user, captured_date=datetime.datetime(2021, 3, 1))
+    self.paulina_file_id = paulina_file.id
+
+  def get_ids(self, url):
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    return [item['id'] for item in response.json()['results']]
+
+  def test_order_by_captured_date(self):
+    """
+    Test attempt to get files ordered by capture date.
+    """
+    # test assertions
+    self.assertEqual(self.get_ids('/user-files?ordering=captured_date'), self.captured_ids)
+    self.assertEqual(self.get_ids('/user-files?ordering=-captured_date'), self.captured_ids[::-1])
+    self.assertEqual(self.get_ids('/all-files?ordering=captured_date'), [self.paulina_file_id] + self.captured_ids)
+    with override_settings(FAST_FILE_LISTS=False):
+      self.assertEqual(self.get_ids('/user-files?ordering=-captured_date'), self.captured_ids[::-1])
+
+  def test_filter_by_captured_date(self):
+    """
+    Test attempt to get files captured in date range.
+    """
+    captured_dates = {file_id: date for file_id, date in
+                      FileMetadata.objects.filter(user=self.user).values_list('file_id', 'captured_date')}
+    expected_ids = [file_id for file_id in self.captured_ids[::-1] if datetime.datetime(2021, 3, 7) <= captured_dates[file_id] < datetime.datetime(2021, 3, 9)]
+    # test assertions
+    self.assertEqual(self.get_ids('/user-files?captured_after=2021-03-07&captured_before=2021-03-09T00:00:00&ordering=-captured_date'),
+                     expected_ids)
+    self.assertEqual(sorted(self.get_ids('/user-files?captured_after=2021-03-07&captured_before=2021-03-09')), sorted(expected_ids))
+    self.assertEqual(self.get_ids('/all-files?captured_before=2021-03-02'), [self.paulina_file_id])
+
+  def test_cursor_pagination_by_captured_date(self):
+    """
+    Test attempt to page files ordered by capture date with cursor pagination.
+    """
+    ids = []
+    url = '/user-files?ordering=-captured_date&pagination=cursor&page_size=2&fields=id'
+    while url:
+      response = self.client.get(url)
+      self.assertEqual(response.status_code, status.HTTP_200_OK)
+      ids += [item['id'] for item in response.data['results']]
+      url = response.data['next']
+    # test assertions
+    self.assertEqual(ids, self.captured_ids[::-1])
+
+  def test_invalid_ordering_and_dates(self):
+    """
+    Test attempt to get files with unknown ordering and invalid dates.
+    """
+    # test assertions
+    for url in ['/user-files?ordering=file', '/user-files?captured_after=yesterday', '/all-files?captured_before=2021-13-01']:
+      with self.subTest(url=url):
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
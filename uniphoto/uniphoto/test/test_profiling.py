@@ -0,0 +1,104 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+import time
+from uniphoto import profiling
+from uniphoto.test.utils import FeedCacheMixin
+
+
+def get_samples(text):
+  # {'name{labels}': value} of exposition lines
+  return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if not line.startswith('#')}
+
+
+class ProfilingMiddlewareTests(FeedCacheMixin, APITestCase):
+
+  def setUp(self):
+    super().setUp()
+    profiling.reset()
+    self.addCleanup(profiling.reset)
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  @override_settings(PROFILING={'SAMPLE_RATE': 1})
+  def test_sampled_requests_are_recorded_per_view(self):
+    """
+    Test attempt to record queries and times of every request per view.
+    """
+    with CaptureQueriesContext(connection) as queries:
+      self.assertEqual(self.client.get('/user-files').status_code, status.HTTP_200_OK)
+    # captured queries are read from log of connection, which is cleared by the next request
+    query_count = len(queries)
+    self.client.get('/user-files?page=2')
+    self.client.get('/all-files?media_type=video')
+    samples = get_samples(profiling.render_metrics())
+    labels = 'view="UserFilesList",method="GET"'
+    # test assertions
+    self.assertEqual(samples['uniphoto_request_duration_seconds_count{{{}}}'.format(labels)], 2)
+    self.assertEqual(samples['uniphoto_request_duration_seconds_bucket{{{},le="+Inf"}}'.format(labels)], 2)
+    self.assertEqual(samples['uniphoto_request_db_queries_sum{{{}}}'.format(labels)], 2 * query_count)
+    self.assertGreater(samples['uniphoto_request_db_duration_seconds_sum{{{}}}'.format(labels)], 0)
+    self.assertGreater(samples['uniphoto_request_serialization_duration_seconds_sum{{{}}}'.format(labels)], 0)
+    self.assertGreater(samples['uniphoto_request_render_duration_seconds_sum{{{}}}'.format(labels)], 0)
+    self.assertLessEqual(samples['uniphoto_request_db_duration_seconds_sum{{{}}}'.format(labels)],
+                         samples['uniphoto_request_duration_seconds_sum{{{}}}'.format(labels)])
+    self.assertEqual(samples['uniphoto_request_db_queries_count{view="AllFilesList",method="GET"}'], 1)
+
+  @override_settings(PROFILING={'SAMPLE_RATE': 1}, FAST_FILE_LISTS=False)
+  def test_serializer_time_is_recorded(self):
+    """
+    Test attempt to record time of serializers apart from time of rendering.
+    """
+    with mock.patch('uniphoto.serializers.UserFilesSerializer.to_representation', side_effect=lambda file: time.sleep(0.01) or {}):
+      self.client.get('/user-files?fields=id')
+    samples = get_samples(profiling.render_metrics())
+    labels = 'view="UserFilesList",method="GET"'
+    # test assertions
+    self.assertGreaterEqual(samples['uniphoto_request_serialization_duration_seconds_sum{{{}}}'.format(labels)], 0.01 * 10)
+    self.assertLess(samples['uniphoto_request_render_duration_seconds_sum{{{}}}'.format(labels)], 0.01 * 10)
+
+  @override_settings(PROFILING={'SAMPLE_RATE': 0})
+  def test_disabled_profiling(self):
+    """
+    Test attempt to get files with profiling disabled.
+    """
+    self.client.get('/user-files')
+    # test assertions
+    self.assertEqual(get_samples(profiling.render_metrics()), {})
+
+  def test_histogram_buckets_are_cumulative(self):
+    """
+    Test attempt to render histogram which buckets count values up to their bound.
+    """
+    profile = profiling.Profile()
+    for queries in [0, 3, 3, 500]:
+      profile.queries = queries
+      profiling.record('UserFilesList', 'GET', profile)
+    samples = get_samples(profiling.render_metrics())
+    labels = 'view="UserFilesList",method="GET"'
+    # test assertions
+    self.assertEqual(samples['uniphoto_request_db_queries_bucket{{{},le="0"}}'.format(labels)], 1)
+    self.assertEqual(samples['uniphoto_request_db_queries_bucket{{{},le="2"}}'.format(labels)], 1)
+    self.assertEqual(samples['uniphoto_request_db_queries_bucket{{{},le="5"}}'.format(labels)], 3)
+    self.assertEqual(samples['uniphoto_request_db_queries_bucket{{{},le="100"}}'.format(labels)], 3)
+    self.assertEqual(samples['uniphoto_request_db_queries_bucket{{{},le="+Inf"}}'.format(labels)], 4)
+    self.assertEqual(samples['uniphoto_request_db_queries_sum{{{}}}'.format(labels)], 506)
+
+  def test_metrics_endpoint_is_admin_only(self):
+    """
+    Test attempt to scrape metrics by regular and staff user.
+    """
+    # test assertions
+    self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+    self.user.is_staff = True
+    self.user.save()
+    response = self.client.get('/metrics')
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+    self.assertIn('# TYPE uniphoto_request_duration_seconds histogram', response.content.decode())
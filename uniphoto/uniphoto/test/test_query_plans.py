@@ -0,0 +1,237 @@
+from rest_framework.test import APIRequestFactory
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import datetime
+import itertools
+from uniphoto import changes
+from uniphoto.models import FileChange
+from uniphoto.views import UserFilesList, AllFilesList
+
+
+NUMBER_SEEDED_USERS = 200
+NUMBER_SEEDED_USERS_WITHOUT_FILES = 20000
+NUMBER_SEEDED_FILES = 200000
+DEEP_PAGE_OFFSET = 500
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+
+def get_view(view_class, user, url='/'):
+  view = view_class()
+  view.request = view.initialize_request(APIRequestFactory().get(url))
+  view.request.user = user
+  view.format_kwarg = None
+  return view
+
+def get_view_queryset(view_class, user, url='/'):
+  return get_view(view_class, user, url).get_queryset()
+
+def get_filtered_queryset(view_class, user, url):
+  view = get_view(view_class, user, url)
+  return view.filter_queryset(view.get_queryset())
+
+def get_paginated_querysets(queryset, deep_page_offset=DEEP_PAGE_OFFSET):
+  # querysets in the same shape that page number and cursor paginators execute them
+  position = queryset.order_by('-id').values_list('id', flat=True)[deep_page_offset]
+  return {
+    'first page': queryset[:PAGE_SIZE],
+    'deep page': queryset[deep_page_offset:deep_page_offset + PAGE_SIZE],
+    'cursor page': queryset.order_by('-id').filter(id__lt=position)[:PAGE_SIZE + 1],
+  }
+
+def get_plan_nodes(plan):
+  yield plan
+  for subplan in plan.get('Plans', []):
+    yield from get_plan_nodes(subplan)
+
+def explain(queryset):
+  return explain_sql(*queryset.query.sql_with_params())
+
+def explain_sql(sql, params=None):
+  with connection.cursor() as cursor:
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    return cursor.fetchone()[0][0]['Plan']
+
+
+class QueryPlanTestCase(TestCase):
+  """
+  Seeds uniphoto_file with a large number of rows so that planner prefers indexes
+  whenever they can serve the query.
+  """
+
+  @classmethod
+  def setUpTestData(cls):
+    users = User.objects.bulk_create(User(username='plan_user_{}'.format(n)) for n in range(NUMBER_SEEDED_USERS))
+    user_ids = [user.id for user in users]
+    with connection.cursor() as cursor:
+      # most users of real table have few files, so that table is large enough for username index to be used
+      cursor.execute("""
+                     INSERT INTO auth_user(username, password, is_superuser, is_staff, is_active, first_name, last_name, email, date_joined)
+                     SELECT 'plan_idle_user_' || n, '', false, false, true, '', '', '', now()
+                     FROM generate_series(1, %s) AS n;
+                     """, [NUMBER_SEEDED_USERS_WITHOUT_FILES])
+      cursor.execute("""
+                     INSERT INTO uniphoto_file(file, user_id, post_date, processing_status, media_type)
+                     SELECT 'plan_' || n || CASE WHEN n %% 7 = 0 THEN '.mp4' ELSE '.jpg' END, (%s::int[])[n %% %s + 1],
+                            timestamp '2021-03-01' + n * interval '1 minute', 'done', CASE WHEN n %% 7 = 0 THEN 'video' ELSE 'photo' END
+                     FROM generate_series(1, %s) AS n;
+                     """, [user_ids, len(user_ids), NUMBER_SEEDED_FILES])
+      cursor.execute("""
+                     INSERT INTO uniphoto_filechange(user_id, version, file_id, kind, created_date)
+                     SELECT user_id, row_number() OVER (PARTITION BY user_id ORDER BY id), id, 'created', now()
+                     FROM uniphoto_file;
+                     """)
+      cursor.execute("""
+                     INSERT INTO uniphoto_changecounter(user_id, version, pruned_version, revision)
+                     SELECT id, 0, 0, 0 FROM auth_user;
+                     """)
+      # every tenth file has no capture date
+      cursor.execute("""
+                     INSERT INTO uniphoto_filemetadata(file_id, user_id, captured_date, camera_make, camera_model)
+                     SELECT id, user_id, CASE WHEN id % 10 = 0 THEN NULL ELSE timestamp '2021-03-01' + id * interval '1 minute' END, '', ''
+                     FROM uniphoto_file;
+                     """)
+      cursor.execute('ANALYZE uniphoto_file;')
+      cursor.execute('ANALYZE uniphoto_filechange;')
+      cursor.execute('ANALYZE uniphoto_changecounter;')
+      cursor.execute('ANALYZE uniphoto_filemetadata;')
+      cursor.execute('ANALYZE auth_user;')
+    cls.test_user = User.objects.get(username='plan_user_0')
+
+  def assertIndexedPlan(self, queryset, table='uniphoto_file'):
+    """
+    Assert that query plan has neither sequential scan over table, nor scan that filters
+    table rows out of index, nor sort node.
+    """
+    plan = explain(queryset)
+    for node in get_plan_nodes(plan):
+      if node.get('Relation Name') == table:
+        self.assertNotEqual(node['Node Type'], 'Seq Scan', 'Sequential scan on {} in plan:\n{}'.format(table, plan))
+        self.assertFalse('Filter' in node, 'Filtered scan on {} in plan:\n{}'.format(table, plan))
+      self.assertNotEqual(node['Node Type'], 'Sort', 'Sort node in plan:\n{}'.format(plan))
+
+  def assertNoSequentialScan(self, queryset):
+    self.assertNoSequentialScanPlan(explain(queryset))
+
+  def assertNoSequentialScanPlan(self, plan):
+    for node in get_plan_nodes(plan):
+      self.assertNotEqual(node['Node Type'], 'Seq Scan', 'Sequential scan in plan:\n{}'.format(plan))
+
+  def assertNoSequentialScanQueries(self, function, *args):
+    """
+    Assert that none of queries executed by function reads any table sequentially.
+    """
+    with CaptureQueriesContext(connection) as queries:
+      function(*args)
+    self.assertTrue(queries.captured_queries)
+    for query in queries.captured_queries:
+      if query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT')):
+        continue
+      with self.subTest(sql=query['sql']):
+        self.assertNoSequentialScanPlan(explain_sql(query['sql']))
+
+
+class ListViewsQueryPlanTests(QueryPlanTestCase):
+
+  def test_user_files_list_query_plans(self):
+    """
+    Test that all pages of user files list are served by index.
+    """
+    queryset = get_view_queryset(UserFilesList, self.test_user)
+    for name, paginated_queryset in get_paginated_querysets(queryset).items():
+      with self.subTest(page=name):
+        self.assertIndexedPlan(paginated_queryset)
+
+  def test_all_files_list_query_plans(self):
+    """
+    Test that all pages of all files list are served by index.
+    """
+    queryset = get_view_queryset(AllFilesList, self.test_user)
+    for name, paginated_queryset in get_paginated_querysets(queryset).items():
+      with self.subTest(page=name):
+        self.assertIndexedPlan(paginated_queryset)
+
+
+class CapturedDateQueryPlanTests(QueryPlanTestCase):
+
+  def test_captured_date_list_query_plans(self):
+    """
+    Test that files lists ordered and filtered by capture date are served by metadata indexes.
+    """
+    urls = ['/?ordering=-captured_date', '/?ordering=captured_date', '/?captured_after=2021-05-01',
+            '/?captured_after=2021-04-01&captured_before=2021-05-01&ordering=captured_date']
+    # test assertions
+    for view_class in [UserFilesList, AllFilesList]:
+      for url in urls:
+        with self.subTest(view=view_class.__name__, url=url):
+          queryset = get_filtered_queryset(view_class, self.test_user, url)
+          self.assertIndexedPlan(queryset[:PAGE_SIZE], table='uniphoto_filemetadata')
+
+
+class FilterQueryPlanTests(QueryPlanTestCase):
+
+  def assertFilteredPlans(self, view_class, filters):
+    for count in range(len(filters) + 1):
+      for combination in itertools.combinations(filters, count):
+        url = '/?' + '&'.join(combination)
+        queryset = get_filtered_queryset(view_class, self.test_user, url)
+        deep_page_offset = min(DEEP_PAGE_OFFSET, queryset.count() // 2)
+        for name, paginated_queryset in get_paginated_querysets(queryset, deep_page_offset).items():
+          with self.subTest(url=url, page=name):
+            self.assertNoSequentialScan(paginated_queryset)
+
+  def test_user_files_list_filter_query_plans(self):
+    """
+    Test that all pages of user files list are served by index for every combination of filters.
+    """
+    # test assertions
+    self.assertFilteredPlans(UserFilesList, ['posted_after=2021-04-01&posted_before=2021-05-01', 'media_type=video'])
+
+  def test_all_files_list_filter_query_plans(self):
+    """
+    Test that all pages of all files list are served by index for every combination of filters.
+    """
+    # test assertions
+    self.assertFilteredPlans(AllFilesList, ['posted_after=2021-04-01&posted_before=2021-04-15', 'media_type=video',
+                                            'username=plan_user_1'])
+
+
+class SyncQueryPlanTests(QueryPlanTestCase):
+
+  def test_sync_changes_query_plan(self):
+    """
+    Test that changes after cursor are served by range scan of index.
+    """
+    # test assertions
+    for cursor in [0, NUMBER_SEEDED_FILES // NUMBER_SEEDED_USERS // 2]:
+      with self.subTest(cursor=cursor):
+        queryset = changes.get_changes_queryset(self.test_user.id, cursor)[:settings.SYNC_MAX_CHANGES + 1]
+        self.assertIndexedPlan(queryset, table='uniphoto_filechange')
+
+  def test_expired_changes_query_plan(self):
+    """
+    Test that expired changes are found without reading the whole change log.
+    """
+    created_before = timezone.now() - datetime.timedelta(seconds=settings.FILE_CHANGES_RETENTION_SECONDS)
+    # test assertions
+    self.assertNoSequentialScan(changes.get_expired_versions(created_before))
+
+  def test_prune_changes_query_plans(self):
+    """
+    Test that none of queries of pruning reads the whole change log or counters.
+    """
+    FileChange.objects.filter(user=self.test_user, version__lte=10).update(created_date='2000-01-01T00:00:00Z')
+    # test assertions
+    for dry_run in [True, False]:
+      with self.subTest(dry_run=dry_run):
+        self.assertNoSequentialScanQueries(changes.prune_changes, settings.FILE_CHANGES_RETENTION_SECONDS, dry_run)
+
+  def test_remove_changes_of_user_query_plans(self):
+    """
+    Test that change log of deleted user is removed without reading the whole change log or counters.
+    """
+    # test assertions
+    self.assertNoSequentialScanQueries(changes.remove_changes, self.test_user.id)
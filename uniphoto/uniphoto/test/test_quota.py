@@ -0,0 +1,188 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from unittest import mock
+import hashlib
+import io
+import os
+import tempfile
+from uniphoto import quota, tasks
+from uniphoto.models import Blob, File, StorageUsage, Task
+
+
+class StorageQuotaTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def make_image(self, filename, color):
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(image, 'JPEG')
+    return SimpleUploadedFile(filename, image.getvalue(), content_type='multipart/form-data')
+
+  def post_file(self, test_file):
+    response = self.client.post('/post-file', {'file': test_file}, format='multipart')
+    if response.status_code == status.HTTP_201_CREATED:
+      self.addCleanup(os.remove, File.objects.get(id=response.data['id']).file.path)
+    return response
+
+  def test_post_and_delete_file(self):
+    """
+    Test attempt to create and delete file which size is added to and subtracted from storage usage.
+    """
+    test_file = self.make_image('red.jpg', 'red')
+    response = self.post_file(test_file)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(File.objects.get(id=response.data['id']).size, test_file.size)
+    self.assertEqual(self.client.get('/storage-usage').data, {'used_bytes': test_file.size, 'quota_bytes': 10 * 1024 ** 3})
+    response = self.client.delete('/delete-file/{}'.format(response.data['id']))
+    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+    self.assertEqual(quota.get_usage(self.user.id), 0)
+
+  def test_post_files(self):
+    """
+    Test attempt to create many files which sizes are added to storage usage.
+    """
+    test_files = [self.make_image('red.jpg', 'red'), self.make_image('green.jpg', 'green')]
+    response = self.client.post('/post-files', {'files': test_files}, format='multipart')
+    for result in response.data['results']:
+      self.addCleanup(os.remove, File.objects.get(id=result['file']['id']).file.path)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(quota.get_usage(self.user.id), sum(test_file.size for test_file in test_files))
+    file_ids = [result['file']['id'] for result in response.data['results']]
+    self.client.post('/delete-files', {'ids': file_ids}, format='json')
+    self.assertEqual(quota.get_usage(self.user.id), 0)
+
+  def post_files_over_quota(self):
+    # the first two files fit into quota, the third one doesn't
+    test_files = [self.make_image('red.jpg', 'red'), self.make_image('green.jpg', 'green'), self.make_image('blue.jpg', 'blue')]
+    with override_settings(STORAGE_QUOTA_BYTES=test_files[0].size + test_files[1].size + test_files[2].size - 1):
+      response = self.client.post('/post-files', {'files': test_files}, format='multipart')
+    for result in response.data['results']:
+      if result['status'] == 'created':
+        self.addCleanup(os.remove, File.objects.get(id=result['file']['id']).file.path)
+    return test_files, response
+
+  def test_post_files_over_quota(self):
+    """
+    Test attempt to create many files which don't fit into storage quota together.
+    """
+    file_counts = File.objects.all().count()
+    test_files, response = self.post_files_over_quota()
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+    self.assertEqual([result['status'] for result in response.data['results']], ['created', 'created', 'quota_exceeded'])
+    self.assertEqual(response.data['results'][2], {'name': 'blue.jpg', 'status': 'quota_exceeded', 'errors': {'detail': 'Storage quota exceeded.'}})
+    self.assertEqual(File.objects.all().count(), file_counts + 2)
+    self.assertEqual(quota.get_usage(self.user.id), test_files[0].size + test_files[1].size)
+    test_files[2].seek(0)
+    self.assertFalse(Blob.objects.filter(digest=hashlib.sha256(test_files[2].read()).hexdigest()).exists())
+
+  def test_post_files_over_quota_used_concurrently(self):
+    """
+    Test attempt to create many files when quota is used by concurrent upload after it was checked.
+    """
+    # all files pass the check before content is stored
+    with mock.patch('uniphoto.quota.get_fitting', side_effect=lambda user_id, sizes: list(range(len(sizes)))):
+      test_files, response = self.post_files_over_quota()
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+    self.assertEqual([result['status'] for result in response.data['results']], ['created', 'created', 'quota_exceeded'])
+    self.assertEqual(quota.get_usage(self.user.id), test_files[0].size + test_files[1].size)
+    # stored content of refused file is released and removed by task
+    test_files[2].seek(0)
+    digest = hashlib.sha256(test_files[2].read()).hexdigest()
+    self.assertFalse(Blob.objects.filter(digest=digest).exists())
+    task = Task.objects.get(name='remove_files')
+    self.assertEqual([blob_digest for blob_digest, _ in task.kwargs['blobs']], [digest])
+    tasks.remove_files(**task.kwargs)
+    self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, task.kwargs['blobs'][0][1])))
+
+  def test_post_file_over_quota(self):
+    """
+    Test attempt to create file which exceeds storage quota.
+    """
+    file_counts = File.objects.all().count()
+    test_file = self.make_image('red.jpg', 'red')
+    with override_settings(STORAGE_QUOTA_BYTES=test_file.size - 1):
+      response = self.post_file(test_file)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    self.assertEqual(response.data, {'detail': 'Storage quota exceeded.'})
+    self.assertEqual(File.objects.all().count(), file_counts)
+    self.assertEqual(quota.get_usage(self.user.id), 0)
+
+  def test_upload_handler_stops_upload_over_quota(self):
+    """
+    Test attempt to stream upload which exceeds storage quota.
+    """
+    handler = quota.QuotaUploadHandler()
+    handler.request = type('Request', (), {'user': self.user})
+    # test assertions
+    with override_settings(STORAGE_QUOTA_BYTES=100):
+      handler.handle_raw_input(None, {}, 1000, b'boundary')
+      self.assertEqual(handler.receive_data_chunk(b'x' * 60, 0), b'x' * 60)
+      with self.assertRaises(quota.QuotaExceeded):
+        handler.receive_data_chunk(b'x' * 60, 60)
+      # files of bulk upload are counted one by one
+      handler.new_file('files', 'green.jpg', 'image/jpeg', None)
+      self.assertEqual(handler.receive_data_chunk(b'x' * 60, 0), b'x' * 60)
+      StorageUsage.objects.create(user=self.user, used_bytes=100)
+      # remaining quota is read once per request
+      handler.request = type('Request', (), {'user': self.user})
+      with self.assertRaises(quota.QuotaExceeded):
+        handler.handle_raw_input(None, {}, 1000, b'boundary')
+
+  def test_add_usage_over_quota(self):
+    """
+    Test attempt to add usage which exceeds storage quota.
+    """
+    # test assertions
+    with override_settings(STORAGE_QUOTA_BYTES=100):
+      quota.add_usage(self.user.id, 60)
+      with self.assertRaises(quota.QuotaExceeded):
+        quota.add_usage(self.user.id, 60)
+      self.assertEqual(quota.get_usage(self.user.id), 60)
+      quota.add_usage(self.user.id, 40)
+      quota.add_usage(self.user.id, 10, enforce=False)
+      self.assertEqual(quota.get_usage(self.user.id), 110)
+      quota.add_usage(self.user.id, -110)
+      self.assertEqual(quota.get_usage(self.user.id), 0)
+
+  def test_start_chunked_upload_over_quota(self):
+    """
+    Test attempt to start chunked upload which declared size exceeds storage quota.
+    """
+    with override_settings(STORAGE_QUOTA_BYTES=1000):
+      response = self.client.post('/upload', {'filename': 'video.mp4', 'size': 1001}, format='json')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+  def test_backfill_file_sizes(self):
+    """
+    Test attempt to backfill sizes of files and storage usage.
+    """
+    media_root = tempfile.TemporaryDirectory()
+    self.addCleanup(media_root.cleanup)
+    for file in File.objects.filter(user=self.user).order_by('id')[:3]:
+      with open(os.path.join(media_root.name, file.file.name), 'wb') as media_file:
+        media_file.write(b'x' * file.id)
+    expected_usage = sum(File.objects.filter(user=self.user).order_by('id').values_list('id', flat=True)[:3])
+    missing = File.objects.all().count() - 3
+    stdout = io.StringIO()
+    with override_settings(MEDIA_ROOT=media_root.name):
+      call_command('backfill_file_sizes', '--batch-size', '2', '--workers', '2', stdout=stdout)
+    # test assertions
+    self.assertEqual(stdout.getvalue().split(), ['files=3', 'missing={}'.format(missing)])
+    self.assertEqual(quota.get_usage(self.user.id), expected_usage)
+    self.assertEqual(File.objects.filter(size__isnull=False).count(), 3)
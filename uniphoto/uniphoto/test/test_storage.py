@@ -0,0 +1,128 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import mock
+import hashlib
+import os
+from uniphoto import tasks
+from uniphoto.models import Blob, File
+
+
+# leading bytes of jpeg and mp4, the rest of content isn't parsed on upload
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+MP4_HEADER = b'\x00\x00\x00\x18ftypisom'
+
+class ContentAddressedStorageTests(APITestCase):
+
+  def post_file(self, user, filename, content):
+    self.client.force_authenticate(user=user)
+    test_file = SimpleUploadedFile(filename, content, content_type='multipart/form-data')
+    response = self.client.post('/post-file', {'file': test_file}, format='multipart')
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    return File.objects.get(id=response.data['id'])
+
+  def delete_file(self, user, file):
+    self.client.force_authenticate(user=user)
+    response = self.client.delete('/delete-file/{}'.format(file.id))
+    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+  def test_same_content_is_stored_once(self):
+    """
+    Test attempt to upload the same content by different users and delete it.
+    """
+    # test users
+    first_user = User.objects.get(username='paulina')
+    second_user = User.objects.get(username='azalia')
+    # test content
+    test_file_path = os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data', 'file_to_test_post_request.jpg')
+    content = open(test_file_path, 'rb').read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    first_file = self.post_file(first_user, 'first.jpg', content)
+    second_file = self.post_file(second_user, 'second.JPG', content)
+
+    # test assertions
+    blob = Blob.objects.get(digest=digest)
+    blob_path = os.path.join(settings.MEDIA_ROOT, blob.name)
+    self.assertEqual(blob.name, 'blobs/{}/{}/{}.jpg'.format(digest[:2], digest[2:4], digest))
+    self.assertEqual(blob.reference_count, 2)
+    self.assertEqual(first_file.blob_id, blob.id)
+    self.assertEqual(second_file.blob_id, blob.id)
+    self.assertEqual(first_file.file.name, blob.name)
+    self.assertEqual(second_file.file.name, blob.name)
+    self.assertEqual(open(blob_path, 'rb').read(), content)
+
+    # assert that blob is kept while it is referenced
+    self.delete_file(first_user, first_file)
+    blob.refresh_from_db()
+    self.assertEqual(blob.reference_count, 1)
+    self.assertTrue(os.path.exists(blob_path))
+
+    # assert that blob is unlinked with its last reference
+    self.delete_file(second_user, second_file)
+    self.assertFalse(Blob.objects.filter(id=blob.id).exists())
+    # content is unlinked by worker after commit
+    self.assertTrue(os.path.exists(blob_path))
+    while tasks.run_next_task():
+      pass
+    self.assertFalse(os.path.exists(blob_path))
+
+  def test_different_content_is_stored_separately(self):
+    """
+    Test attempt to upload files with different content under the same name.
+    """
+    # test user
+    user = User.objects.get(username='azalia')
+    first_file = self.post_file(user, 'same_name.jpg', JPEG_HEADER + b'first content')
+    second_file = self.post_file(user, 'same_name.jpg', JPEG_HEADER + b'second content')
+    self.addCleanup(os.remove, first_file.file.path)
+    self.addCleanup(os.remove, second_file.file.path)
+    # test assertions
+    self.assertNotEqual(first_file.blob_id, second_file.blob_id)
+    self.assertEqual(open(first_file.file.path, 'rb').read(), JPEG_HEADER + b'first content')
+    self.assertEqual(open(second_file.file.path, 'rb').read(), JPEG_HEADER + b'second content')
+    self.assertEqual(first_file.blob.digest, hashlib.sha256(JPEG_HEADER + b'first content').hexdigest())
+
+  def test_large_upload_is_hashed_while_streaming(self):
+    """
+    Test attempt to upload file larger than FILE_UPLOAD_MAX_MEMORY_SIZE which is spooled to disk.
+    """
+    # test user
+    user = User.objects.get(username='azalia')
+    content = MP4_HEADER + os.urandom(settings.FILE_UPLOAD_MAX_MEMORY_SIZE + 1)
+    file = self.post_file(user, 'large.mp4', content)
+    self.addCleanup(os.remove, file.file.path)
+    # test assertions
+    self.assertEqual(file.blob.digest, hashlib.sha256(content).hexdigest())
+    self.assertEqual(open(file.file.path, 'rb').read(), content)
+
+  def test_large_upload_is_hashed_once(self):
+    """
+    Test attempt to upload file larger than FILE_UPLOAD_MAX_MEMORY_SIZE which bytes are hashed only once.
+    """
+    hashed_sizes = []
+    sha256 = hashlib.sha256
+
+    class CountingSha256:
+
+      def __init__(self):
+        self.sha256 = sha256()
+
+      def update(self, data):
+        hashed_sizes.append(len(data))
+        self.sha256.update(data)
+
+      def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    # test user
+    user = User.objects.get(username='azalia')
+    content = MP4_HEADER + os.urandom(settings.FILE_UPLOAD_MAX_MEMORY_SIZE + 1)
+    with mock.patch('uniphoto.storage.hashlib.sha256', CountingSha256):
+      file = self.post_file(user, 'large.mp4', content)
+    self.addCleanup(os.remove, file.file.path)
+    # test assertions
+    self.assertEqual(sum(hashed_sizes), len(content))
+    self.assertEqual(file.blob.digest, hashlib.sha256(content).hexdigest())
@@ -0,0 +1,153 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+import io
+import os
+from uniphoto import changes, deletion
+from uniphoto.models import ChangeCounter, File, FileChange
+
+
+class SyncViewTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def create_file(self, name, user=None):
+    return File.objects.create(user=user or self.user, file=name)
+
+  def sync(self, cursor, **params):
+    return self.client.get('/sync', dict(params, cursor=cursor))
+
+  def test_sync_created_and_deleted_files(self):
+    """
+    Test attempt to get files which were created and deleted after cursor.
+    """
+    cursor = self.client.get('/sync').data['cursor']
+    created_file = self.create_file('sync_created.jpg')
+    deletion.delete_files(File.objects.filter(id=41))
+    response = self.sync(cursor)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.data['cursor'], cursor + 2)
+    self.assertFalse(response.data['has_more'])
+    self.assertEqual(response.data['deleted'], [41])
+    user_files = self.client.get('/user-files').json()['results']
+    self.assertEqual(response.json()['created'], [item for item in user_files if item['id'] == created_file.id])
+    # nothing changed after returned cursor
+    response = self.sync(response.data['cursor'])
+    self.assertEqual(response.data, {'cursor': cursor + 2, 'has_more': False, 'created': [], 'deleted': []})
+
+  def test_sync_files_created_by_bulk_upload(self):
+    """
+    Test attempt to get files which were created by /post-files.
+    """
+    images = []
+    for color in ['red', 'green']:
+      image = io.BytesIO()
+      Image.new('RGB', (32, 32), color).save(image, 'JPEG')
+      images.append(SimpleUploadedFile(color + '.jpg', image.getvalue(), content_type='multipart/form-data'))
+    response = self.client.post('/post-files', {'files': images}, format='multipart')
+    file_ids = [result['file']['id'] for result in response.data['results']]
+    for file in File.objects.filter(id__in=file_ids):
+      self.addCleanup(os.remove, file.file.path)
+    response = self.sync(0)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual([item['id'] for item in response.data['created']], sorted(file_ids, reverse=True))
+    self.assertEqual(response.data['cursor'], 2)
+
+  def test_sync_file_created_and_deleted_after_cursor(self):
+    """
+    Test attempt to sync file which was created and deleted after cursor.
+    """
+    file = self.create_file('sync_short_lived.jpg')
+    self.client.post('/delete-files', {'ids': [file.id]}, format='json')
+    response = self.sync(0)
+    # test assertions
+    self.assertEqual(response.data, {'cursor': 2, 'has_more': False, 'created': [], 'deleted': []})
+
+  def test_sync_with_limit(self):
+    """
+    Test attempt to get changes page by page.
+    """
+    file_ids = [self.create_file('sync_{}.jpg'.format(n)).id for n in range(5)]
+    synced_ids = []
+    cursor, has_more = 0, True
+    while has_more:
+      response = self.sync(cursor, limit=2)
+      cursor, has_more = response.data['cursor'], response.data['has_more']
+      synced_ids += [item['id'] for item in response.data['created']]
+    # test assertions
+    self.assertEqual(sorted(synced_ids), file_ids)
+    self.assertEqual(cursor, 5)
+
+  def test_sync_number_of_queries(self):
+    """
+    Test attempt to sync many changes with constant number of queries.
+    """
+    for n in range(20):
+      self.create_file('sync_{}.jpg'.format(n))
+    deletion.delete_files(File.objects.filter(user=self.user, id__lte=45))
+    # test assertions
+    # changes, change counter and created files
+    with self.assertNumQueries(3):
+      response = self.sync(0)
+    self.assertEqual(len(response.data['created']), 20)
+    self.assertEqual(sorted(response.data['deleted']), list(range(41, 46)))
+
+  def test_sync_changes_of_another_user(self):
+    """
+    Test attempt to sync when only another user changed files.
+    """
+    self.create_file('sync_paulina.jpg', User.objects.get(username='paulina'))
+    response = self.sync(0)
+    # test assertions
+    self.assertEqual(response.data, {'cursor': 0, 'has_more': False, 'created': [], 'deleted': []})
+
+  def test_sync_with_expired_cursor(self):
+    """
+    Test attempt to sync with cursor which changes were pruned.
+    """
+    self.create_file('sync_old.jpg')
+    self.create_file('sync_new.jpg')
+    FileChange.objects.filter(user=self.user, version=1).update(created_date='2000-01-01T00:00:00Z')
+    self.assertEqual(changes.prune_changes(24 * 3600), 1)
+    # test assertions
+    self.assertEqual(ChangeCounter.objects.get(user=self.user).pruned_version, 1)
+    response = self.sync(0)
+    self.assertEqual(response.status_code, status.HTTP_410_GONE)
+    self.assertEqual(response.data['cursor'], 2)
+    response = self.sync(1)
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(len(response.data['created']), 1)
+    # cursor ahead of change log isn't valid either
+    self.assertEqual(self.sync(3).status_code, status.HTTP_410_GONE)
+
+  def test_sync_with_invalid_cursor(self):
+    """
+    Test attempt to sync with invalid cursor and limit.
+    """
+    # test assertions
+    self.assertEqual(self.sync('abc').status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(self.sync(-1).status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(self.sync(0, limit=0).status_code, status.HTTP_400_BAD_REQUEST)
+    self.client.force_authenticate(user=None)
+    self.assertEqual(self.sync(0).status_code, status.HTTP_401_UNAUTHORIZED)
+
+  def test_delete_user_with_changes(self):
+    """
+    Test attempt to delete user which files are deleted by cascade and recorded in change log.
+    """
+    user = User.objects.create(username='sync_deleted_user')
+    self.create_file('sync_deleted_user.jpg', user)
+    user_id = user.id
+    self.assertTrue(FileChange.objects.filter(user_id=user_id).exists())
+    user.delete()
+    # test assertions
+    self.assertFalse(FileChange.objects.filter(user_id=user_id).exists())
+    self.assertFalse(ChangeCounter.objects.filter(user_id=user_id).exists())
@@ -0,0 +1,115 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+import datetime
+import os
+from uniphoto import tasks
+from uniphoto.models import File, Task
+from uniphoto.renditions import get_rendition_name, get_rendition_path
+
+
+class TaskQueueTests(APITestCase):
+
+  def test_post_file_enqueues_processing(self):
+    """
+    Test attempt to create file that is processed by worker after response.
+    """
+    # test username
+    test_username = 'azalia'
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=user)
+    # url for request
+    url = '/post-file'
+    # data for request
+    test_filename = 'file_to_test_post_request.jpg'
+    test_file_path = os.path.join(settings.BASE_DIR, 'uniphoto', 'test', 'test_data', test_filename)
+    test_file = SimpleUploadedFile(test_filename, open(test_file_path, 'rb').read(), content_type='multipart/form-data')
+    data = {'file': test_file}
+    # post request to url with data in multipart format
+    response = self.client.post(url, data, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(response.data['processing_status'], File.ProcessingStatus.PENDING)
+    file = File.objects.get(id=response.data['id'])
+    self.addCleanup(os.remove, file.file.path)
+    self.assertTrue(Task.objects.filter(name='process_file', kwargs={'file_id': file.id}).exists())
+
+    # run worker until queue is empty
+    call_command('process_tasks', once=True)
+
+    # assert that worker built renditions and updated processing status
+    file.refresh_from_db()
+    self.assertEqual(file.processing_status, File.ProcessingStatus.DONE)
+    self.assertFalse(Task.objects.exists())
+    for size in settings.RENDITION_SIZES:
+      for extension in settings.RENDITION_FORMATS:
+        self.assertTrue(os.path.exists(get_rendition_path(file.file.name, size, extension)))
+    self.assertTrue(file.renditions_built)
+    response = self.client.get('/user-files')
+    self.assertEqual(response.data['results'][0]['processing_status'], File.ProcessingStatus.DONE)
+    # assert that files list refers to built renditions in media
+    self.assertEqual(response.data['results'][0]['renditions'][str(settings.RENDITION_SIZES[0])]['jpg'],
+                     'http://testserver' + settings.MEDIA_URL + get_rendition_name(file.file.name, settings.RENDITION_SIZES[0], 'jpg'))
+
+  def test_failed_task_is_retried(self):
+    """
+    Test attempt to run task that fails on every attempt.
+    """
+    # test file which doesn't exist on disk so that its processing fails
+    user = User.objects.get(username='azalia')
+    file = File.objects.create(user=user, file='file_that_does_not_exist.jpg')
+    task = tasks.enqueue('process_file', file_id=file.id)
+
+    for attempt in range(1, settings.TASK_MAX_ATTEMPTS):
+      with self.assertLogs('uniphoto.tasks', level='ERROR'):
+        self.assertTrue(tasks.run_next_task())
+      task.refresh_from_db()
+      # assert that task is postponed with exponential backoff
+      self.assertEqual(task.status, Task.Status.QUEUED)
+      self.assertEqual(task.attempts, attempt)
+      self.assertTrue('FileNotFoundError' in task.last_error)
+      retry_delay = datetime.timedelta(seconds=settings.TASK_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+      self.assertTrue(task.run_after > timezone.now() + retry_delay - datetime.timedelta(seconds=5))
+      self.assertFalse(tasks.run_next_task())
+      Task.objects.filter(id=task.id).update(run_after=timezone.now())
+
+    # assert that last attempt marks task and file as failed
+    with self.assertLogs('uniphoto.tasks', level='ERROR'):
+      self.assertTrue(tasks.run_next_task())
+    task.refresh_from_db()
+    file.refresh_from_db()
+    self.assertEqual(task.status, Task.Status.FAILED)
+    self.assertEqual(task.attempts, settings.TASK_MAX_ATTEMPTS)
+    self.assertEqual(file.processing_status, File.ProcessingStatus.FAILED)
+    self.assertFalse(tasks.run_next_task())
+
+  def test_task_with_expired_lease_is_retried(self):
+    """
+    Test attempt to run task which worker crashed while running it.
+    """
+    # test file
+    file = File.objects.get(id=1)
+    task = tasks.enqueue('process_file', file_id=file.id)
+    # claim task as crashed worker would do
+    self.assertEqual(tasks.claim_next_task().id, task.id)
+    self.assertFalse(tasks.run_next_task())
+    # expire lease
+    Task.objects.filter(id=task.id).update(run_after=timezone.now())
+    # test assertions
+    self.assertTrue(tasks.run_next_task())
+    self.assertFalse(Task.objects.filter(id=task.id).exists())
+    file.refresh_from_db()
+    self.assertEqual(file.processing_status, File.ProcessingStatus.DONE)
+
+  def test_enqueue_unknown_task(self):
+    """
+    Test attempt to enqueue task which isn't registered.
+    """
+    with self.assertRaises(KeyError):
+      tasks.enqueue('unknown_task')
+    self.assertFalse(Task.objects.exists())
@@ -1,9 +1,18 @@
-from django.test import TestCase
+from rest_framework import exceptions, status
+from rest_framework.test import APITestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from uniphoto.validators import validate_file_extension
+from django.core.files.uploadedfile import SimpleUploadedFile
+from uniphoto.models import File, UploadSession
+from uniphoto.validators import validate_file_extension, validate_file_signature, SignatureUploadHandler, FileTooLarge, SIGNATURE_ERROR
 from dataclasses import dataclass
 
 
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+MP4_HEADER = b'\x00\x00\x00\x18ftypisom'
+
+
 @dataclass
 class TestFile:
   path: str
@@ -31,4 +40,102 @@ class ValidateFileExtensionTests(TestCase):
     try:
       validate_file_extension(test_file)
     except ValidationError as error:
-      self.assertEqual(error.messages[0], 'Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4')
\ No newline at end of file
+      self.assertEqual(error.messages[0], 'Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4')
+
+class ValidateFileSignatureTests(TestCase):
+
+  def test_validate_file_signature_for_matching_content(self):
+    """
+    Test attempt to validate files which content starts as their extension requires.
+    """
+    # test assertions
+    for name, content in [('photo.JPG', JPEG_HEADER + b'photo'), ('video.mp4', MP4_HEADER + b'video'), ('music.mp3', b'music')]:
+      with self.subTest(name=name):
+        test_file = SimpleUploadedFile(name, content)
+        validate_file_signature(test_file)
+        self.assertEqual(test_file.tell(), 0)
+
+  def test_validate_file_signature_for_mismatched_content(self):
+    """
+    Test attempt to validate files which content doesn't match their extension.
+    """
+    # test assertions
+    for name, content in [('photo.jpg', MP4_HEADER + b'video'), ('video.mp4', JPEG_HEADER + b'photo'), ('empty.jpg', b'')]:
+      with self.subTest(name=name):
+        with self.assertRaisesMessage(ValidationError, SIGNATURE_ERROR):
+          validate_file_signature(SimpleUploadedFile(name, content))
+
+  def test_upload_handler_stops_mismatched_and_large_files(self):
+    """
+    Test attempt to stream files which are stopped by their first chunk.
+    """
+    handler = SignatureUploadHandler()
+    # test assertions
+    handler.new_file('file', 'photo.jpg', 'image/jpeg', None)
+    self.assertEqual(handler.receive_data_chunk(JPEG_HEADER[:2], 0), JPEG_HEADER[:2])
+    self.assertEqual(handler.receive_data_chunk(JPEG_HEADER + bytes(20), 2), JPEG_HEADER + bytes(20))
+    self.assertIsNone(handler.file_complete(24))
+    handler.new_file('file', 'photo.jpg', 'image/jpeg', None)
+    with self.assertRaises(exceptions.ValidationError):
+      handler.receive_data_chunk(b'GIF89a' + bytes(20), 0)
+    handler.new_file('file', 'short.jpg', 'image/jpeg', None)
+    handler.receive_data_chunk(b'\xff', 0)
+    with self.assertRaises(exceptions.ValidationError):
+      handler.file_complete(1)
+    with override_settings(UPLOAD_MAX_FILE_BYTES=100):
+      handler.new_file('file', 'video.mp4', 'video/mp4', None)
+      handler.receive_data_chunk(MP4_HEADER + bytes(88), 0)
+      with self.assertRaises(FileTooLarge):
+        handler.receive_data_chunk(b'x', 100)
+
+
+class UploadSignatureTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def test_post_file_with_mismatched_content(self):
+    """
+    Test attempt to create file which content doesn't match its extension.
+    """
+    file_counts = File.objects.all().count()
+    response = self.client.post('/post-file', {'file': SimpleUploadedFile('photo.jpg', b'<html></html>')}, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'file': [SIGNATURE_ERROR]})
+    response = self.client.post('/post-files', {'files': [SimpleUploadedFile('photo.jpg', JPEG_HEADER + b'photo'),
+                                                          SimpleUploadedFile('video.mp4', JPEG_HEADER + b'photo')]}, format='multipart')
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'files': [SIGNATURE_ERROR]})
+    self.assertEqual(File.objects.all().count(), file_counts)
+
+  def test_post_too_large_file(self):
+    """
+    Test attempt to create file larger than UPLOAD_MAX_FILE_BYTES.
+    """
+    with override_settings(UPLOAD_MAX_FILE_BYTES=100):
+      response = self.client.post('/post-file', {'file': SimpleUploadedFile('photo.jpg', JPEG_HEADER + bytes(200))}, format='multipart')
+      # test assertions
+      self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+      self.assertEqual(response.data, {'detail': 'File is too large.'})
+      response = self.client.post('/upload', {'filename': 'video.mp4', 'size': 101}, format='json')
+      self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+  def test_chunked_upload_with_mismatched_content(self):
+    """
+    Test attempt to upload first chunk which content doesn't match extension of upload.
+    """
+    upload_id = self.client.post('/upload', {'filename': 'video.mp4', 'size': 1000}, format='json').data['id']
+    self.addCleanup(self.client.delete, '/upload/{}'.format(upload_id))
+    response = self.client.put('/upload/{}'.format(upload_id), data=JPEG_HEADER + bytes(996), content_type='application/octet-stream',
+                               HTTP_UPLOAD_OFFSET='0')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'message': SIGNATURE_ERROR})
+    self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 0)
+    response = self.client.put('/upload/{}'.format(upload_id), data=MP4_HEADER + bytes(988), content_type='application/octet-stream',
+                               HTTP_UPLOAD_OFFSET='0')
+    self.assertEqual(response.data, {'offset': 1000})
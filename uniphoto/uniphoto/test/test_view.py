@@ -4,12 +4,21 @@ from rest_framework.exceptions import ErrorDetail
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.db.models import QuerySet
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from unittest import mock
+import hashlib
+import inspect
+import io
 import math
 import json
 import os
-from uniphoto.models import File
+from uniphoto import deletion, tasks
+from uniphoto.models import Blob, File, Task
+from uniphoto.renditions import get_rendition_path
+from uniphoto.test.utils import FeedCacheMixin
 
 
 NUMBER_NEXT_PAGES_TO_CHECK = 2
@@ -294,8 +303,62 @@ class UserFilesListViewTests(APITestCase):
     # assert that response data hasn't refer to next page (is None) 
     self.assertTrue(response.data['next'] is None)
 
+  def test_get_user_files_list_with_cursor_pagination(self):
+    """
+    Test attempt to get user files list in cursor pagination mode.
+    """
+    # test username
+    test_username = 'paulina'
+    # we can force authenticate user to bypass explicit token usage
+    test_user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=test_user)
+    # url for request
+    url = '/user-files?pagination=cursor'
+    # get request to url
+    response = self.client.get(url)
 
-class AllFilesListViewTests(APITestCase):
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    # cursor mode doesn't count rows
+    self.assertFalse('count' in response.data)
+    self.assertTrue(response.data['previous'] is None)
+    self.assertEqual(len(response.data['results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+
+    # follow next links and assert that they cover all user files in descending id order
+    all_ids = [user_file['id'] for user_file in response.data['results']]
+    while response.data['next'] is not None:
+      self.assertTrue('cursor=' in response.data['next'])
+      response = self.client.get(response.data['next'])
+      self.assertEqual(response.status_code, status.HTTP_200_OK)
+      self.assertTrue(response.data['previous'] is not None)
+      all_ids += [user_file['id'] for user_file in response.data['results']]
+    test_user_files_ids = list(File.objects.all().filter(user=test_user).order_by('-id').values_list('id', flat=True))
+    self.assertEqual(all_ids, test_user_files_ids)
+
+    # assert that previous link returns previous page
+    response = self.client.get(response.data['previous'])
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertTrue(all(user_file['id'] in test_user_files_ids for user_file in response.data['results']))
+
+  def test_get_user_files_list_with_invalid_cursor(self):
+    """
+    Test attempt to get user files list with invalid cursor.
+    """
+    # test username
+    test_username = 'paulina'
+    # we can force authenticate user to bypass explicit token usage
+    test_user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=test_user)
+    # url for request
+    url = '/user-files?cursor=invalid_cursor'
+    # get request to url
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    self.assertEqual(response.data, {'detail': ErrorDetail(string='Invalid cursor', code='not_found')})
+
+
+class AllFilesListViewTests(FeedCacheMixin, APITestCase):
 
   def test_get_all_files_list_with_valid_token(self):
     """
@@ -415,6 +478,35 @@ class AllFilesListViewTests(APITestCase):
     # assert that response data hasn't refer to next page (is None) 
     self.assertTrue(response.data['next'] is None)
 
+  def test_get_all_files_list_with_cursor_pagination(self):
+    """
+    Test attempt to get all files list in cursor pagination mode.
+    """
+    # test username
+    test_username = 'paulina'
+    # we can force authenticate user to bypass explicit token usage
+    test_user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=test_user)
+    # url for request
+    url = '/all-files?pagination=cursor'
+    # get request to url
+    response = self.client.get(url)
+
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    # cursor mode doesn't count rows
+    self.assertFalse('count' in response.data)
+    self.assertTrue(response.data['previous'] is None)
+    self.assertTrue('username' in response.data['results'][0])
+
+    # follow next links and assert that they cover all files in descending id order
+    all_ids = [file['id'] for file in response.data['results']]
+    while response.data['next'] is not None:
+      response = self.client.get(response.data['next'])
+      self.assertEqual(response.status_code, status.HTTP_200_OK)
+      all_ids += [file['id'] for file in response.data['results']]
+    self.assertEqual(all_ids, list(File.objects.all().order_by('-id').values_list('id', flat=True)))
+
 
 class PostFileViewTests(APITestCase):
     
@@ -441,8 +533,11 @@ class PostFileViewTests(APITestCase):
     self.assertEqual(response.status_code, status.HTTP_201_CREATED)
     self.assertEqual(File.objects.all().count(), file_counts + 1)
     self.assertEqual(File.objects.all().latest('id').user.id, user.id)
-    self.assertEqual(File.objects.all().latest('id').file.name, test_filename)
-    self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, test_filename)))
+    # file is stored under its content digest
+    test_file_digest = hashlib.sha256(open(test_file_path, 'rb').read()).hexdigest()
+    test_file_name = 'blobs/{}/{}/{}.jpg'.format(test_file_digest[:2], test_file_digest[2:4], test_file_digest)
+    self.assertEqual(File.objects.all().latest('id').file.name, test_file_name)
+    self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, test_file_name)))
 
   def test_create_file_with_invalid_token(self):
     """
@@ -564,6 +659,78 @@ class PostFileViewTests(APITestCase):
     self.assertEqual(File.objects.all().count(), file_counts)
 
 
+class PostFilesViewTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def make_image(self, filename, color):
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(image, 'JPEG')
+    return SimpleUploadedFile(filename, image.getvalue(), content_type='multipart/form-data')
+
+  def test_create_files(self):
+    """
+    Test attempt to create many files in one request.
+    """
+    file_counts = File.objects.all().count()
+    test_files = [self.make_image('red.jpg', 'red'), self.make_image('green.JPEG', 'green')]
+    response = self.client.post('/post-files', {'files': test_files}, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(File.objects.all().count(), file_counts + 2)
+    results = response.data['results']
+    self.assertEqual([result['name'] for result in results], ['red.jpg', 'green.JPEG'])
+    self.assertEqual([result['status'] for result in results], ['created', 'created'])
+    for result in results:
+      file = File.objects.get(id=result['file']['id'])
+      self.addCleanup(os.remove, file.file.path)
+      self.assertEqual(file.user, self.user)
+      self.assertEqual(file.processing_status, File.ProcessingStatus.PENDING)
+      self.assertTrue(Task.objects.filter(name='process_file', kwargs={'file_id': file.id}).exists())
+    self.assertTrue(results[1]['file']['file'].endswith('.jpeg'))
+
+  def test_create_files_with_invalid_file(self):
+    """
+    Test attempt to create many files when some of them are invalid.
+    """
+    file_counts = File.objects.all().count()
+    test_files = [
+      SimpleUploadedFile('music.mp3', b'not an image', content_type='multipart/form-data'),
+      self.make_image('blue.jpg', 'blue'),
+    ]
+    response = self.client.post('/post-files', {'files': test_files}, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+    self.assertEqual(File.objects.all().count(), file_counts + 1)
+    invalid_result, created_result = response.data['results']
+    self.assertEqual(invalid_result['status'], 'invalid')
+    self.assertEqual(invalid_result['errors'], {'file': [ErrorDetail('Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4', code='invalid')]})
+    self.assertEqual(created_result['status'], 'created')
+    self.addCleanup(os.remove, File.objects.get(id=created_result['file']['id']).file.path)
+
+  def test_create_files_without_files(self):
+    """
+    Test attempt to create many files without files.
+    """
+    response = self.client.post('/post-files', {'file': self.make_image('red.jpg', 'red')}, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'message': 'No files were uploaded.'})
+
+  def test_create_files_without_token_header(self):
+    """
+    Test attempt to create many files without token header.
+    """
+    self.client.force_authenticate(user=None)
+    response = self.client.post('/post-files', {'files': [self.make_image('red.jpg', 'red')]}, format='multipart')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class DeleteFileViewTests(APITestCase):
     
   def test_delete_file_with_valid_token(self):
@@ -588,6 +755,10 @@ class DeleteFileViewTests(APITestCase):
     self.assertEqual(response.data['message'], 'File was deleted successfully.')
     self.assertEqual(File.objects.all().count(), file_counts - 1)
     self.assertFalse(File.objects.all().filter(id=file_to_delete_id).exists())
+    # assert that file is removed from disk by worker after commit
+    self.assertTrue(Task.objects.filter(name='remove_files', kwargs__names=[file_to_delete.file.name]).exists())
+    while tasks.run_next_task():
+      pass
     self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, file_to_delete.file.name)))
 
   def test_delete_file_with_invalid_token(self):
@@ -659,3 +830,194 @@ class DeleteFileViewTests(APITestCase):
     # test assertions
     self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
     self.assertEqual(File.objects.all().count(), file_counts)
+
+
+class DeleteFilesViewTests(APITestCase):
+
+  def setUp(self):
+    # test user
+    self.user = User.objects.get(username='azalia')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    self.client.force_authenticate(user=self.user)
+
+  def post_image(self, color):
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(image, 'JPEG')
+    test_file = SimpleUploadedFile('{}.jpg'.format(color), image.getvalue(), content_type='multipart/form-data')
+    return File.objects.get(id=self.client.post('/post-file', {'file': test_file}, format='multipart').data['id'])
+
+  def run_tasks(self):
+    while tasks.run_next_task():
+      pass
+
+  def test_delete_files(self):
+    """
+    Test attempt to delete many files in one request.
+    """
+    files = [self.post_image('red'), self.post_image('green')]
+    paths = [file.file.path for file in files]
+    ids = [files[0].id, files[1].id, 1, 999999, files[0].id]
+    response = self.client.post('/delete-files', {'ids': ids}, format='json')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response.data['results'], [
+      {'id': files[0].id, 'status': 'deleted'},
+      {'id': files[1].id, 'status': 'deleted'},
+      # file of another user
+      {'id': 1, 'status': 'not_found'},
+      {'id': 999999, 'status': 'not_found'},
+    ])
+    self.assertFalse(File.objects.filter(id__in=[file.id for file in files]).exists())
+    self.assertTrue(File.objects.filter(id=1).exists())
+    self.assertFalse(Blob.objects.filter(id__in=[file.blob_id for file in files]).exists())
+    # assert that media is removed by worker
+    self.assertTrue(all(os.path.exists(path) for path in paths))
+    self.run_tasks()
+    self.assertFalse(any(os.path.exists(path) for path in paths))
+
+  def test_delete_files_with_shared_blob(self):
+    """
+    Test attempt to delete file which content is shared with another file.
+    """
+    file, same_file = self.post_image('blue'), self.post_image('blue')
+    self.addCleanup(os.remove, same_file.file.path)
+    response = self.client.post('/delete-files', {'ids': [file.id]}, format='json')
+    self.run_tasks()
+    # test assertions
+    self.assertEqual(response.data['results'], [{'id': file.id, 'status': 'deleted'}])
+    self.assertEqual(Blob.objects.get(id=same_file.blob_id).reference_count, 1)
+    self.assertTrue(os.path.exists(same_file.file.path))
+
+  def test_raw_delete(self):
+    """
+    Test attempt to delete files by a single statement without sending signals.
+    """
+    file_ids = list(File.objects.filter(user=self.user).values_list('id', flat=True)[:2])
+    # test assertions
+    self.assertEqual(list(inspect.signature(QuerySet._raw_delete).parameters), ['self', 'using'])
+    with mock.patch('django.db.models.signals.post_delete.send') as send, self.assertNumQueries(1):
+      self.assertEqual(deletion.raw_delete(File.objects.filter(id__in=file_ids)), 2)
+    send.assert_not_called()
+    self.assertFalse(File.objects.filter(id__in=file_ids).exists())
+
+  def test_delete_files_without_ids(self):
+    """
+    Test attempt to delete many files without ids.
+    """
+    response = self.client.post('/delete-files', {'ids': []}, format='json')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(response.data, {'ids': [ErrorDetail('This list may not be empty.', code='empty')]})
+
+  def test_delete_files_without_token_header(self):
+    """
+    Test attempt to delete many files without token header.
+    """
+    self.client.force_authenticate(user=None)
+    response = self.client.post('/delete-files', {'ids': [1]}, format='json')
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertTrue(File.objects.filter(id=1).exists())
+
+
+class FileRenditionViewTests(APITestCase):
+
+  def test_get_rendition_with_valid_token(self):
+    """
+    Test attempt to get file rendition with valid token.
+    """
+    # test username
+    test_username = 'azalia'
+    # test file
+    file_id = 47
+    file = File.objects.get(id=file_id)
+    size = 128
+    rendition_path = get_rendition_path(file.file.name, size, 'webp')
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=user)
+    # url for request
+    url = '/rendition/{}/{}.webp'.format(file_id, size)
+    # get request to url
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_200_OK)
+    self.assertEqual(response['Content-Type'], 'image/webp')
+    rendition = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+    self.assertEqual(rendition.format, 'WEBP')
+    # renditions are never upscaled
+    self.assertEqual(max(rendition.size), min(size, max(Image.open(file.file.path).size)))
+    # assert that rendition is cached on disk
+    self.assertTrue(os.path.exists(rendition_path))
+
+    # assert that renditions which process_file didn't build refer to rendition view, which serves cached one
+    response = self.client.get('/user-files')
+    file_data = next(user_file for user_file in response.data['results'] if user_file['id'] == file_id)
+    self.assertEqual(file_data['renditions'][str(size)]['webp'], 'http://testserver/rendition/{}/{}.webp'.format(file_id, size))
+    self.assertEqual(file_data['renditions'][str(size)]['jpg'], 'http://testserver/rendition/{}/{}.jpg'.format(file_id, size))
+    # assert that files list refers to renditions in media once they are built
+    File.objects.filter(id=file_id).update(renditions_built=True)
+    response = self.client.get('/user-files')
+    file_data = next(user_file for user_file in response.data['results'] if user_file['id'] == file_id)
+    self.assertEqual(file_data['renditions'][str(size)]['webp'],
+                     'http://testserver' + settings.MEDIA_URL + 'renditions/{}/{}.webp'.format(size, file.file.name))
+
+    # assert that renditions are deleted with file
+    response = self.client.delete('/delete-file/{}'.format(file_id))
+    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+    while tasks.run_next_task():
+      pass
+    self.assertFalse(os.path.exists(rendition_path))
+
+  def test_get_rendition_with_unsupported_size(self):
+    """
+    Test attempt to get file rendition with size that isn't configured.
+    """
+    # test username
+    test_username = 'azalia'
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=user)
+    # url for request
+    url = '/rendition/47/100.jpg'
+    # get request to url
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    self.assertEqual(response.data['message'], 'Rendition is not available.')
+
+  def test_get_rendition_of_video(self):
+    """
+    Test attempt to get rendition of file that isn't image.
+    """
+    # test username
+    test_username = 'azalia'
+    # we can force authenticate user to bypass explicit token usage when we don't need to test it
+    user = User.objects.get(username=test_username)
+    self.client.force_authenticate(user=user)
+    # test file
+    video_id = 46
+    # url for request
+    url = '/rendition/{}/128.jpg'.format(video_id)
+    # get request to url
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    # assert that files list has no renditions for video
+    response = self.client.get('/user-files')
+    video_data = next(user_file for user_file in response.data['results'] if user_file['id'] == video_id)
+    self.assertTrue(video_data['renditions'] is None)
+
+  def test_get_rendition_with_invalid_token(self):
+    """
+    Test attempt to get file rendition with invalid token.
+    """
+    # mannually add invalid credentials to all requests from client 
+    self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format('invalid_token'))
+    # url for request
+    url = '/rendition/47/128.jpg'
+    # get request to url
+    response = self.client.get(url)
+    # test assertions
+    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    self.assertEqual(response.data, {'detail': ErrorDetail(string='Invalid token.', code='authentication_failed')})
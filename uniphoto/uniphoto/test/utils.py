@@ -0,0 +1,20 @@
+from django.db import connection
+from uniphoto import feed
+
+
+class FeedCacheMixin:
+  # cached feed outlives test data which is rolled back after each test
+
+  def setUp(self):
+    super().setUp()
+    feed.get_cache().clear()
+
+
+class OnCommitMixin:
+
+  def run_on_commit_callbacks(self):
+    # test case transaction is never committed, so callbacks are run as if it was
+    # (TestCase.captureOnCommitCallbacks is available since Django 3.2)
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+      callback()
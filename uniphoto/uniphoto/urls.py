@@ -1,9 +1,8 @@
 from rest_framework.urlpatterns import format_suffix_patterns
 from rest_framework.authtoken import views as auth_views
 from django.urls import path
-from django.conf.urls.static import static
 from django.conf import settings
-from uniphoto import views as uniphoto_views
+from uniphoto import async_views, views as uniphoto_views
 
 
 urlpatterns = [
@@ -11,12 +10,32 @@ urlpatterns = [
   path('api-token-auth', auth_views.obtain_auth_token),
   path('user-details', uniphoto_views.UserDetails.as_view()),
   path('trial-license-check', uniphoto_views.TrialLicenseCheck.as_view()),
+  path('trial-license-checks', uniphoto_views.TrialLicenseChecks.as_view()),
+  path('storage-usage', uniphoto_views.StorageUsageDetails.as_view()),
   path('user-files', uniphoto_views.UserFilesList.as_view()),
   path('all-files', uniphoto_views.AllFilesList.as_view()),
   path('post-file', uniphoto_views.PostFile.as_view()),
+  path('post-files', uniphoto_views.PostFiles.as_view()),
+  path('upload', uniphoto_views.StartUpload.as_view()),
+  path('upload/<uuid:pk>', uniphoto_views.UploadChunk.as_view()),
+  path('upload/<uuid:pk>/finalize', uniphoto_views.FinishUpload.as_view()),
   path('delete-file/<int:pk>', uniphoto_views.DeleteFile.as_view()),
+  path('delete-files', uniphoto_views.DeleteFiles.as_view()),
+  path('sync', uniphoto_views.SyncFiles.as_view()),
+  path('metrics', uniphoto_views.Metrics.as_view()),
+  path('rendition/<int:pk>/<int:size>.<str:extension>', uniphoto_views.FileRendition.as_view(), name='rendition'),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns = format_suffix_patterns(urlpatterns)
 
-urlpatterns = format_suffix_patterns(urlpatterns)
\ No newline at end of file
+urlpatterns += [
+  path('async/user-details', async_views.user_details),
+  path('async/user-files', async_views.user_files),
+  path('async/all-files', async_views.all_files),
+  path('async/post-file', async_views.post_file),
+  path('async/delete-file/<int:pk>', async_views.delete_file),
+]
+
+urlpatterns += [
+  path(settings.MEDIA_URL.lstrip('/') + '<path:name>', uniphoto_views.MediaFile.as_view()),
+]
\ No newline at end of file
@@ -1,9 +1,80 @@
+from rest_framework import exceptions, status
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler
 import os
 
 
-def validate_file_extension(value):
-  ext = os.path.splitext(value.name)[1]  # [0] returns path+filename
+# leading bytes which content of each supported extension starts with:
+# JPEG SOI marker and ftyp box of ISO base media file, which is the first box of mp4
+SIGNATURE_LENGTH = 12
+SIGNATURES = {
+  '.jpg': lambda header: header.startswith(b'\xff\xd8\xff'),
+  '.jpeg': lambda header: header.startswith(b'\xff\xd8\xff'),
+  '.mp4': lambda header: header[4:8] == b'ftyp',
+}
+SIGNATURE_ERROR = 'File content does not match its extension.'
+
+
+class FileTooLarge(exceptions.APIException):
+  status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+  default_detail = 'File is too large.'
+  default_code = 'file_too_large'
+
+
+def validate_filename_extension(name):
+  ext = os.path.splitext(name)[1]  # [0] returns path+filename
   valid_extensions = ['.jpg', '.jpeg', '.mp4']
   if not ext.lower() in valid_extensions:
-    raise ValidationError('Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4')
\ No newline at end of file
+    raise ValidationError('Unsupported file extension. Supported file extensions: .jpg, .jpeg, .mp4')
+
+def validate_file_extension(value):
+  validate_filename_extension(value.name)
+
+def is_signature_valid(name, header):
+  # names with unsupported extension are rejected by extension validators
+  check = SIGNATURES.get(os.path.splitext(name)[1].lower())
+  return check is None or check(header)
+
+def validate_file_signature(value):
+  value.seek(0)
+  header = value.read(SIGNATURE_LENGTH)
+  value.seek(0)
+  if not is_signature_valid(value.name, header):
+    raise ValidationError(SIGNATURE_ERROR)
+
+def check_file_size(size):
+  if settings.UPLOAD_MAX_FILE_BYTES is not None and size > settings.UPLOAD_MAX_FILE_BYTES:
+    raise FileTooLarge()
+
+
+class SignatureUploadHandler(FileUploadHandler):
+  """
+  Checks leading bytes of each uploaded file against its extension as soon as they arrive and
+  stops upload of file which doesn't match or exceeds UPLOAD_MAX_FILE_BYTES, so the rest of body
+  isn't read, hashed nor spooled to disk. Must precede handlers which store files.
+  """
+
+  def new_file(self, field_name, file_name, *args, **kwargs):
+    super().new_file(field_name, file_name, *args, **kwargs)
+    self.header = b''
+    self.checked = False
+
+  def check_header(self):
+    self.checked = True
+    if not is_signature_valid(self.file_name, self.header):
+      raise exceptions.ValidationError({self.field_name: [SIGNATURE_ERROR]})
+
+  def receive_data_chunk(self, raw_data, start):
+    check_file_size(start + len(raw_data))
+    if not self.checked:
+      self.header += raw_data[:SIGNATURE_LENGTH - len(self.header)]
+      if len(self.header) == SIGNATURE_LENGTH:
+        self.check_header()
+    return raw_data
+
+  def file_complete(self, file_size):
+    # file shorter than signature
+    if not self.checked:
+      self.check_header()
+    return None
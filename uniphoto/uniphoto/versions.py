@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+import datetime
+import math
+from .models import ChangeCounter, FileListChange, FileListVersion
+
+
+# Validators of file lists are kept in database, so web processes and task worker see the same versions.
+# Version of user (its ChangeCounter row) is changed in transaction which creates, deletes or processes its files,
+# global version (the single FileListVersion row) right after commit, so that writers of different users don't
+# wait for each other. Version is a pair of token (for ETag) and unix time in whole seconds (for Last-Modified),
+# both are read by one primary key lookup. Every change of global version has its FileListChange row, which cached
+# feed applies instead of reading the list again.
+# Urls of renditions which are built lazily aren't versioned, rendition view url of older response stays valid.
+GLOBAL_VERSION_ID = 1
+
+
+def get_version(user_id=None):
+  if user_id is None:
+    row = FileListVersion.objects.filter(id=GLOBAL_VERSION_ID).values_list('revision', 'modified_date').first()
+  else:
+    row = ChangeCounter.objects.filter(user_id=user_id).values_list('revision', 'modified_date').first()
+  revision, modified_date = row or (0, None)
+  if modified_date is None:
+    return str(revision), None
+  modified = math.ceil(modified_date.timestamp())
+  return '{}:{}'.format(revision, modified), modified
+
+def get_revision(token):
+  # token starts with revision
+  return int(token.split(':')[0])
+
+def get_bump_fields():
+  # Last-Modified has one second precision, so every version gets later second than the previous one
+  now = timezone.now()
+  modified_date = now.replace(microsecond=0) + datetime.timedelta(seconds=1 if now.microsecond else 0)
+  following_second = ExpressionWrapper(F('modified_date') + datetime.timedelta(seconds=1), output_field=DateTimeField())
+  return {'revision': F('revision') + 1, 'modified_date': Greatest(Value(modified_date), following_second)}
+
+def global_files_changed(change_id):
+  # change gets the revision it bumps, revisions of changes have no gaps unless a bump is lost
+  with transaction.atomic():
+    if not FileListVersion.objects.filter(id=GLOBAL_VERSION_ID).update(**get_bump_fields()):
+      FileListVersion.objects.get_or_create(id=GLOBAL_VERSION_ID)
+      FileListVersion.objects.filter(id=GLOBAL_VERSION_ID).update(**get_bump_fields())
+    revision = FileListVersion.objects.filter(id=GLOBAL_VERSION_ID).values_list('revision', flat=True).get()
+    FileListChange.objects.filter(id=change_id).update(revision=revision)
+
+def list_changed(created=(), deleted=(), updated=(), user_ids=()):
+  """
+  Record change of all files list in the current transaction and change global version after its commit.
+  """
+  change = FileListChange.objects.create(created=list(created), deleted=list(deleted), updated=list(updated), user_ids=list(user_ids))
+  transaction.on_commit(lambda: global_files_changed(change.id))
+
+def files_changed(user_ids, file_ids=None):
+  """
+  Change versions of lists of users in the current transaction and global version after its commit.
+  Without file ids every file of the users is changed (e.g. username).
+  """
+  user_ids = sorted(set(user_ids))
+  # counter rows are locked in id order, so concurrent changes can't deadlock
+  for user_id in user_ids:
+    if not ChangeCounter.objects.filter(user_id=user_id).update(**get_bump_fields()):
+      ChangeCounter.objects.get_or_create(user_id=user_id)
+      ChangeCounter.objects.filter(user_id=user_id).update(**get_bump_fields())
+  if file_ids is None:
+    list_changed(user_ids=user_ids)
+  else:
+    list_changed(updated=file_ids)
+
+def prune_list_changes(keep, pending_max_age, dry_run=False):
+  """
+  Remove changes which cached feed doesn't apply anymore: all but the last keep revisions and changes which
+  didn't get revision in pending_max_age seconds (bump was lost). Return number of removed changes.
+  """
+  revision = FileListVersion.objects.filter(id=GLOBAL_VERSION_ID).values_list('revision', flat=True).first() or 0
+  created_before = timezone.now() - datetime.timedelta(seconds=pending_max_age)
+  querysets = [FileListChange.objects.filter(revision__lte=revision - keep),
+               FileListChange.objects.filter(revision__isnull=True, created_date__lt=created_before)]
+  if dry_run:
+    return sum(queryset.count() for queryset in querysets)
+  return sum(queryset.delete()[0] for queryset in querysets)
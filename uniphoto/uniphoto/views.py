@@ -1,59 +1,388 @@
 from rest_framework import generics, permissions 
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
 from django.db.models import F
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+import collections
+import hashlib
 import os
-from .models import File
-from .serializers import UserSerializer, TrialLicenseCheckSerializer, UserFilesSerializer, AllFilesSerializer
+from . import changes, deletion, feed, licensing, media, profiling, quota, renditions, storage, tasks, validators, versions
+from .models import File, FileChange, UploadSession
+from .filters import CapturedDateFilter, FileFilter, UsernameFilter, get_ordering, is_captured_date_query
+from .pagination import FilePagination
+from .renderers import FastJSONRenderer
+from .serializers import UserSerializer, TrialLicenseCheckSerializer, UserFilesSerializer, AllFilesSerializer, UploadSessionSerializer, DeleteFilesSerializer
+from .serializers import FileRowsSerializer, SyncSerializer, TrialLicenseChecksSerializer
 
+UPLOAD_READ_SIZE = 64 * 1024
+
+
+class ConditionalGetMixin:
+  # GET with If-None-Match or If-Modified-Since is answered with 304 from validators of get_version(),
+  # before any query or serialization of response body
+
+  def get_version(self):
+    """
+    Return pair of token and last modified unix time (or None), token changes whenever response changes.
+    """
+    raise NotImplementedError
+
+  def get_etag(self, token):
+    # one url gives different bodies to different renderers and users
+    request = self.request
+    value = '{}:{}:{}:{}'.format(token, request.user.id, request.accepted_media_type, request.build_absolute_uri())
+    return '"{}"'.format(hashlib.md5(value.encode()).hexdigest())
+
+  def get(self, request, *args, **kwargs):
+    token, last_modified = self.get_version()
+    etag = self.get_etag(token)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+      response = super().get(request, *args, **kwargs)
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+      response['ETag'] = etag
+      if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+      # responses are per user and clients have to revalidate them
+      patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 class UserRegistration(generics.CreateAPIView):
   permission_classes = [permissions.AllowAny]
   queryset = User.objects.all()
   serializer_class = UserSerializer
 
-class UserDetails(generics.RetrieveAPIView):
+class UserDetails(ConditionalGetMixin, generics.RetrieveAPIView):
   permission_classes = [permissions.IsAuthenticated]
 
-  def get(self, request):
-    return Response({'email': self.request.user.email, 'username': self.request.user.username})
+  def get_data(self):
+    return {'email': self.request.user.email, 'username': self.request.user.username}
+
+  def get_version(self):
+    # user is already loaded by authentication
+    return repr(self.get_data()), None
+
+  def retrieve(self, request):
+    return Response(self.get_data())
 
-class TrialLicenseCheck(generics.RetrieveAPIView):
+class TrialLicenseCheck(ConditionalGetMixin, generics.RetrieveAPIView):
   permission_classes = [permissions.IsAuthenticated]
 
-  def get(self, request):
-    datetime_now = timezone.now()
-    datetime_joined = request.user.date_joined 
-    license_duration = TrialLicenseCheckSerializer(request.data).data['license_duration']
-    days_to_license_end =  license_duration - (datetime_now - datetime_joined).days
-    if days_to_license_end < 0:
-      days_to_license_end = 0
-    return Response({'days_to_license_end': days_to_license_end})
-
-class UserFilesList(generics.ListAPIView):
+  def get_days_to_license_end(self):
+    # clients send no body, license_duration is read from request which has one
+    license_duration = licensing.TRIAL_LICENSE_DAYS
+    if self.request.stream is not None:
+      license_duration = TrialLicenseCheckSerializer(self.request.data).data['license_duration']
+    return licensing.get_days_to_license_end(licensing.get_entitlement(self.request.user), license_duration)
+
+  def get_version(self):
+    return str(self.get_days_to_license_end()), None
+
+  def retrieve(self, request):
+    return Response({'days_to_license_end': self.get_days_to_license_end()})
+
+class TrialLicenseChecks(generics.GenericAPIView):
+  # trial licenses of many users for admin tooling, users missing in entitlement cache are read by one query
+  permission_classes = [permissions.IsAdminUser]
+  serializer_class = TrialLicenseChecksSerializer
+
+  def post(self, request):
+    serializer = self.get_serializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    license_duration = serializer.validated_data['license_duration']
+    entitlements = licensing.get_entitlements(ids)
+    results = []
+    for user_id in ids:
+      entitlement = entitlements.get(user_id)
+      if entitlement is None:
+        results.append({'id': user_id, 'status': 'not_found', 'days_to_license_end': None})
+      else:
+        results.append({'id': user_id, 'status': 'found',
+                        'days_to_license_end': licensing.get_days_to_license_end(entitlement, license_duration)})
+    return Response({'results': results})
+
+class FileListMixin:
+  # read-only lists skip model instances and serializer fields, output is the same as of serializer_class.
+  # ?fields=id,post_date narrows both output and SELECT to the given fields
+  renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+  filter_backends = [FileFilter, CapturedDateFilter]
+  fields_query_param = 'fields'
+
+  def get_requested_fields(self):
+    available_fields = self.get_serializer_class().Meta.fields
+    value = self.request.query_params.get(self.fields_query_param)
+    if not value:
+      return list(available_fields)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown_fields = [field for field in fields if field not in available_fields]
+    if unknown_fields:
+      raise ValidationError({self.fields_query_param: ['Unknown fields: {}. Available fields: {}.'.format(
+        ', '.join(unknown_fields), ', '.join(available_fields))]})
+    return [field for field in available_fields if field in fields]
+
+  def get_serializer(self, *args, **kwargs):
+    serializer = super().get_serializer(*args, **kwargs)
+    requested_fields = self.get_requested_fields()
+    fields = serializer.child.fields if kwargs.get('many') else serializer.fields
+    for field in list(fields):
+      if field not in requested_fields:
+        fields.pop(field)
+    return serializer
+
+  def list(self, request, *args, **kwargs):
+    requested_fields = self.get_requested_fields()
+    rows_serializer = FileRowsSerializer(self.get_serializer_class(), request, requested_fields)
+    row_fields = rows_serializer.get_row_fields()
+    # cursor pagination reads its position from the first ordering field
+    ordering_field = get_ordering(request)[0].lstrip('-')
+    if ordering_field not in row_fields:
+      row_fields.append(ordering_field)
+    if not settings.FAST_FILE_LISTS:
+      # annotations such as username aren't model fields and are selected by get_queryset and filters only when needed
+      model_fields = [field for field in row_fields
+                      if field not in ('username', 'captured_date') and not field.startswith('metadata__')]
+      queryset = self.filter_queryset(self.get_queryset()).only(*model_fields)
+      if 'metadata' in requested_fields:
+        queryset = queryset.prefetch_related('metadata')
+      page = self.paginate_queryset(queryset)
+      with profiling.measure_serialization(request):
+        data = self.get_serializer(page, many=True).data
+      return self.get_paginated_response(data)
+    queryset = self.filter_queryset(self.get_queryset()).values_list(*row_fields, named=True)
+    page = self.paginate_queryset(queryset)
+    with profiling.measure_serialization(request):
+      data = rows_serializer.serialize(page)
+    return self.get_paginated_response(data)
+
+class UserFilesList(ConditionalGetMixin, FileListMixin, generics.ListAPIView):
   permission_classes = [permissions.IsAuthenticated]
   serializer_class = UserFilesSerializer
+  pagination_class = FilePagination
+
+  def get_version(self):
+    return versions.get_version(self.request.user.id)
 
   def get_queryset(self, *args, **kwargs):
+    if is_captured_date_query(self.request):
+      # user is matched on metadata index only, user conditions on both tables skew planner row estimates
+      return File.objects.all().filter(metadata__user=self.request.user).order_by(F('id').desc())
     return File.objects.all().filter(user=self.request.user).order_by(F('id').desc())
 
-class AllFilesList(generics.ListAPIView):
+class AllFilesList(ConditionalGetMixin, FileListMixin, generics.ListAPIView):
   permission_classes = [permissions.IsAuthenticated]
   serializer_class = AllFilesSerializer
+  pagination_class = FilePagination
+  filter_backends = FileListMixin.filter_backends + [UsernameFilter]
+
+  def get_version(self):
+    # cached feed is checked against the same version
+    self.version = versions.get_version()
+    return self.version
 
   def get_queryset(self, *args, **kwargs):
-    return File.objects.all().annotate(username=F('user__username')).order_by(F('id').desc())
+    return feed.get_feed_queryset(with_username='username' in self.get_requested_fields())
+
+  def list(self, request, *args, **kwargs):
+    # first pages are served from cached feed, any other query goes to database
+    page = request.query_params.get('page', '1')
+    if set(request.query_params) <= {'page'} and page.isdigit() and int(page) > 0:
+      response = feed.get_page_response(request, int(page), self.version[0])
+      if response is not None:
+        return response
+    return super().list(request, *args, **kwargs)
 
 class PostFile(generics.CreateAPIView):
   permission_classes = [permissions.IsAuthenticated]
   serializer_class = UserFilesSerializer
 
   def perform_create(self, serializer):
-    serializer.save(user=self.request.user)
+    # heavy processing runs in `manage.py process_tasks` worker, not in request
+    with transaction.atomic():
+      uploaded_file = serializer.validated_data['file']
+      blob = storage.store_blob(uploaded_file)
+      file = serializer.save(user=self.request.user, file=blob.name, blob=blob, size=uploaded_file.size)
+      tasks.enqueue('process_file', file_id=file.id)
+
+class PostFiles(generics.GenericAPIView):
+  # multipart body with many `files` parts, each part is hashed while it's streamed by upload handlers
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = UserFilesSerializer
+
+  def exclude_over_quota(self, valid_files, fitting, results):
+    fitting = set(fitting)
+    for position, (index, uploaded_file) in enumerate(valid_files):
+      if position not in fitting:
+        results[index] = {'name': uploaded_file.name, 'status': 'quota_exceeded', 'errors': {'detail': quota.QuotaExceeded.default_detail}}
+    return [valid_file for position, valid_file in enumerate(valid_files) if position in fitting]
+
+  def post(self, request):
+    uploaded_files = request.FILES.getlist('files')
+    if not uploaded_files:
+      return Response({'message': 'No files were uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(uploaded_files) > settings.BULK_UPLOAD_MAX_FILES:
+      return Response({'message': 'Too many files, maximum is {}.'.format(settings.BULK_UPLOAD_MAX_FILES)},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    results = []
+    valid_files = []
+    for index, uploaded_file in enumerate(uploaded_files):
+      serializer = self.get_serializer(data={'file': uploaded_file})
+      if serializer.is_valid():
+        valid_files.append((index, serializer.validated_data['file']))
+        results.append({'name': uploaded_file.name, 'status': 'created'})
+      else:
+        results.append({'name': uploaded_file.name, 'status': 'invalid', 'errors': serializer.errors})
+
+    # files which don't fit into remaining quota in request order aren't stored
+    fitting = quota.get_fitting(request.user.id, [uploaded_file.size for _, uploaded_file in valid_files])
+    valid_files = self.exclude_over_quota(valid_files, fitting, results)
+    if valid_files:
+      with transaction.atomic():
+        # blobs are locked in digest order, so concurrent batches with the same content can't deadlock
+        blobs = {}
+        for index, uploaded_file in sorted(valid_files, key=lambda item: storage.get_digest(item[1])):
+          blobs[index] = storage.store_blob(uploaded_file)
+        # bulk_create doesn't send post_save, so usage and change log are updated here. Usage is enforced
+        # per file again, as concurrent upload may have used the quota meanwhile
+        added = quota.add_usages(request.user.id, [uploaded_file.size for _, uploaded_file in valid_files])
+        if len(added) < len(valid_files):
+          over_quota = set(range(len(valid_files))) - set(added)
+          released_blobs = storage.release_blobs(collections.Counter(blobs[valid_files[position][0]].id for position in over_quota))
+          if released_blobs:
+            tasks.enqueue('remove_files', blobs=[[blob.digest, blob.name] for blob in released_blobs])
+          valid_files = self.exclude_over_quota(valid_files, added, results)
+        files = File.objects.bulk_create([File(user=request.user, file=blobs[index].name, blob=blobs[index], size=uploaded_file.size,
+                                               media_type=File.get_media_type(blobs[index].name))
+                                          for index, uploaded_file in valid_files])
+        tasks.enqueue_many('process_file', [{'file_id': file.id} for file in files])
+        changes.record_changes(request.user.id, FileChange.Kind.CREATED, [file.id for file in files])
+      for (index, _), data in zip(valid_files, self.get_serializer(files, many=True).data):
+        results[index]['file'] = data
+
+    response_status = status.HTTP_201_CREATED if len(valid_files) == len(uploaded_files) else status.HTTP_207_MULTI_STATUS
+    return Response({'results': results}, status=response_status)
+
+class StartUpload(generics.CreateAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = UploadSessionSerializer
+
+  def perform_create(self, serializer):
+    # declared size is checked before any chunk is sent
+    validators.check_file_size(serializer.validated_data['size'])
+    quota.check_quota(self.request.user.id, serializer.validated_data['size'])
+    upload_session = serializer.save(user=self.request.user)
+    partial_upload_path = storage.get_partial_upload_path(upload_session.id)
+    os.makedirs(os.path.dirname(partial_upload_path), exist_ok=True)
+    open(partial_upload_path, 'wb').close()
+
+class UploadChunk(generics.RetrieveDestroyAPIView):
+  # resumable upload protocol: POST /upload, PUT /upload/<id> with Upload-Offset header and raw chunk
+  # as body (GET /upload/<id> tells offset to resume from), POST /upload/<id>/finalize
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = UploadSessionSerializer
+
+  def get_queryset(self):
+    return UploadSession.objects.filter(user=self.request.user)
+
+  def put(self, request, pk):
+    upload_session = get_object_or_404(self.get_queryset(), id=pk)
+    try:
+      offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+    except (KeyError, ValueError):
+      return Response({'message': 'Upload-Offset header is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    # chunk is written outside of transaction, so that slow client doesn't keep session row locked,
+    # lock of partial file lets only one request write chunk of the session at a time
+    try:
+      with storage.lock_partial_upload(upload_session.id) as partial_upload:
+        if partial_upload is None:
+          return Response({'message': 'Upload is in progress.', 'offset': upload_session.offset}, status=status.HTTP_409_CONFLICT)
+        # offset could be committed by request which held the lock before
+        upload_session = get_object_or_404(self.get_queryset(), id=pk)
+        if offset != upload_session.offset:
+          return Response({'message': 'Upload offset mismatch.', 'offset': upload_session.offset}, status=status.HTTP_409_CONFLICT)
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if offset + content_length > upload_session.size:
+          return Response({'message': 'Chunk exceeds upload size.', 'offset': upload_session.offset}, status=status.HTTP_400_BAD_REQUEST)
+        # content of the first chunk is checked against extension before anything is written
+        header = request.read(validators.SIGNATURE_LENGTH) if offset == 0 else b''
+        if offset == 0 and not validators.is_signature_valid(upload_session.filename, header):
+          return Response({'message': validators.SIGNATURE_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+        # chunk is streamed to partial file, so memory use doesn't depend on chunk or file size.
+        # bytes after offset are left by a dropped connection and are overwritten by resumed chunk
+        partial_upload.seek(offset)
+        partial_upload.truncate()
+        partial_upload.write(header)
+        written = len(header)
+        while True:
+          data = request.read(UPLOAD_READ_SIZE)
+          if not data:
+            break
+          partial_upload.write(data)
+          written += len(data)
+        # offset isn't committed when session was finalized or aborted meanwhile
+        if not UploadSession.objects.filter(id=upload_session.id, offset=offset).update(offset=offset + written):
+          raise Http404
+    except FileNotFoundError:
+      # partial file was removed by abort or finalize of the session
+      raise Http404
+    return Response({'offset': offset + written})
+
+  def perform_destroy(self, instance):
+    upload_session_id = instance.id
+    instance.delete()
+    storage.remove_partial_upload(upload_session_id)
+
+class FinishUpload(generics.GenericAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = UserFilesSerializer
+
+  def post(self, request, pk):
+    upload_session = get_object_or_404(UploadSession, id=pk, user=request.user)
+    if upload_session.offset != upload_session.size:
+      return Response({'message': 'Upload is not complete.', 'offset': upload_session.offset}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+      partial_upload = storage.PartialUpload(storage.get_partial_upload_path(upload_session.id), upload_session.filename)
+    except FileNotFoundError:
+      # partial file was removed by concurrent abort or finalize
+      raise Http404
+    with partial_upload:
+      # content of complete upload doesn't change anymore, so it's hashed before session row is locked
+      storage.get_digest(partial_upload)
+      with transaction.atomic():
+        upload_session = get_object_or_404(UploadSession.objects.select_for_update(), id=pk, user=request.user)
+        # quota is checked before content is stored, it's enforced again when file is created
+        quota.check_quota(request.user.id, upload_session.size)
+        blob = storage.store_blob(partial_upload)
+        file = File.objects.create(user=request.user, file=blob.name, blob=blob, size=upload_session.size)
+        tasks.enqueue('process_file', file_id=file.id)
+        upload_session_id = upload_session.id
+        upload_session.delete()
+        # partial file is kept when finalize is rolled back, so that it can be retried
+        transaction.on_commit(lambda: storage.remove_partial_upload(upload_session_id))
+    return Response(self.get_serializer(file).data, status=status.HTTP_201_CREATED)
+
+class StorageUsageDetails(generics.RetrieveAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+
+  def get(self, request):
+    return Response({'used_bytes': quota.get_usage(request.user.id), 'quota_bytes': settings.STORAGE_QUOTA_BYTES})
+
+class Metrics(generics.GenericAPIView):
+  # Prometheus scrape endpoint for histograms of ProfilingMiddleware, scraper authenticates with token of staff user
+  permission_classes = [permissions.IsAdminUser]
+
+  def get(self, request):
+    return HttpResponse(profiling.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 class DeleteFile(generics.DestroyAPIView):
   permission_classes = [permissions.IsAuthenticated]
@@ -61,9 +390,73 @@ class DeleteFile(generics.DestroyAPIView):
 
   def delete(self, request, pk):
     file = get_object_or_404(File, id=pk)
-    if request.user == file.user:
-      file.delete()
-      os.remove(file.file.path)
+    if request.user.id == file.user_id:
+      deletion.delete_files(File.objects.filter(id=file.id))
       return Response({'message': 'File was deleted successfully.'}, status=status.HTTP_204_NO_CONTENT) 
     else:
       return Response({'message': 'You cannot delete files of other users.'}, status=status.HTTP_403_FORBIDDEN) 
+
+class DeleteFiles(generics.GenericAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = DeleteFilesSerializer
+
+  def post(self, request):
+    serializer = self.get_serializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    # files of other users are reported as not found, so ids of their files aren't disclosed
+    deleted_ids = deletion.delete_files(File.objects.filter(user=request.user, id__in=ids))
+    deleted = set(deleted_ids)
+    results = [{'id': file_id, 'status': 'deleted' if file_id in deleted else 'not_found'} for file_id in ids]
+    return Response({'results': results})
+
+class SyncFiles(generics.GenericAPIView):
+  # changes of user files after ?cursor=, client lists its files once and then follows returned cursor
+  permission_classes = [permissions.IsAuthenticated]
+  serializer_class = SyncSerializer
+  renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+  def get(self, request):
+    serializer = self.get_serializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    result = changes.get_changes(request.user.id, serializer.validated_data['cursor'], serializer.validated_data['limit'])
+    if result is None:
+      return Response({'message': 'Cursor is expired, list files again and continue from this cursor.',
+                       'cursor': changes.get_version(request.user.id)}, status=status.HTTP_410_GONE)
+    rows_serializer = FileRowsSerializer(UserFilesSerializer, request)
+    created = (File.objects.filter(user=request.user, id__in=result['created']).order_by(F('id').desc())
+               .values_list(*rows_serializer.get_row_fields(), named=True))
+    # rows are fetched by list(), so that only serialization is measured
+    created = list(created)
+    with profiling.measure_serialization(request):
+      result['created'] = rows_serializer.serialize(created)
+    return Response(result)
+
+class FileRendition(generics.RetrieveAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+
+  def get(self, request, pk, size, extension):
+    file = get_object_or_404(File, id=pk)
+    if (not renditions.is_rendition_supported(file.file.name) or size not in settings.RENDITION_SIZES or
+        extension not in settings.RENDITION_FORMATS):
+      return Response({'message': 'Rendition is not available.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+      renditions.get_or_build_rendition(file.file, size, extension)
+    except OSError:
+      return Response({'message': 'Rendition is not available.'}, status=status.HTTP_404_NOT_FOUND)
+    return media.serve(request, renditions.get_rendition_name(file.file.name, size, extension))
+
+class MediaFile(generics.GenericAPIView):
+  permission_classes = [permissions.IsAuthenticated]
+
+  def perform_content_negotiation(self, request, force=False):
+    # media response isn't rendered, so Accept header of image loaders must not fail request
+    return super().perform_content_negotiation(request, force=True)
+
+  def get(self, request, name):
+    if not media.is_published(name):
+      return Response({'message': 'File not found.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+      return media.serve(request, name)
+    except (OSError, SuspiciousFileOperation):
+      return Response({'message': 'File not found.'}, status=status.HTTP_404_NOT_FOUND)